@@ -0,0 +1,47 @@
+from argparse import ArgumentParser
+from time import perf_counter
+
+from benchmarks.synthetic import default_places_file, generate_processed_statuses
+from wxmonitor.aggregation import RollingCountyAggregator
+from wxmonitor.utils import get_min_max_county_count, get_seen_counties, get_uncategorized
+from wxmonitor.weather_categorizer import WeatherCategorizer
+
+
+def run(places_file=default_places_file, count=100000):
+    statuses = generate_processed_statuses(count, WeatherCategorizer(places_file), places_file)
+
+    start = perf_counter()
+    seen_counties = get_seen_counties(statuses)
+    get_min_max_county_count(seen_counties)
+    get_uncategorized(statuses)
+    recount_time = perf_counter() - start
+
+    aggregator = RollingCountyAggregator(ttl=float("inf"))
+    start = perf_counter()
+    for status in statuses:
+        aggregator.add(status)
+    add_time = perf_counter() - start
+
+    start = perf_counter()
+    aggregator.snapshot()
+    snapshot_time = perf_counter() - start
+
+    return {
+        "aggregation.{0}.recount_seconds".format(count): recount_time,
+        "aggregation.{0}.aggregator_add_per_sec".format(count): count / add_time,
+        "aggregation.{0}.aggregator_snapshot_seconds".format(count): snapshot_time,
+    }
+
+
+def main():
+    parser = ArgumentParser(description="County aggregation benchmark")
+    parser.add_argument("-p", "--places", help="Places file", default=default_places_file)
+    parser.add_argument("-n", "--count", help="Number of statuses", type=int, default=100000)
+    args = parser.parse_args()
+
+    for name, value in sorted(run(args.places, args.count).items()):
+        print("{0:<45} {1:14.6f}".format(name, value))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+from argparse import ArgumentParser
+from time import perf_counter
+
+from wxmonitor.cache import BucketCache, Cache
+
+
+class _Clock(object):
+    """Settable timer so both caches see the same arrival times."""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def bench(cache_type, count, ttl=3600):
+    clock = _Clock()
+    cache = cache_type(ttl=ttl, timer=clock)
+    step = ttl / float(count)
+    sample = object()
+
+    start = perf_counter()
+    for _ in range(count):
+        clock.now += step
+        cache.add(sample)
+    add_time = perf_counter() - start
+
+    start = perf_counter()
+    cache.get_statuses()
+    get_time = perf_counter() - start
+
+    clock.now += ttl / 2.0
+    start = perf_counter()
+    cache.expire()
+    expire_time = perf_counter() - start
+
+    return {"add_per_sec": count / add_time, "get_statuses_seconds": get_time, "expire_half_seconds": expire_time}
+
+
+def run(counts=(10000, 100000, 1000000)):
+    results = {}
+    for count in counts:
+        for name, cache_type in (("ttl", Cache), ("bucket", BucketCache)):
+            for metric, value in bench(cache_type, count).items():
+                results["cache.{0}.{1}.{2}".format(name, count, metric)] = value
+
+    return results
+
+
+def main():
+    parser = ArgumentParser(description="Cache benchmark")
+    parser.add_argument("-n", "--counts", help="Entry counts", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    for name, value in sorted(run(args.counts).items()):
+        print("{0:<45} {1:14.4f}".format(name, value))
+
+
+if __name__ == "__main__":
+    main()
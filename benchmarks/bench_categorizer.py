@@ -0,0 +1,69 @@
+from argparse import ArgumentParser
+from os.path import join
+from random import Random
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import perf_counter
+
+from benchmarks.synthetic import default_places_file, generate_texts
+from wxmonitor.weather_categorizer import RegexWeatherCategorizer, WeatherCategorizer
+
+
+def bench(categorizer_type, places_file, texts, **categorizer_args):
+    start = perf_counter()
+    categorizer = categorizer_type(places_file, **categorizer_args)
+    build_time = perf_counter() - start
+
+    start = perf_counter()
+    for text in texts:
+        categorizer.process_text(text)
+    elapsed = perf_counter() - start
+
+    return build_time, len(texts) / elapsed
+
+
+def with_repeats(texts, share=0.3, seed=0):
+    """Replaces share of texts with a recent earlier one, as relayed warnings and bot posts repeat."""
+    random = Random(seed)
+    repeated = []
+    for text in texts:
+        repeated.append(random.choice(repeated[-500:]) if repeated and random.random() < share else text)
+    return repeated
+
+
+def run(places_file=default_places_file, count=20000):
+    texts = generate_texts(count, places_file)
+
+    results = {}
+    for name, categorizer_type in (("regex", RegexWeatherCategorizer), ("trie", WeatherCategorizer)):
+        build_time, rate = bench(categorizer_type, places_file, texts)
+        results["categorizer.{0}.build_seconds".format(name)] = build_time
+        results["categorizer.{0}.process_per_sec".format(name)] = rate
+
+    repeated = with_repeats(texts)
+    _, results["categorizer.repeated.process_per_sec"] = bench(WeatherCategorizer, places_file, repeated)
+    _, results["categorizer.memo.process_per_sec"] = bench(WeatherCategorizer, places_file, repeated,
+                                                           memo_size=10000)
+
+    directory = mkdtemp()
+    index_file = join(directory, "places.idx")
+    WeatherCategorizer(places_file, index_file=index_file)
+    build_time, _ = bench(WeatherCategorizer, places_file, texts[:1], index_file=index_file)
+    results["categorizer.indexed.build_seconds"] = build_time
+    rmtree(directory)
+
+    return results
+
+
+def main():
+    parser = ArgumentParser(description="Categorizer throughput benchmark")
+    parser.add_argument("-p", "--places", help="Places file", default=default_places_file)
+    parser.add_argument("-n", "--count", help="Number of statuses", type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, value in sorted(run(args.places, args.count).items()):
+        print("{0:<40} {1:14.4f}".format(name, value))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+
+from benchmarks.synthetic import default_places_file, generate_statuses
+from wxmonitor.cache import BucketCache
+from wxmonitor.dedup import StatusDeduplicator
+from wxmonitor.replay import ReplayStatus
+from wxmonitor.stream_listeners import ProcessingListenerAction
+from wxmonitor.weather_categorizer import WeatherCategorizer
+
+
+def with_copies(statuses, share=0.3, seed=0):
+    """Replaces share of statuses with copies of an earlier one: retweets, or the text with a new link."""
+    random = Random(seed)
+    mixed = []
+    for status in statuses:
+        if mixed and random.random() < share:
+            original = random.choice(mixed[-500:])
+            if random.random() < 0.5:
+                text, retweeted = "RT @user1: " + original.text, original
+            else:
+                text, retweeted = original.text + " https://t.co/{0:010x}".format(random.getrandbits(40)), None
+            status = ReplayStatus(status.id, status.timestamp, status.user.screen_name, None, None, text,
+                                  retweeted_status=retweeted)
+        mixed.append(status)
+    return mixed
+
+
+def timed_processing(categorizer, statuses, deduplicator):
+    clock = [0.0]
+    action = ProcessingListenerAction(categorizer, BucketCache(timer=lambda: clock[0]), timer=lambda: clock[0],
+                                      deduplicator=deduplicator)
+    start = perf_counter()
+    for status in statuses:
+        clock[0] = status.timestamp
+        action.process(status)
+    return len(statuses) / (perf_counter() - start)
+
+
+def run(places_file=default_places_file, count=20000):
+    statuses = with_copies(generate_statuses(count, places_file))
+    categorizer = WeatherCategorizer(places_file)
+
+    clock = [0.0]
+    deduplicator = StatusDeduplicator(timer=lambda: clock[0])
+    start = perf_counter()
+    for status in statuses:
+        clock[0] = status.timestamp
+        deduplicator.check(status)
+    check_rate = count / (perf_counter() - start)
+
+    return {
+        "dedup.check_per_sec": check_rate,
+        "dedup.processing.plain_per_sec": timed_processing(categorizer, statuses, None),
+        "dedup.processing.dedup_per_sec": timed_processing(categorizer, statuses, StatusDeduplicator(
+            timer=lambda: statuses[-1].timestamp)),
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Duplicate detection benchmark")
+    parser.add_argument("-p", "--places", help="Places file", default=default_places_file)
+    parser.add_argument("-n", "--count", help="Number of statuses, 30% of them copies", type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, value in sorted(run(args.places, args.count).items()):
+        print("{0:<40} {1:14.4f}".format(name, value))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+from argparse import ArgumentParser
+from random import Random
+from time import perf_counter
+
+from wxmonitor.geolocation import CountyLocator
+
+
+def run(count=20000, states=None):
+    start = perf_counter()
+    locator = CountyLocator(states=states)
+    load_time = perf_counter() - start
+
+    # Points over the continental US, so a share of them fall outside every county.
+    random = Random(42)
+    points = [(random.uniform(-125, -67), random.uniform(25, 49)) for _ in range(count)]
+
+    start = perf_counter()
+    for lon, lat in points:
+        locator.locate(lon, lat)
+    elapsed = perf_counter() - start
+
+    return {
+        "geolocation.load_seconds": load_time,
+        "geolocation.locate_per_sec": count / elapsed,
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Point in county lookup benchmark")
+    parser.add_argument("-n", "--count", help="Number of points", type=int, default=20000)
+    parser.add_argument("-s", "--states", help="Comma separated states to load, default all", default=None)
+    args = parser.parse_args()
+
+    states = args.states.split(",") if args.states else None
+    for name, value in sorted(run(args.count, states).items()):
+        print("{0:<40} {1:14.4f}".format(name, value))
+
+
+if __name__ == "__main__":
+    main()
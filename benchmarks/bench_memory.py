@@ -0,0 +1,86 @@
+import tracemalloc
+from argparse import ArgumentParser
+from collections import namedtuple
+
+from tweepy.models import Status
+
+from benchmarks.synthetic import default_places_file, generate_texts
+from wxmonitor.stream_listeners import ProcessedStatus
+from wxmonitor.weather_categorizer import WeatherCategorizer
+
+# The record ProcessingListenerAction cached before ProcessedStatus became compact.
+LegacyProcessedStatus = namedtuple("LegacyProcessedStatus", field_names=["status", "tags"])
+
+
+def make_status_json(i, text):
+    return {
+        "created_at": "Sat Apr 15 22:14:10 +0000 2017",
+        "id": 853366000000000000 + i,
+        "id_str": str(853366000000000000 + i),
+        "text": text,
+        "source": "<a href=\"http://twitter.com/download/iphone\" rel=\"nofollow\">Twitter for iPhone</a>",
+        "truncated": False,
+        "in_reply_to_status_id": None,
+        "user": {
+            "id": 1000 + i,
+            "id_str": str(1000 + i),
+            "name": "Storm Watcher {0}".format(i),
+            "screen_name": "stormwatcher{0}".format(i),
+            "location": "Nashville, TN",
+            "description": "Weather nerd. Opinions are my own.",
+            "followers_count": 321,
+            "friends_count": 456,
+            "created_at": "Mon Jun 01 12:00:00 +0000 2009",
+            "profile_image_url": "http://pbs.twimg.com/profile_images/1/abc_normal.jpg",
+            "lang": "en",
+        },
+        "geo": None,
+        "coordinates": None,
+        "place": None,
+        "entities": {"hashtags": [{"text": "tspotter", "indices": [0, 9]}], "urls": [], "user_mentions": [],
+                     "symbols": []},
+        "retweet_count": 0,
+        "favorite_count": 0,
+        "lang": "en",
+        "timestamp_ms": "1492294450000",
+    }
+
+
+def measure(make_record, statuses, tags):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [make_record(status, tag) for status, tag in zip(statuses, tags)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (after - before) / float(len(records))
+
+
+def run(count=20000):
+    categorizer = WeatherCategorizer(default_places_file)
+    texts = generate_texts(count)
+    tags = [categorizer.process_text(text) for text in texts]
+
+    # The legacy record keeps the parsed status alive, so its parse cost is part of what it holds on to.
+    def legacy(i_text, tag):
+        return LegacyProcessedStatus(status=Status.parse(None, make_status_json(*i_text)), tags=tag)
+
+    statuses = [Status.parse(None, make_status_json(i, text)) for i, text in enumerate(texts)]
+
+    return {
+        "memory.legacy_bytes_per_status": measure(legacy, list(enumerate(texts)), tags),
+        "memory.compact_bytes_per_status": measure(ProcessedStatus.from_status, statuses, tags),
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Bytes per cached status")
+    parser.add_argument("-n", "--count", help="Number of statuses", type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, value in sorted(run(args.count).items()):
+        print("{0:<35} {1:8.0f}".format(name, value))
+
+
+if __name__ == "__main__":
+    main()
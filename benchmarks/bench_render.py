@@ -0,0 +1,81 @@
+from argparse import ArgumentParser
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import perf_counter
+
+from matplotlib import pyplot as plt
+from matplotlib.patches import Polygon
+
+from wxmonitor.animation import AnimationRenderer
+from wxmonitor.graphing import CountyMapRenderer, RasterMapRenderer, make_basemap, make_county_hash, get_rgb
+from wxmonitor.reporting import BytesReportOutput, ProcessingImpl, default_map_args
+
+seen_counties = {"davidson": 40, "knox": 12, "shelby": 25, "williamson": 7, "rutherford": 3, "sumner": 1}
+
+
+def render_uncached(resolution):
+    # What ProcessingImpl.render_map did before the renderer cached the basemap.
+    plt.figure(figsize=(12, 6))
+    state_map = make_basemap(resolution=resolution, **default_map_args)
+    ax = plt.gca()
+    for county, count in seen_counties.items():
+        seg = state_map.county_poly_map[make_county_hash("tn", county)]
+        ax.add_patch(Polygon(seg, facecolor=get_rgb(count, 1, 40), edgecolor=(0.9, 0.9, 0.9)))
+
+
+def timed_report(processing_impl):
+    """Times ProcessingImpl.render_map plus encoding through BytesReportOutput.create_output."""
+    start = perf_counter()
+    image = processing_impl.render_map(40, 1, seen_counties)
+    if isinstance(image, bytes):
+        BytesReportOutput().create_output(image=image)
+    else:
+        BytesReportOutput().create_output()
+    return perf_counter() - start
+
+
+def run(resolution="h"):
+    results = {}
+    cache_dir = mkdtemp()
+
+    try:
+        start = perf_counter()
+        render_uncached(resolution)
+        BytesReportOutput().create_output()
+        results["render.uncached_seconds"] = perf_counter() - start
+        plt.close("all")
+
+        for name, renderer_type in (("vector", CountyMapRenderer), ("raster", RasterMapRenderer)):
+            processing_impl = ProcessingImpl(reporter=None, cacher=None, tracking_tag="",
+                                             map_renderer=renderer_type(resolution=resolution, cache_dir=cache_dir,
+                                                                        **default_map_args))
+            results["render.{0}.cold_seconds".format(name)] = timed_report(processing_impl)
+            results["render.{0}.warm_seconds".format(name)] = min(timed_report(processing_impl) for _ in range(5))
+            plt.close("all")
+
+        # A 2 hour time-lapse of 5 minute frames, rendered from an already built raster.
+        frames = [(i * 300, {county: (count + i) % 40 + 1 for county, count in seen_counties.items()})
+                  for i in range(24)]
+        animation_renderer = AnimationRenderer(RasterMapRenderer(resolution=resolution, cache_dir=cache_dir,
+                                                                 **default_map_args))
+        animation_renderer.render(frames[:1])
+        start = perf_counter()
+        animation_renderer.render(frames)
+        results["render.animation_24_frames_seconds"] = perf_counter() - start
+    finally:
+        rmtree(cache_dir)
+
+    return results
+
+
+def main():
+    parser = ArgumentParser(description="Map render benchmark")
+    parser.add_argument("-r", "--resolution", help="Basemap resolution (c, l, i, h, f)", default="h")
+    args = parser.parse_args()
+
+    for name, value in sorted(run(args.resolution).items()):
+        print("{0:<30} {1:10.4f}s".format(name, value))
+
+
+if __name__ == "__main__":
+    main()
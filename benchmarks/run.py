@@ -0,0 +1,95 @@
+"""Runs the benchmark suite and saves the results as JSON, optionally comparing them against a previous run.
+
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.run -o new.json -c results.json
+
+Metric names ending in _per_sec are better when higher, everything else (_seconds, _bytes_per_status) when lower.
+"""
+import json
+import platform
+from argparse import ArgumentParser
+from datetime import datetime
+from sys import exit
+
+from benchmarks import bench_aggregation, bench_cache, bench_categorizer, bench_dedup, bench_memory
+from benchmarks.synthetic import default_places_file
+
+
+def higher_is_better(name):
+    return name.endswith("_per_sec")
+
+
+def compare(results, baseline, threshold):
+    """Prints each metric against the baseline, returning the names that regressed by more than threshold."""
+    regressions = []
+
+    for name in sorted(results):
+        value = results[name]
+        old = baseline.get(name)
+        if not old:
+            print("{0:<50} {1:14.6f}".format(name, value))
+            continue
+
+        change = (value - old) / old
+        regressed = -change > threshold if higher_is_better(name) else change > threshold
+        if regressed:
+            regressions.append(name)
+
+        print("{0:<50} {1:14.6f} {2:14.6f} {3:+8.1%}{4}".format(name, old, value, change,
+                                                                 "  REGRESSION" if regressed else ""))
+
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description="wxmonitor benchmark suite")
+    parser.add_argument("-o", "--output", help="Save results to this JSON file", default=None)
+    parser.add_argument("-c", "--compare", help="Compare against a previous results JSON file", default=None)
+    parser.add_argument("-t", "--threshold", help="Relative change reported as a regression", type=float,
+                        default=0.1)
+    parser.add_argument("-p", "--places", help="Places file", default=default_places_file)
+    parser.add_argument("-q", "--quick", help="Smaller sizes, for a fast sanity run", default=False,
+                        action="store_true")
+    parser.add_argument("-r", "--resolution", help="Basemap resolution for the render benchmarks", default="h")
+    parser.add_argument("--skip-render", help="Skip the render benchmarks", default=False, action="store_true")
+    args = parser.parse_args()
+
+    results = {}
+    results.update(bench_categorizer.run(args.places, 2000 if args.quick else 20000))
+    results.update(bench_cache.run((10000,) if args.quick else (10000, 100000, 1000000)))
+    results.update(bench_aggregation.run(args.places, 10000 if args.quick else 100000))
+    results.update(bench_memory.run(2000 if args.quick else 20000))
+    results.update(bench_dedup.run(args.places, 2000 if args.quick else 20000))
+
+    if not args.skip_render:
+        # Imported here so the other benchmarks run without matplotlib and basemap.
+        from benchmarks import bench_geolocation, bench_render
+        results.update(bench_geolocation.run(2000 if args.quick else 20000))
+        results.update(bench_render.run(args.resolution))
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)["results"]
+
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "date": datetime.now().isoformat(),
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "quick": args.quick,
+                    "resolution": args.resolution,
+                },
+                "results": results
+            }, f, indent=2, sort_keys=True)
+
+    if regressions:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import random
+from csv import DictReader
+from os.path import dirname, join
+
+from wxmonitor.replay import ReplayStatus
+from wxmonitor.stream_listeners import ProcessedStatus
+
+default_places_file = join(dirname(dirname(__file__)), "tests", "data", "tn_places.txt")
+
+_event_phrases = ["rain", "hail", "damage", "roof", "ponding", "flooding", "flood", "wind", "trees are down",
+                  "trees down", "snow", "quarter size hail", "wind damage", "street flooding"]
+
+_noise_words = ["the", "storm", "just", "rolled", "through", "near", "here", "wow", "look", "at", "this", "sky",
+                "power", "out", "again", "stay", "safe", "everyone", "radar", "lightning", "loud", "tonight",
+                "warning", "until", "pm", "ugh", "seriously", "outside", "heavy", "big", "tornado", "siren",
+                "shelter", "line", "moving", "east", "watch", "issued", "for"]
+
+_hashtags = ["#tnwx", "#wx", "#severeweather", "#nashwx", "#memwx", "#knoxwx"]
+
+
+def load_place_names(places_file=default_places_file):
+    cities = set()
+    counties = set()
+    with open(places_file, "r") as f:
+        for row in DictReader(f, delimiter="|"):
+            cities.add(" ".join(row["PLACENAME"].split()[:-1]))
+            counties.update(map(str.strip, row["COUNTY"].split(",")))
+
+    return sorted(cities), sorted(counties)
+
+
+def generate_texts(count, places_file=default_places_file, seed=0):
+    """Generate tweet like texts.
+
+    The mix roughly follows a storm night: most texts name a city, some a county, most mention an event, about one in
+    ten is a #tspotter report, and the rest is noise words, hashtags, mentions, links, retweets and the odd line break
+    or all caps post.
+    """
+    rnd = random.Random(seed)
+    cities, counties = load_place_names(places_file)
+
+    texts = []
+    for _ in range(count):
+        words = [rnd.choice(_noise_words) for _ in range(rnd.randint(4, 16))]
+
+        if rnd.random() < 0.6:
+            words.insert(rnd.randint(0, len(words)), rnd.choice(cities))
+        if rnd.random() < 0.3:
+            words.insert(rnd.randint(0, len(words)), rnd.choice(counties))
+        if rnd.random() < 0.7:
+            words.insert(rnd.randint(0, len(words)), rnd.choice(_event_phrases))
+        if rnd.random() < 0.3:
+            words.append(rnd.choice(_hashtags))
+        if rnd.random() < 0.1:
+            words.append("#tspotter")
+        if rnd.random() < 0.2:
+            words.insert(rnd.randint(0, len(words)), "@user{0}".format(rnd.randint(1, 500)))
+        if rnd.random() < 0.3:
+            words.append("https://t.co/{0:010x}".format(rnd.getrandbits(40)))
+        if rnd.random() < 0.05:
+            words.insert(rnd.randint(1, len(words)), "\n")
+
+        text = " ".join(words)
+        if rnd.random() < 0.15:
+            text = "RT @user{0}: {1}".format(rnd.randint(1, 500), text)
+        texts.append(text.upper() if rnd.random() < 0.05 else text.capitalize())
+
+    return texts
+
+
+def generate_statuses(count, places_file=default_places_file, seed=0, start=1492294450.0, per_second=10.0):
+    """Generate ReplayStatus arriving per_second from start; about one in twenty is geotagged."""
+    rnd = random.Random(seed)
+
+    statuses = []
+    for i, text in enumerate(generate_texts(count, places_file, seed)):
+        coordinates = None
+        if rnd.random() < 0.05:
+            coordinates = {"type": "Point", "coordinates": [rnd.uniform(-90.0, -81.7), rnd.uniform(35.0, 36.6)]}
+
+        statuses.append(ReplayStatus(i + 1, start + i / per_second, "user{0}".format(rnd.randint(1, 5000)), "TN",
+                                     coordinates, text))
+
+    return statuses
+
+
+def generate_processed_statuses(count, categorizer, places_file=default_places_file, seed=0):
+    """Generate ProcessedStatus for cache and aggregation benchmarks, categorizing a pool of distinct texts."""
+    pool = [categorizer.process_text(text) for text in generate_texts(min(count, 5000), places_file, seed)]
+    return [ProcessedStatus.from_status(_Status(i), pool[i % len(pool)], float(i)) for i in range(count)]
+
+
+class _Status(object):
+    __slots__ = ("id",)
+
+    def __init__(self, id):
+        self.id = id
@@ -1,13 +1,25 @@
 from argparse import ArgumentParser
 from configparser import RawConfigParser
 from logging import DEBUG, getLogger, INFO, basicConfig
+from os.path import join
+from threading import Event
 
 from tweepy import API, OAuthHandler, Stream
 
-from wxmonitor.cache import Cache
-from wxmonitor.reporting import ProcessingImpl, ProcessingWorkerThread, TweetReportOutput
-from wxmonitor.stream_listeners import LoggingStreamListenerAction, PrintingListenerAction, ProcessingListenerAction,\
-    TwitterStreamListener
+from wxmonitor.aggregation import EventLayers, RollingCountyAggregator
+from wxmonitor.cache import BucketCache
+from wxmonitor.dedup import StatusDeduplicator
+from wxmonitor.geolocation import CountyLocator
+from wxmonitor.graphing import ColorScale, CountyMapRenderer, RasterMapRenderer
+from wxmonitor.history import HistoryStore
+from wxmonitor.metrics import MetricsServer, registry
+from wxmonitor.publishing import ReportPublisher
+from wxmonitor.regions import Region, RegionRenderPool, read_regions
+from wxmonitor.reporting import ProcessingImpl, ProcessingImplGroup, ProcessingWorkerThread, ReportTrigger, \
+    TweetReportOutput, default_map_args
+from wxmonitor.snapshot import CacheSnapshotter
+from wxmonitor.stream_listeners import BufferedLoggingListenerAction, PrintingListenerAction, \
+    ProcessingListenerAction, QueuedListenerAction, TwitterStreamListener
 from wxmonitor.weather_categorizer import WeatherCategorizer
 
 logger = getLogger(__name__)
@@ -17,10 +29,77 @@ def parse_args():
     parser = ArgumentParser(description='Weather monitor')
     parser.add_argument('tracking_tag', help='Tracking tag', type=str)
     parser.add_argument('bot_name', help='Bot screen name', type=str)
-    parser.add_argument('places', help='Places File', type=str)
+    parser.add_argument('places', help='Places File (not needed with --regions)', type=str, nargs='?')
+    parser.add_argument('-g', '--regions', help='Region config, reporting on each region separately', default=None)
+    parser.add_argument('--render-workers', help='Processes rendering region maps (0 = render in process)', type=int,
+                        default=0)
     parser.add_argument('-t', '--twitter', help='Twitter configuration (arg = twitter.cfg)', type=str, default="./twitter.cfg")
 
+    parser.add_argument('-i', '--place-index', help='Place index file, rebuilt when the places file changes',
+                        default=None)
+    parser.add_argument('--geotag', help='Place geotagged statuses in the county of their coordinates',
+                        default=False, action='store_true')
+    parser.add_argument('-w', '--workers', help='Categorizer worker processes (0 = categorize in process)',
+                        type=int, default=0)
+    parser.add_argument('-b', '--batch-size', help='Statuses categorized per batch', type=int, default=1)
+    parser.add_argument('--batch-window', help='Max seconds a status waits for its batch', type=float, default=1.0)
+
+    parser.add_argument('-d', '--dispatch-workers', help='Threads running listener actions (0 = on the stream thread)',
+                        type=int, default=0)
+    parser.add_argument('--queue-size', help='Max statuses waiting for dispatch workers', type=int, default=10000)
+    parser.add_argument('--backpressure', help='What to do when the dispatch queue is full',
+                        choices=[QueuedListenerAction.BLOCK, QueuedListenerAction.DROP_OLDEST,
+                                 QueuedListenerAction.DROP_NEWEST],
+                        default=QueuedListenerAction.BLOCK)
+
+    parser.add_argument('-m', '--map-cache', help='Directory caching the projected basemap between runs', default=None)
+    parser.add_argument('-r', '--raster', help='Render reports by compositing over a pre-rendered background',
+                        default=False, action='store_true')
+    parser.add_argument('--color-scale', help='County color scale', choices=[ColorScale.LINEAR, ColorScale.LOG],
+                        default=ColorScale.LINEAR)
+    parser.add_argument('--color-window', help='Reports the color scale bounds are held over', type=int, default=1)
+    parser.add_argument('-e', '--event-layers', help='Also map each event type (hail, flooding, wind...)',
+                        default=False, action='store_true')
+    parser.add_argument('--spotter-weight', help='What a #tspotter status counts for on the event layer maps',
+                        type=float, default=1)
+
+    parser.add_argument('--report-debounce', help='Seconds to wait for more statuses before an early report',
+                        type=float, default=5.0)
+    parser.add_argument('--report-min-interval', help='Minimum seconds between report runs', type=float, default=30.0)
+    parser.add_argument('--county-delta', help='New statuses in a county that trigger an early report', type=int,
+                        default=5)
+
+    parser.add_argument('--publish-attempts', help='Attempts at posting a report before giving up', type=int,
+                        default=5)
+    parser.add_argument('--publish-backoff', help='Seconds before the first retry of a failed report, doubling after',
+                        type=float, default=5.0)
+
+    parser.add_argument('-s', '--snapshot', help='File the cached statuses are snapshotted to and restored from',
+                        default=None)
+    parser.add_argument('--snapshot-interval', help='Seconds between cache snapshots', type=float, default=60)
+
+    parser.add_argument('--dedup', help='Skip categorizing retweets and near duplicates of recent statuses',
+                        default=False, action='store_true')
+    parser.add_argument('--dedup-distance', help='Fingerprint bits near duplicates may differ in (at most 3)',
+                        type=int, default=3)
+    parser.add_argument('--keep-duplicates', help='Count duplicates, with the tags of the status they duplicate',
+                        default=False, action='store_true')
+
+    parser.add_argument('--memo-size', help='Recent texts whose categories are remembered (0 = categorize every '
+                        'status); pays off once about 1 in 5 statuses repeats a recent text word for word',
+                        type=int, default=0)
+
+    parser.add_argument('-a', '--history', help='Directory archiving processed statuses for later queries',
+                        default=None)
+
     parser.add_argument('-l', '--log', help='Log tweet contents', default=None)
+    parser.add_argument('--log-batch', help='Max log rows written per batch', type=int, default=100)
+    parser.add_argument('--log-flush', help='Max seconds a log row waits to be written', type=float, default=1.0)
+    parser.add_argument('--log-rotate-mb', help='Rotate the log at this size', type=float, default=None)
+    parser.add_argument('--log-rotate-hours', help='Rotate the log after this many hours', type=float, default=None)
+    parser.add_argument('--log-compression', help='Compression of rotated logs', choices=['gzip', 'bz2', 'xz', 'none'],
+                        default='gzip')
+    parser.add_argument('--metrics-port', help='Serve Prometheus metrics on this local port', type=int, default=None)
     parser.add_argument('-v', '--verbose', help='Verbose logs', default=False, action='store_true')
 
     return parser.parse_args()
@@ -38,24 +117,128 @@ def main():
 
     api = configure_twitter_api(args.twitter)
 
-    categorizer = WeatherCategorizer(args.places)
-    cache = Cache()
+    metrics_server = None
+    if args.metrics_port is not None:
+        registry.enabled = True
+        metrics_server = MetricsServer(port=args.metrics_port)
+        metrics_server.start()
+    cache_size = registry.gauge("wxmonitor_cache_statuses", "Statuses in the rolling window", ("region",))
+    dedup_size = registry.gauge("wxmonitor_dedup_index_statuses", "Statuses in the duplicate index", ("region",))
+    memo_size = registry.gauge("wxmonitor_categorizer_memo_texts", "Texts in the categorizer memo", ("region",))
+
+    if args.regions:
+        regions = read_regions(args.regions)
+    elif args.places:
+        regions = [Region("tn", args.places, ["tn"], default_map_args, place_index=args.place_index)]
+    else:
+        raise SystemExit("Either a places file or --regions is required")
+
+    # Counties are only qualified by state when the regions could share county names.
+    qualify_counties = args.regions is not None
+
+    renderer_type = RasterMapRenderer if args.raster else CountyMapRenderer
+    renderer_args = {region.name: dict(region.map_args, resolution=region.resolution, cache_dir=args.map_cache,
+                                       color_scale=ColorScale(scale=args.color_scale, window=args.color_window))
+                     for region in regions}
+
+    render_pool = None
+    if args.render_workers > 0:
+        render_pool = RegionRenderPool(renderer_args, renderer_type, workers=args.render_workers)
+
+    tweet_report_generator = TweetReportOutput(tweet_api=api)
+
+    report_wakeup = Event()
+
+    categorizers = []
+    snapshotters = []
+    histories = []
+    deduplicators = []
+    publishers = []
+    processing_actions = []
+    processing_impls = []
+
+    for region in regions:
+        categorizer = WeatherCategorizer(region.places, workers=args.workers, index_file=region.place_index,
+                                         qualify_counties=qualify_counties,
+                                         locator=CountyLocator(states=region.states) if args.geotag else None,
+                                         memo_size=args.memo_size)
+        if categorizer.memo is not None:
+            memo_size.set_function(categorizer.memo.__len__, (region.name,))
+        event_layers = EventLayers(spotter_weight=args.spotter_weight) if args.event_layers else None
+        aggregator = RollingCountyAggregator(event_layers=event_layers)
+        trigger = ReportTrigger(report_wakeup, county_delta=args.county_delta)
+        cache = BucketCache(observers=[aggregator, trigger])
+        cache_size.set_function(cache.__len__, (region.name,))
+
+        if args.snapshot:
+            snapshot_file = args.snapshot if len(regions) == 1 else "{0}.{1}".format(args.snapshot, region.name)
+            snapshotter = CacheSnapshotter(cache, snapshot_file, interval=args.snapshot_interval)
+            snapshotter.restore()
+            snapshotter.start()
+            snapshotters.append(snapshotter)
+
+        if render_pool is not None:
+            map_renderer = render_pool.renderer(region.name)
+        else:
+            map_renderer = renderer_type(**renderer_args[region.name])
+
+        # One publisher per region, as a publisher only keeps the newest of its pending reports.
+        publisher = ReportPublisher(tweet_report_generator, max_attempts=args.publish_attempts,
+                                    backoff=args.publish_backoff)
+        publisher.start()
+        publishers.append(publisher)
+
+        categorizers.append(categorizer)
+        history = None
+        if args.history:
+            history = HistoryStore(args.history if len(regions) == 1 else join(args.history, region.name))
+            history.start()
+            histories.append(history)
+
+        deduplicator = None
+        if args.dedup:
+            deduplicator = StatusDeduplicator(max_distance=args.dedup_distance)
+            dedup_size.set_function(deduplicator.__len__, (region.name,))
+            deduplicators.append((region.name, deduplicator))
+
+        processing_actions.append(ProcessingListenerAction(categorizer, cache, batch_size=args.batch_size,
+                                                           batch_window=args.batch_window, history=history,
+                                                           deduplicator=deduplicator,
+                                                           suppress_duplicates=not args.keep_duplicates))
+        processing_impls.append(ProcessingImpl(reporter=publisher, cacher=cache,
+                                               tracking_tag=args.tracking_tag, aggregator=aggregator,
+                                               map_renderer=map_renderer, state=region.states[0],
+                                               region_name=region.name if len(regions) > 1 else None,
+                                               trigger=trigger, event_layers=event_layers))
 
     logging_action = None
     printer_action = PrintingListenerAction()
-    processing_action = ProcessingListenerAction(categorizer, cache)
 
-    actions = [printer_action, processing_action]
+    actions = [printer_action] + processing_actions
 
     if args.log:
-        logging_action = LoggingStreamListenerAction(args.log)
+        logging_action = BufferedLoggingListenerAction(
+            args.log, batch_size=args.log_batch, flush_interval=args.log_flush,
+            max_bytes=int(args.log_rotate_mb * 1024 * 1024) if args.log_rotate_mb else None,
+            rotate_interval=args.log_rotate_hours * 3600 if args.log_rotate_hours else None,
+            compression=None if args.log_compression == 'none' else args.log_compression)
         logging_action.start_logger()
         actions.append(logging_action)
 
-    tweet_report_generator = TweetReportOutput(tweet_api=api)
+    queued_action = None
+    if args.dispatch_workers > 0:
+        queued_action = QueuedListenerAction(actions, workers=args.dispatch_workers, maxsize=args.queue_size,
+                                             policy=args.backpressure)
+        queued_action.start()
+        actions = [queued_action]
+        registry.gauge("wxmonitor_dispatch_queue_depth", "Statuses waiting for dispatch workers").set_function(
+            lambda: queued_action.queue_depth)
 
-    processing_impl = ProcessingImpl(reporter=tweet_report_generator, cacher=cache, tracking_tag=args.tracking_tag)
-    processing_thread = ProcessingWorkerThread(processor_impl=processing_impl)
+    processing_group = ProcessingImplGroup(processing_impls,
+                                           threads=len(processing_impls) if render_pool is not None else 1)
+    processing_thread = ProcessingWorkerThread(processor_impl=processing_group, wakeup=report_wakeup,
+                                               debounce=args.report_debounce,
+                                               min_interval=args.report_min_interval)
     processing_thread.start()
 
     listener = TwitterStreamListener(bot_screen_name=args.bot_name,  actions_list=actions)
@@ -76,9 +259,41 @@ def main():
     processing_thread.stop()
     stream.disconnect()
 
+    if queued_action:
+        queued_action.stop()
+        logger.info("Dispatch metrics: %s", queued_action.metrics.snapshot())
+
+    for processing_action in processing_actions:
+        processing_action.flush()
+
+    for categorizer in categorizers:
+        categorizer.close()
+        if categorizer.memo is not None:
+            logger.info("Categorizer memo metrics: %s", categorizer.memo.metrics.snapshot())
+
+    for name, deduplicator in deduplicators:
+        logger.info("Dedup metrics for %s: %s", name, deduplicator.metrics.snapshot())
+
+    processing_group.close()
+    if render_pool:
+        render_pool.close()
+
+    for snapshotter in snapshotters:
+        snapshotter.stop()
+
+    for history in histories:
+        history.close()
+
+    for publisher in publishers:
+        publisher.stop()
+        logger.info("Publisher metrics: %s", publisher.metrics.snapshot())
+
     if logging_action:
         logging_action.stop_logger()
 
+    if metrics_server:
+        metrics_server.stop()
+
 
 def configure_twitter_api(twitter_configuration_file):
     config = RawConfigParser()
@@ -0,0 +1,79 @@
+from argparse import ArgumentParser
+from datetime import datetime
+from os.path import splitext
+from time import time
+
+from wxmonitor.aggregation import window_frames
+from wxmonitor.history import HistoryStore
+
+
+def parse_args():
+    parser = ArgumentParser(description='Query the status history archived with --history')
+    parser.add_argument('history', help='History directory', type=str)
+    parser.add_argument('-H', '--hours', help='Hours of history to query', type=float, default=24)
+    parser.add_argument('-u', '--until', help='End of the window as YYYY-MM-DDTHH:MM, local time (default now)',
+                        type=str, default=None)
+    parser.add_argument('-t', '--top', help='Number of counties to list', type=int, default=10)
+    parser.add_argument('-c', '--county', help='Print the timeline of this county', type=str, default=None)
+    parser.add_argument('-m', '--bucket-minutes', help='Timeline bucket size', type=int, default=60)
+    parser.add_argument('--animation', help='Write an animated .gif or .png of the window to this file',
+                        default=None)
+    parser.add_argument('--frame-minutes', help='Minutes between animation frames', type=int, default=5)
+    parser.add_argument('--window-minutes', help='Minutes of statuses counted per animation frame (default one frame)',
+                        type=int, default=None)
+    parser.add_argument('-r', '--resolution', help='Basemap resolution (c, l, i, h, f)', default='h')
+    parser.add_argument('--render-workers', help='Animation frame render processes', type=int, default=0)
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    end = datetime.strptime(args.until, '%Y-%m-%dT%H:%M').timestamp() if args.until else time()
+    start = end - args.hours * 3600
+    store = HistoryStore(args.history)
+
+    print("{0} to {1}: {2} statuses, {3} from spotters".format(
+        datetime.fromtimestamp(start), datetime.fromtimestamp(end), store.status_count(start, end),
+        store.status_count(start, end, spotter_only=True)))
+
+    print("\nTop counties:")
+    for county, count in store.top_counties(start, end, args.top):
+        print("  {0:<30} {1:8d}".format(county, count))
+
+    print("\nEvents:")
+    for event, count in sorted(store.event_counts(start, end).items(), key=lambda item: -item[1]):
+        print("  {0:<30} {1:8d}".format(event, count))
+
+    if args.county:
+        print("\n{0}:".format(args.county))
+        for bucket_start, count in zip(*store.county_series(args.county, start, end, args.bucket_minutes * 60)):
+            print("  {0:%Y-%m-%d %H:%M} {1:8d}".format(datetime.fromtimestamp(bucket_start), count))
+
+    if args.animation:
+        write_animation(store, start, end, args)
+
+
+def write_animation(store, start, end, args):
+    # Imported here so plain queries don't pay for matplotlib and basemap.
+    from wxmonitor.animation import AnimationRenderer
+    from wxmonitor.graphing import RasterMapRenderer
+    from wxmonitor.reporting import default_map_args
+
+    bucket_seconds = args.frame_minutes * 60
+    window_buckets = max(1, (args.window_minutes or args.frame_minutes) // args.frame_minutes)
+    first = start - (window_buckets - 1) * bucket_seconds
+    frames = window_frames(store.county_buckets(first, end, bucket_seconds), start, bucket_seconds, window_buckets)
+
+    animation_renderer = AnimationRenderer(RasterMapRenderer(resolution=args.resolution, **default_map_args),
+                                           workers=args.render_workers,
+                                           image_format=splitext(args.animation)[1][1:].lower())
+    with open(args.animation, "wb") as f:
+        f.write(animation_renderer.render(frames))
+    animation_renderer.close()
+    print("\n{0} frame animation written to {1}".format(len(frames), args.animation))
+
+
+if __name__ == '__main__':
+    main()
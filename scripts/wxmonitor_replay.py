@@ -0,0 +1,108 @@
+from argparse import ArgumentParser
+from logging import DEBUG, getLogger, INFO, basicConfig
+from os.path import splitext
+
+from wxmonitor.aggregation import RollingCountyAggregator, county_count_frames
+from wxmonitor.cache import BucketCache
+from wxmonitor.dedup import StatusDeduplicator
+from wxmonitor.history import HistoryStore
+from wxmonitor.replay import StatusReplayer, read_log
+from wxmonitor.stream_listeners import CountingListenerAction, ProcessingListenerAction, TwitterStreamListener
+from wxmonitor.weather_categorizer import WeatherCategorizer
+
+logger = getLogger(__name__)
+
+
+def parse_args():
+    parser = ArgumentParser(description='Replay a status log through the weather monitor pipeline')
+    parser.add_argument('places', help='Places File', type=str)
+    parser.add_argument('log', help='Status log (csv from --log, or .jsonl)', type=str)
+    parser.add_argument('-s', '--speed', help='Replay speed multiplier (0 = as fast as possible)', type=float,
+                        default=0)
+    parser.add_argument('-n', '--bot-name', help='Bot screen name to ignore', type=str, default='')
+    parser.add_argument('-w', '--workers', help='Categorizer worker processes (0 = categorize in process)',
+                        type=int, default=0)
+    parser.add_argument('-b', '--batch-size', help='Statuses categorized per batch', type=int, default=1)
+    parser.add_argument('-d', '--dedup', help='Skip categorizing retweets and near duplicates of recent statuses',
+                        default=False, action='store_true')
+    parser.add_argument('--keep-duplicates', help='Count duplicates, with the tags of the status they duplicate',
+                        default=False, action='store_true')
+    parser.add_argument('-m', '--memo-size', help='Recent texts whose categories are remembered (pays off once about 1 '
+                        'in 5 statuses repeats a recent text word for word)', type=int, default=0)
+    parser.add_argument('-a', '--history', help='Archive the replayed statuses to this history directory',
+                        default=None)
+    parser.add_argument('-o', '--output', help='Write a report map of the replayed window to this file', default=None)
+    parser.add_argument('--animation', help='Write an animated .gif or .png of the replayed window to this file',
+                        default=None)
+    parser.add_argument('--frame-minutes', help='Minutes of statuses per animation frame', type=int, default=5)
+    parser.add_argument('--render-workers', help='Animation frame render processes', type=int, default=0)
+    parser.add_argument('-v', '--verbose', help='Verbose logs', default=False, action='store_true')
+
+    return parser.parse_args()
+
+
+def main():
+    basicConfig(level=INFO, format='[%(asctime)s - %(filename)s:%(lineno)d - %(funcName)s - %(levelname)s] %(message)s')
+
+    args = parse_args()
+
+    if args.verbose:
+        getLogger('').setLevel(DEBUG)
+
+    categorizer = WeatherCategorizer(args.places, workers=args.workers, memo_size=args.memo_size)
+
+    replayer = StatusReplayer(speed=args.speed or None)
+
+    aggregator = RollingCountyAggregator(timer=replayer.clock)
+    cache = BucketCache(timer=replayer.clock, observers=[aggregator])
+
+    history = HistoryStore(args.history) if args.history else None
+    deduplicator = StatusDeduplicator(timer=replayer.clock) if args.dedup else None
+
+    counting_action = CountingListenerAction()
+    processing_action = ProcessingListenerAction(categorizer, cache, batch_size=args.batch_size,
+                                                 timer=replayer.clock, history=history, deduplicator=deduplicator,
+                                                 suppress_duplicates=not args.keep_duplicates)
+    listener = TwitterStreamListener(bot_screen_name=args.bot_name, actions_list=[counting_action, processing_action])
+
+    replayed, elapsed = replayer.replay(read_log(args.log), listener)
+    processing_action.flush()
+    categorizer.close()
+
+    if history:
+        history.close()
+
+    logger.info("Replayed %d statuses in %.3fs (%.0f statuses/sec), %d processed, %d in window, %d uncategorized",
+                replayed, elapsed, replayed / elapsed if elapsed else 0, counting_action.counter, len(cache),
+                aggregator.uncategorized_count)
+    if deduplicator:
+        logger.info("Dedup metrics: %s", deduplicator.metrics.snapshot())
+    if categorizer.memo is not None:
+        logger.info("Categorizer memo metrics: %s", categorizer.memo.metrics.snapshot())
+
+    if args.output:
+        # Imported here so replays without a report don't pay for matplotlib and basemap.
+        from wxmonitor.reporting import FileReportOutput, ProcessingImpl
+
+        processing_impl = ProcessingImpl(reporter=FileReportOutput(args.output), cacher=cache, tracking_tag="",
+                                         aggregator=aggregator)
+        processing_impl.process()
+        logger.info("Report written to %s", args.output)
+
+    if args.animation:
+        from wxmonitor.animation import AnimationRenderer
+        from wxmonitor.graphing import RasterMapRenderer
+        from wxmonitor.reporting import default_map_args
+
+        end = replayer.clock()
+        frames = county_count_frames(cache.get_statuses(), end - 3600, end, bucket_seconds=args.frame_minutes * 60)
+        animation_renderer = AnimationRenderer(RasterMapRenderer(**default_map_args), workers=args.render_workers,
+                                               image_format=splitext(args.animation)[1][1:].lower())
+        with open(args.animation, "wb") as f:
+            f.write(animation_renderer.render(frames))
+        animation_renderer.close()
+        logger.info("%d frame animation written to %s", len(frames), args.animation)
+
+
+if __name__ == '__main__':
+    main()
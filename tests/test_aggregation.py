@@ -0,0 +1,117 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+from wxmonitor.aggregation import EventLayers, RollingCountyAggregator, county_count_frames, get_layer_counts, \
+    window_frames
+from wxmonitor.utils import get_min_max_county_count, get_seen_counties, get_uncategorized
+
+
+def _status(counties=(), cities=(), timestamp=0, events=(), spotter=False):
+    return Mock(counties=tuple(counties), cities=tuple(cities), timestamp=timestamp, events=tuple(events),
+                spotter=spotter)
+
+
+class RollingCountyAggregatorTests(TestCase):
+    def setUp(self):
+        self.timer = Mock(return_value=0)
+        self.aggregator = RollingCountyAggregator(ttl=10, timer=self.timer)
+
+    def test_counts_match_full_recomputation(self):
+        statuses = [_status(["knox"], ["knoxville"]), _status(["knox", "davidson"]), _status(), _status(["shelby"]),
+                    _status(cities=["nowhere"])]
+        for status in statuses:
+            self.aggregator.add(status)
+
+        seen_counties, minimum, maximum, uncategorized_count = self.aggregator.snapshot()
+        expected = get_seen_counties(statuses)
+
+        self.assertDictEqual(seen_counties, expected)
+        self.assertEqual((minimum, maximum), get_min_max_county_count(expected))
+        self.assertEqual(uncategorized_count, len(get_uncategorized(statuses)))
+        self.assertEqual(len(self.aggregator), 5)
+
+    def test_expire_decrements_counts(self):
+        self.aggregator.add(_status(["knox"]))
+        self.aggregator.add(_status())
+
+        self.timer.return_value = 5
+        self.aggregator.add(_status(["knox", "shelby"]))
+
+        self.timer.return_value = 12
+        self.aggregator.expire()
+
+        self.assertDictEqual(self.aggregator.get_seen_counties(), {"knox": 1, "shelby": 1})
+        self.assertEqual(self.aggregator.get_min_max_county_count(), (1, 1))
+        self.assertEqual(self.aggregator.uncategorized_count, 0)
+        self.assertEqual(len(self.aggregator), 1)
+
+    def test_empty_min_max_matches_utils(self):
+        self.assertEqual(self.aggregator.get_min_max_county_count(), get_min_max_county_count({}))
+
+
+class EventLayerTests(TestCase):
+    def setUp(self):
+        self.timer = Mock(return_value=0)
+        self.event_layers = EventLayers(spotter_weight=3)
+        self.aggregator = RollingCountyAggregator(ttl=10, timer=self.timer, event_layers=self.event_layers)
+        self.statuses = [_status(["knox"], events=["hail", "flooding", "rain"]),
+                         _status(["knox", "davidson"], events=["hail"], spotter=True),
+                         _status(["shelby"], events=["trees are down"]),
+                         _status(events=["wind"]),
+                         _status(["shelby"])]
+
+    def test_groups_events_into_layers(self):
+        self.assertEqual(self.event_layers.layers_of(["rain", "hail", "flood", "trees were down"]),
+                         ("hail", "flooding", "trees down"))
+        self.assertEqual(self.event_layers.layers_of(["tornado"]), ())
+        self.assertEqual(self.event_layers.layers_of(["snow"]), ("snow",))
+
+    def test_weights_spotter_statuses(self):
+        self.assertDictEqual(get_layer_counts(self.statuses, self.event_layers),
+                             {"hail": {"knox": 4, "davidson": 3}, "flooding": {"knox": 1},
+                              "trees down": {"shelby": 1}})
+
+    def test_layer_counts_match_full_recomputation(self):
+        for status in self.statuses:
+            self.aggregator.add(status)
+
+        self.assertDictEqual(self.aggregator.layer_snapshot(), get_layer_counts(self.statuses, self.event_layers))
+        self.assertDictEqual(self.aggregator.get_seen_counties(), {"knox": 2, "davidson": 1, "shelby": 2})
+
+    def test_expire_removes_layer_counts(self):
+        self.aggregator.add(self.statuses[0])
+        self.timer.return_value = 5
+        self.aggregator.add(self.statuses[1])
+
+        self.timer.return_value = 11
+        self.aggregator.expire()
+
+        self.assertDictEqual(self.aggregator.layer_snapshot(), {"hail": {"knox": 3, "davidson": 3}})
+
+    def test_no_layers_by_default(self):
+        aggregator = RollingCountyAggregator(ttl=10, timer=self.timer)
+        aggregator.add(self.statuses[0])
+
+        self.assertDictEqual(aggregator.layer_snapshot(), {})
+
+
+class CountyCountFramesTests(TestCase):
+    def setUp(self):
+        self.statuses = [_status(["knox"], timestamp=5), _status(["knox", "davidson"], timestamp=15),
+                         _status(["davidson"], timestamp=25), _status(["shelby"], timestamp=40)]
+
+    def test_counts_each_bucket(self):
+        frames = county_count_frames(self.statuses, 10, 40, bucket_seconds=10)
+
+        self.assertListEqual(frames, [(20, {"knox": 1, "davidson": 1}), (30, {"davidson": 1}), (40, {})])
+
+    def test_counts_trailing_window(self):
+        frames = county_count_frames(self.statuses, 10, 40, bucket_seconds=10, window_seconds=20)
+
+        self.assertListEqual(frames, [(20, {"knox": 2, "davidson": 1}), (30, {"knox": 1, "davidson": 2}),
+                                      (40, {"davidson": 1})])
+
+    def test_window_frames_lead_in(self):
+        frames = window_frames([{"knox": 1}, {"knox": 2}, {}], 100, 60, window_buckets=2)
+
+        self.assertListEqual(frames, [(160, {"knox": 3}), (220, {"knox": 2})])
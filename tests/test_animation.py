@@ -0,0 +1,54 @@
+from io import BytesIO
+from unittest import TestCase
+
+from PIL import Image, ImageSequence
+
+from wxmonitor.animation import AnimationRenderer
+from wxmonitor.graphing import ColorScale, RasterMapRenderer
+from wxmonitor.reporting import default_map_args
+
+frames = [(1586649600 + i * 300, {"knox": i + 1, "davidson": 4 - i}) for i in range(4)]
+
+
+class AnimationRendererTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.renderer = RasterMapRenderer(resolution="c", figsize=(6, 3), **default_map_args)
+
+    def _frames(self, animation):
+        image = Image.open(BytesIO(animation))
+        return image.format, [frame.convert("RGB") for frame in ImageSequence.Iterator(image)]
+
+    def test_renders_gif_frames(self):
+        image_format, images = self._frames(AnimationRenderer(self.renderer).render(frames))
+
+        self.assertEqual(image_format, "GIF")
+        self.assertEqual(len(images), 4)
+        self.assertEqual(images[0].size, (600, 300))
+
+    def test_renders_animated_png(self):
+        image_format, images = self._frames(AnimationRenderer(self.renderer, image_format="png",
+                                                              color_scale=ColorScale(scale="log")).render(frames))
+
+        self.assertEqual(image_format, "PNG")
+        self.assertEqual(len(images), 4)
+
+    def test_frames_share_color_range(self):
+        _, images = self._frames(AnimationRenderer(self.renderer, image_format="png").render(frames))
+        davidson = self.renderer.county_ids[b"tn_davidson"]
+        pixel = self.renderer._pixel_index[self.renderer._pixel_ids == davidson][0]
+
+        # Davidson goes from the largest count to the smallest, red to blue.
+        self.assertEqual(images[0].getpixel((pixel % 600, pixel // 600)), (255, 0, 0))
+        self.assertEqual(images[-1].getpixel((pixel % 600, pixel // 600)), (0, 0, 255))
+
+    def test_renders_in_worker_processes(self):
+        animation_renderer = AnimationRenderer(self.renderer, workers=2)
+        try:
+            self.assertEqual(animation_renderer.render(frames), AnimationRenderer(self.renderer).render(frames))
+        finally:
+            animation_renderer.close()
+
+    def test_rejects_unknown_format(self):
+        with self.assertRaises(ValueError):
+            AnimationRenderer(self.renderer, image_format="mp4")
@@ -1,7 +1,7 @@
 from unittest import TestCase
 from unittest.mock import Mock
 
-from wxmonitor.cache import Cache
+from wxmonitor.cache import BucketCache, Cache, TextStore
 
 
 class ProcessedCacheTests(TestCase):
@@ -38,3 +38,117 @@ class ProcessedCacheTests(TestCase):
 
         self.assertEqual(len(cache), 0)
 
+
+    def test_notifies_observers(self):
+        observer = Mock()
+        cache = Cache(ttl=10, observers=[observer])
+        sample = Mock(val=42)
+
+        cache.add(sample)
+        cache.expire()
+
+        observer.add.assert_called_once_with(sample)
+        observer.expire.assert_called_once_with()
+
+
+class BucketCacheTests(TestCase):
+    def setUp(self):
+        self.timer = Mock(return_value=0)
+        self.cache = BucketCache(ttl=10, timer=self.timer, bucket_seconds=5)
+
+    def test_can_get_statuses_in_order(self):
+        samples = [Mock(val=i) for i in range(3)]
+        for i, sample in enumerate(samples):
+            self.timer.return_value = i * 4
+            self.cache.add(sample)
+
+        self.assertListEqual(self.cache.get_statuses(), samples)
+        self.assertEqual(len(self.cache), 3)
+
+    def test_expires_whole_buckets(self):
+        self.cache.add(Mock(val=1))
+        self.timer.return_value = 6
+        self.cache.add(Mock(val=2))
+
+        self.timer.return_value = 14.9
+        self.cache.expire()
+        self.assertEqual(len(self.cache), 2)
+
+        self.timer.return_value = 15
+        self.cache.expire()
+        self.assertEqual([s.val for s in self.cache.get_statuses()], [2])
+
+    def test_adds_after_everything_expired(self):
+        self.cache.add(Mock(val=1))
+        self.timer.return_value = 100
+        self.cache.expire()
+        self.cache.add(Mock(val=2))
+
+        self.assertEqual([s.val for s in self.cache.get_statuses()], [2])
+
+    def test_notifies_observers(self):
+        observer = Mock()
+        cache = BucketCache(ttl=10, observers=[observer])
+        sample = Mock(val=42)
+
+        cache.add(sample)
+        cache.expire()
+
+        observer.add.assert_called_once_with(sample)
+        observer.expire.assert_called_once_with()
+
+    def test_adds_at_explicit_timestamp(self):
+        self.timer.return_value = 12
+        self.cache.add(Mock(val=3))
+        self.cache.add(Mock(val=1), timestamp=0)
+        self.cache.add(Mock(val=2), timestamp=6)
+
+        self.assertEqual([s.val for s in self.cache.get_statuses()], [1, 2, 3])
+
+        self.timer.return_value = 15
+        self.cache.expire()
+        self.assertEqual([s.val for s in self.cache.get_statuses()], [2, 3])
+
+    def test_passes_explicit_timestamp_to_observers(self):
+        observer = Mock()
+        cache = BucketCache(ttl=10, observers=[observer])
+        sample = Mock(val=42)
+
+        cache.add(sample, timestamp=5)
+
+        observer.add.assert_called_once_with(sample, 5)
+
+
+class TextStoreTests(TestCase):
+    def test_expires_texts_with_cache(self):
+        timer = Mock(return_value=0)
+        text_store = TextStore(ttl=10, timer=timer)
+        cache = Cache(ttl=10, timer=timer, observers=[text_store])
+
+        text_store[1] = "hail"
+        cache.add(Mock(status_id=1))
+        timer.return_value = 8
+        text_store[2] = "wind"
+        cache.add(Mock(status_id=2))
+
+        timer.return_value = 15
+        cache.expire()
+        self.assertNotIn(1, text_store)
+        self.assertEqual(text_store[2], "wind")
+        self.assertEqual(len(text_store), 1)
+
+    def test_keeps_texts_of_last_live_bucket(self):
+        timer = Mock(return_value=0)
+        text_store = TextStore(ttl=10, timer=timer, bucket_seconds=5)
+        cache = BucketCache(ttl=10, timer=timer, bucket_seconds=5, observers=[text_store])
+
+        text_store[1] = "hail"
+        cache.add(Mock(status_id=1))
+
+        timer.return_value = 12
+        self.assertEqual(len(cache.get_statuses()), 1)
+        self.assertEqual(text_store[1], "hail")
+
+        timer.return_value = 15
+        self.assertEqual(len(cache.get_statuses()), 0)
+        self.assertNotIn(1, text_store)
@@ -0,0 +1,79 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+from wxmonitor.dedup import StatusDeduplicator, simhash, text_features
+
+
+def _status(status_id, text, retweeted_id=None):
+    return Mock(id=status_id, text=text, retweeted_status=None if retweeted_id is None else Mock(id=retweeted_id))
+
+
+warning = "Tornado warning for Davidson County until 5:45 PM. Take shelter now!"
+
+
+class SimHashTests(TestCase):
+    def test_fingerprints_equal_texts_alike_and_other_texts_apart(self):
+        features = text_features("tornado warning for davidson county until 5 45 pm take shelter now".split())
+        other = simhash(text_features("flooding reported on i 40 near the airport".split()))
+
+        self.assertEqual(simhash(features), simhash(list(features)))
+        self.assertLess(simhash(features), 1 << 64)
+        self.assertGreater(bin(simhash(features) ^ other).count("1"), 16)
+
+
+class StatusDeduplicatorTests(TestCase):
+    def setUp(self):
+        self.timer = Mock(return_value=0)
+        self.deduplicator = StatusDeduplicator(ttl=60, maxsize=3, timer=self.timer)
+
+    def test_matches_copies_ignoring_case_urls_and_retweet_prefix(self):
+        entry, duplicate = self.deduplicator.check(_status(1, warning))
+        self.assertFalse(duplicate)
+        entry.tags = {"counties": ["davidson"]}
+
+        for status in (_status(2, warning.upper() + " https://t.co/abc"), _status(3, "RT @nws: " + warning)):
+            match, duplicate = self.deduplicator.check(status)
+            self.assertTrue(duplicate)
+            self.assertIs(match, entry)
+
+        self.assertFalse(self.deduplicator.check(_status(4, "Flooding reported on I-40 near the airport"))[1])
+
+    def test_matches_retweets_by_id(self):
+        entry, _ = self.deduplicator.check(_status(1, "hail!"))
+
+        self.assertIs(self.deduplicator.check(_status(2, "RT @a: hail!", retweeted_id=1))[0], entry)
+        self.assertFalse(self.deduplicator.check(_status(3, "hail!"))[1])
+
+        retweet, _ = self.deduplicator.check(_status(4, "RT @b: wind", retweeted_id=99))
+        self.assertIs(self.deduplicator.check(_status(5, "RT @c: wind", retweeted_id=99))[0], retweet)
+
+    def test_discarded_status_is_not_matched(self):
+        entry, _ = self.deduplicator.check(_status(1, warning))
+        self.deduplicator.discard(entry)
+
+        self.assertFalse(self.deduplicator.check(_status(2, "RT @nws: " + warning, retweeted_id=1))[1])
+        self.assertEqual(len(self.deduplicator), 1)
+
+    def test_expires_after_ttl(self):
+        self.deduplicator.check(_status(1, warning))
+        self.timer.return_value = 61
+
+        self.assertFalse(self.deduplicator.check(_status(2, warning))[1])
+        self.assertEqual(len(self.deduplicator), 1)
+
+    def test_stays_within_maxsize(self):
+        for i in range(10):
+            self.deduplicator.check(_status(i, "storm report number {0} from the county line".format("abcdefghij"[i])))
+            self.assertLessEqual(len(self.deduplicator), 3)
+
+        self.assertLessEqual(sum(len(index) for index in self.deduplicator._band_index), 3 * 4)
+        self.assertLessEqual(len(self.deduplicator._retweets), 3)
+
+    def test_reports_hit_rate(self):
+        self.deduplicator.check(_status(1, warning))
+        self.deduplicator.check(_status(2, warning))
+        self.deduplicator.check(_status(3, "x", retweeted_id=1))
+        self.deduplicator.check(_status(4, "Flooding reported on I-40 near the airport"))
+
+        self.assertDictEqual(self.deduplicator.metrics.snapshot(),
+                             {"unique": 2, "retweet": 1, "near_duplicate": 1, "hit_rate": 0.5})
@@ -0,0 +1,54 @@
+from os.path import dirname, join
+from unittest import TestCase
+from unittest.mock import Mock
+
+from wxmonitor.geolocation import CountyLocator, status_point
+from wxmonitor.weather_categorizer import WeatherCategorizer
+
+places_file = join(dirname(__file__), "data", "tn_places.txt")
+
+
+def _point(lon, lat):
+    return {"type": "Point", "coordinates": [lon, lat]}
+
+
+class StatusPointTests(TestCase):
+    def test_reads_geojson_point(self):
+        self.assertEqual(status_point(Mock(coordinates=_point(-83.92, 35.96))), (-83.92, 35.96))
+
+    def test_no_coordinates(self):
+        self.assertIsNone(status_point(Mock(coordinates=None)))
+        self.assertIsNone(status_point(Mock(coordinates={"type": "Point"})))
+
+
+class CountyLocatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.locator = CountyLocator(states=["tn"])
+
+    def test_locates_points(self):
+        self.assertEqual(self.locator.locate(-83.92, 35.96), ("tn", "knox"))
+        self.assertEqual(self.locator.locate(-86.78, 36.16), ("tn", "davidson"))
+
+    def test_points_outside_the_states(self):
+        self.assertIsNone(self.locator.locate(-84.39, 33.75))
+        self.assertIsNone(self.locator.locate(-60.0, 30.0))
+
+    def test_adds_geotagged_county_to_tags(self):
+        categorizer = WeatherCategorizer(places_file, locator=self.locator)
+
+        tags = categorizer.process(Mock(text="hail!", coordinates=_point(-83.92, 35.96)))
+        self.assertListEqual(tags["counties"], ["knox"])
+
+        tags = categorizer.process(Mock(text="hail in knoxville", coordinates=_point(-83.92, 35.96)))
+        self.assertListEqual(tags["counties"], ["knox"])
+
+        tags = categorizer.process_batch([Mock(text="hail", coordinates=None),
+                                          Mock(text="rain", coordinates=_point(-86.78, 36.16))])
+        self.assertListEqual([t["counties"] for t in tags], [[], ["davidson"]])
+
+    def test_qualified_geotagged_county(self):
+        categorizer = WeatherCategorizer(places_file, qualify_counties=True, locator=self.locator)
+
+        tags = categorizer.process(Mock(text="hail!", coordinates=_point(-83.92, 35.96)))
+        self.assertListEqual(tags["counties"], ["tn:knox"])
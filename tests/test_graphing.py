@@ -1,6 +1,17 @@
+import pickle
+from io import BytesIO
+from shutil import rmtree
+from tempfile import mkdtemp
 from unittest import TestCase
+from unittest.mock import patch
 
-from wxmonitor.graphing import get_rgb
+import numpy as np
+from matplotlib import pyplot as plt
+from PIL import Image
+
+from wxmonitor.graphing import ColorScale, CountyMapRenderer, RasterMapRenderer, get_rgb, get_rgb_array, \
+    load_basemap
+from wxmonitor.reporting import default_map_args
 
 
 class GetRGBTests(TestCase):
@@ -27,3 +38,108 @@ class GetRGBTests(TestCase):
     def test_get_rgb_interp_high(self):
         rgb = get_rgb(75, 0, 100)
         self.assertListEqual(rgb, [0.5, 0.5, 0])
+
+
+class GetRGBArrayTests(TestCase):
+    def test_matches_get_rgb(self):
+        values = [0, 100, 50, 25, 75, 10, 90]
+        expected = [get_rgb(value, 0, 100) for value in values]
+        self.assertListEqual(get_rgb_array(values, 0, 100).tolist(), expected)
+
+    def test_equal_min_max_is_mid(self):
+        self.assertListEqual(get_rgb_array([5, 5], 5, 5).tolist(), [[0, 1, 0], [0, 1, 0]])
+
+
+class ColorScaleTests(TestCase):
+    def test_linear_uses_count_bounds(self):
+        self.assertListEqual(ColorScale().colors([0, 50, 100]).tolist(), [[0, 0, 1], [0, 1, 0], [1, 0, 0]])
+
+    def test_fixed_bounds(self):
+        self.assertListEqual(ColorScale(minimum=0, maximum=100).colors([25]).tolist(), [[0, 0.5, 0.5]])
+
+    def test_clips_counts_outside_fixed_bounds(self):
+        self.assertListEqual(ColorScale(minimum=5, maximum=10).colors([20, 0]).tolist(), [[1, 0, 0], [0, 0, 1]])
+        self.assertListEqual(ColorScale(minimum=0, maximum=10, scale=ColorScale.LOG).colors([20]).tolist(),
+                             [[1, 0, 0]])
+
+    def test_log_scale(self):
+        colors = ColorScale(scale=ColorScale.LOG).colors([1, 10, 100])
+        self.assertListEqual(colors[[0, 2]].tolist(), [[0, 0, 1], [1, 0, 0]])
+        self.assertGreater(colors[1][1], ColorScale().colors([1, 10, 100])[1][1])
+
+    def test_rolling_bounds(self):
+        scale = ColorScale(window=2)
+        scale.colors([1, 10])
+        self.assertEqual(scale.bounds([4, 5]), (1, 10))
+        self.assertEqual(scale.bounds([4, 5]), (4, 5))
+
+    def test_layers_have_own_windows(self):
+        scale = ColorScale(window=2)
+        scale.colors([1, 10])
+        self.assertEqual(scale.bounds([50, 100], layer="hail"), (50, 100))
+        self.assertEqual(scale.bounds([4, 5]), (1, 10))
+
+    def test_fixed_keeps_configured_ends(self):
+        scale = ColorScale(minimum=0, scale=ColorScale.LOG).fixed(5, 50)
+        self.assertEqual(scale.bounds([10, 20]), (0, 50))
+        self.assertEqual(scale.bounds([100]), (0, 50))
+
+
+class CountyMapRendererTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = mkdtemp()
+        cls.renderer = CountyMapRenderer(resolution="c", cache_dir=cls.cache_dir, **default_map_args)
+        cls.renderer.render({"davidson": 2, "knox": 1}, 1, 2)
+
+    @classmethod
+    def tearDownClass(cls):
+        plt.close("all")
+        rmtree(cls.cache_dir)
+
+    def _visible(self):
+        return sorted(key for key, patch in self.renderer._patches.items() if patch.get_visible())
+
+    def test_render_recolors_existing_patches(self):
+        figure = self.renderer.render({"knox": 3, "shelby": 1}, 1, 3)
+
+        self.assertIs(figure, self.renderer.figure)
+        self.assertListEqual(self._visible(), [b"tn_knox", b"tn_shelby"])
+        self.assertEqual(len(self.renderer._patches), 3)
+
+    def test_loads_basemap_from_cache_dir(self):
+        with patch("wxmonitor.graphing.build_basemap") as build_basemap:
+            m = load_basemap(cache_dir=self.cache_dir, resolution="c", **default_map_args)
+
+        build_basemap.assert_not_called()
+        self.assertIn(b"tn_knox", m.county_poly_map)
+
+
+class RasterMapRendererTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.renderer = RasterMapRenderer(resolution="c", figsize=(6, 3), **default_map_args)
+        cls.image = np.asarray(Image.open(BytesIO(cls.renderer.render({"davidson": 1, "knox": 3}, 1, 3))))
+        cls.empty = np.asarray(Image.open(BytesIO(cls.renderer.render({}, 1, 3))))
+
+    def _pixels(self, county):
+        county_id = self.renderer.county_ids[county]
+        return self.renderer._pixel_index[self.renderer._pixel_ids == county_id]
+
+    def test_renders_figure_sized_png(self):
+        self.assertEqual(self.image.shape, (300, 600, 3))
+
+    def test_colors_seen_counties(self):
+        self.assertTrue((self.image.reshape(-1, 3)[self._pixels(b"tn_davidson")] == [0, 0, 255]).all())
+        self.assertTrue((self.image.reshape(-1, 3)[self._pixels(b"tn_knox")] == [255, 0, 0]).all())
+
+    def test_unseen_counties_show_background(self):
+        pixels = self._pixels(b"tn_shelby")
+        self.assertTrue(len(pixels) > 0)
+        self.assertTrue((self.image.reshape(-1, 3)[pixels] == self.empty.reshape(-1, 3)[pixels]).all())
+
+    def test_pickles_labelled_raster_only(self):
+        renderer = pickle.loads(pickle.dumps(self.renderer))
+
+        self.assertIsNone(renderer._vector)
+        self.assertTrue((renderer.composite({"davidson": 1, "knox": 3}, 1, 3) == self.image).all())
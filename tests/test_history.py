@@ -0,0 +1,98 @@
+from os import listdir
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import sleep
+from unittest import TestCase
+
+from wxmonitor.history import HistoryStore
+from wxmonitor.stream_listeners import ProcessedStatus
+
+# 2020-04-12 00:00:00 UTC
+day = 1586649600.0
+
+
+def _status(timestamp, counties=(), events=(), spotter=False):
+    return ProcessedStatus(timestamp, 1, (), tuple(counties), tuple(events), spotter)
+
+
+class HistoryStoreTests(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.store = HistoryStore(self.directory, flush_rows=2)
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def _add(self, *statuses):
+        for status in statuses:
+            self.store.add(status)
+
+    def test_flushes_in_background(self):
+        store = HistoryStore(self.directory, flush_rows=100, flush_interval=0.05)
+        store.start()
+        self.addCleanup(store.close)
+        store.add(_status(day + 60))
+        sleep(0.3)
+
+        self.assertEqual(HistoryStore(self.directory).status_count(day, day + 3600), 1)
+
+    def test_partitions_by_day(self):
+        self._add(_status(day + 10, ["knox"]), _status(day + 86400 + 10, ["knox"]), _status(day + 20, ["blount"]))
+        self.store.close()
+
+        self.assertListEqual(sorted(listdir(self.directory)), ["20200412", "20200413", "names.json"])
+        self.assertListEqual(self.store.partitions(day, day + 3600), ["20200412"])
+
+    def test_counts_within_window(self):
+        self._add(_status(day + 10, ["knox"], ["tornado"], spotter=True),
+                  _status(day + 20, ["knox", "blount"], ["hail"]),
+                  _status(day + 86400 + 10, ["blount"], ["tornado"]),
+                  _status(day + 2 * 86400, ["knox"]))
+
+        self.assertEqual(self.store.status_count(), 4)
+        self.assertEqual(self.store.status_count(day, day + 2 * 86400), 3)
+        self.assertEqual(self.store.status_count(day, day + 2 * 86400, spotter_only=True), 1)
+        self.assertDictEqual(self.store.county_counts(day, day + 2 * 86400), {"knox": 2, "blount": 2})
+        self.assertDictEqual(self.store.county_counts(day + 15, day + 86400), {"knox": 1, "blount": 1})
+        self.assertDictEqual(self.store.event_counts(day, day + 86400), {"tornado": 1, "hail": 1})
+        self.assertListEqual(self.store.top_counties(limit=1), [("knox", 3)])
+
+    def test_county_series(self):
+        self._add(_status(day + 10, ["knox"]), _status(day + 3600 * 2 + 5, ["knox"]),
+                  _status(day + 3600 * 2 + 6, ["knox", "blount"]), _status(day + 3600 * 5, ["knox"]))
+
+        starts, counts = self.store.county_series("knox", day, day + 3600 * 3, bucket_seconds=3600)
+
+        self.assertListEqual(list(starts), [day, day + 3600, day + 7200])
+        self.assertListEqual(list(counts), [1, 0, 2])
+        self.assertListEqual(list(self.store.county_series("shelby", day, day + 3600 * 3)[1]), [0, 0, 0])
+
+    def test_county_buckets(self):
+        self._add(_status(day + 10, ["knox"]), _status(day + 400, ["knox", "blount"]), _status(day + 700, ["knox"]))
+
+        self.assertListEqual(self.store.county_buckets(day, day + 900, bucket_seconds=300),
+                             [{"knox": 1}, {"knox": 1, "blount": 1}, {"knox": 1}])
+
+    def test_reopens_existing_history(self):
+        self._add(_status(day + 10, ["knox"], ["tornado"]))
+        self.store.close()
+
+        store = HistoryStore(self.directory)
+        store.add(_status(day + 20, ["blount"], ["tornado"]))
+
+        self.assertDictEqual(store.county_counts(), {"knox": 1, "blount": 1})
+        self.assertDictEqual(store.event_counts(), {"tornado": 2})
+
+    def test_ignores_partial_rows(self):
+        self._add(_status(day + 10, ["knox"]))
+        self.store.close()
+
+        with open(join(self.directory, "20200412", "counties.bin"), "ab") as f:
+            f.write(b"\x00\x01")
+
+        store = HistoryStore(self.directory)
+        self.assertDictEqual(store.county_counts(), {"knox": 1})
+
+        store.add(_status(day + 20, ["knox"]))
+        self.assertDictEqual(store.county_counts(), {"knox": 2})
@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+from wxmonitor.matching import EventMatcher, PhraseMatcher, normalize_text, tokenize
+
+
+class PhraseMatcherTests(TestCase):
+    def _findall(self, matcher, content):
+        return matcher.findall(content, tokenize(content))
+
+    def test_matches_whole_words_only(self):
+        matcher = PhraseMatcher(["knox"])
+        self.assertListEqual(self._findall(matcher, "knoxville and knox"), ["knox"])
+
+    def test_matches_multi_word_phrase(self):
+        matcher = PhraseMatcher(["white house", "nashville-davidson metropolitan government"])
+        content = "hail in white house and nashville-davidson metropolitan government"
+        self.assertListEqual(self._findall(matcher, content),
+                             ["white house", "nashville-davidson metropolitan government"])
+
+    def test_separators_must_match(self):
+        matcher = PhraseMatcher(["white house"])
+        self.assertListEqual(self._findall(matcher, "white  house white-house"), [])
+
+    def test_prefers_longest_match(self):
+        matcher = PhraseMatcher(["johnson", "johnson city"])
+        self.assertListEqual(self._findall(matcher, "johnson city and johnson"), ["johnson city", "johnson"])
+
+
+class EventMatcherTests(TestCase):
+    def setUp(self):
+        self.matcher = EventMatcher(["hail", "wind", "flood", "flooding"], [("trees", "down")])
+
+    def _findall(self, content):
+        return self.matcher.findall(content, tokenize(content))
+
+    def test_matches_words(self):
+        self.assertListEqual(self._findall("hail and flooding, no flood"), ["hail", "flooding", "flood"])
+
+    def test_matches_span(self):
+        self.assertListEqual(self._findall("hail then trees are down"), ["hail", "trees are down"])
+
+    def test_span_covers_inner_words(self):
+        self.assertListEqual(self._findall("trees and wind down"), ["trees and wind down"])
+
+    def test_span_does_not_cross_lines(self):
+        self.assertListEqual(self._findall("trees\ndown wind"), ["wind"])
+
+
+class NormalizeTextTests(TestCase):
+    def test_drops_urls_retweet_prefix_and_spacing(self):
+        self.assertEqual(normalize_text("RT @NWSNashville:  Tornado WARNING for Davidson https://t.co/Ab1\n"),
+                         "tornado warning for davidson")
@@ -0,0 +1,99 @@
+from unittest import TestCase
+from unittest.mock import Mock
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from wxmonitor.metrics import MetricsRegistry, MetricsServer, registry
+from wxmonitor.stream_listeners import CountingListenerAction, QueuedListenerAction, TwitterStreamListener
+
+
+class MetricsRegistryTests(TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry(enabled=True)
+
+    def test_disabled_registry_records_nothing(self):
+        self.registry.enabled = False
+        counter = self.registry.counter("statuses_total", "Statuses")
+        histogram = self.registry.histogram("latency_seconds", "Latency")
+
+        counter.inc()
+        histogram.observe(0.1)
+
+        self.assertEqual(counter.value(), 0)
+        self.assertEqual(histogram.count(), 0)
+
+    def test_counter(self):
+        counter = self.registry.counter("errors_total", "Errors", ("code",))
+        counter.inc(labels=(420,))
+        counter.inc(2, labels=(420,))
+
+        self.assertIs(self.registry.counter("errors_total", "Errors", ("code",)), counter)
+        self.assertIn('errors_total{code="420"} 3', self.registry.render())
+
+    def test_gauge_function(self):
+        self.registry.gauge("cache_statuses", "Statuses", ("region",)).set_function(lambda: 7, ("tn",))
+
+        self.assertIn('cache_statuses{region="tn"} 7', self.registry.render())
+
+    def test_histogram(self):
+        histogram = self.registry.histogram("render_seconds", "Render time", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value)
+
+        text = self.registry.render()
+        self.assertIn("# TYPE render_seconds histogram", text)
+        self.assertIn('render_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('render_seconds_bucket{le="1.0"} 3', text)
+        self.assertIn('render_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn("render_seconds_sum 6.05", text)
+        self.assertIn("render_seconds_count 4", text)
+
+    def test_rejects_type_change(self):
+        self.registry.counter("things", "Things")
+        with self.assertRaises(ValueError):
+            self.registry.histogram("things", "Things")
+
+
+class MetricsServerTests(TestCase):
+    def test_serves_metrics(self):
+        metrics_registry = MetricsRegistry(enabled=True)
+        metrics_registry.counter("statuses_total", "Statuses").inc()
+        server = MetricsServer(metrics_registry, port=0)
+        server.start()
+        try:
+            with urlopen("http://127.0.0.1:{0}/metrics".format(server.port)) as response:
+                self.assertIn("statuses_total 1", response.read().decode("UTF8"))
+
+            with self.assertRaises(HTTPError):
+                urlopen("http://127.0.0.1:{0}/other".format(server.port))
+        finally:
+            server.stop()
+
+
+class StreamListenerMetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        registry.enabled = True
+
+    def tearDown(self):
+        registry.enabled = False
+        registry.reset()
+
+    def test_records_statuses_and_errors(self):
+        listener = TwitterStreamListener("bot", [Mock()])
+
+        listener.on_status(Mock(user=Mock(screen_name="someone")))
+        listener.on_error(420)
+
+        text = registry.render()
+        self.assertIn("wxmonitor_statuses_received_total 1", text)
+        self.assertIn('wxmonitor_action_seconds_count{action="Mock"} 1', text)
+        self.assertIn('wxmonitor_twitter_errors_total{code="420"} 1', text)
+
+    def test_records_queued_action_latency(self):
+        queued_action = QueuedListenerAction([CountingListenerAction()])
+
+        queued_action.process(Mock())
+        queued_action.run_pending(timeout=1)
+
+        self.assertIn('wxmonitor_action_seconds_count{action="CountingListenerAction"} 1', registry.render())
@@ -0,0 +1,66 @@
+from os.path import dirname, join
+from shutil import copyfile, rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from wxmonitor.place_index import PlaceIndexError, build_place_index, load_place_index, read_place_index, \
+    source_hash
+from wxmonitor.weather_categorizer import WeatherCategorizer
+
+places_file = join(dirname(__file__), "data", "tn_places.txt")
+
+
+def _normalize(tags):
+    return {key: sorted(value) if isinstance(value, list) else value for key, value in tags.items()}
+
+
+class PlaceIndexTests(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.places = join(self.directory, "places.txt")
+        self.index_file = join(self.directory, "places.idx")
+        copyfile(places_file, self.places)
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_round_trips_place_data(self):
+        built = build_place_index(self.places, self.index_file)
+        loaded = read_place_index(self.index_file, source_hash(self.places))
+
+        self.assertSetEqual(loaded.cities, built.cities)
+        self.assertSetEqual(loaded.counties, built.counties)
+        self.assertDictEqual(loaded.city_county_map, built.city_county_map)
+
+    def test_rejects_index_of_other_place_file(self):
+        build_place_index(self.places, self.index_file)
+        with open(self.places, "a") as f:
+            f.write("TN|47|99999|Newtown city|Incorporated Place|A|Knox County\n")
+
+        with self.assertRaises(PlaceIndexError):
+            read_place_index(self.index_file, source_hash(self.places))
+
+    def test_rejects_other_files(self):
+        with open(self.index_file, "wb") as f:
+            f.write(b"garbage" * 10)
+
+        with self.assertRaises(PlaceIndexError):
+            read_place_index(self.index_file)
+
+    def test_load_rebuilds_stale_index(self):
+        build_place_index(self.places, self.index_file)
+        with open(self.places, "a") as f:
+            f.write("TN|47|99999|Newtown city|Incorporated Place|A|Knox County\n")
+
+        index = load_place_index(self.places, self.index_file)
+
+        self.assertIn("newtown", index.cities)
+        self.assertIn("newtown", read_place_index(self.index_file, source_hash(self.places)).cities)
+
+    def test_indexed_categorizer_matches_parsed(self):
+        text = "Trees down in Knoxville and flooding in Davidson County"
+        parsed = WeatherCategorizer(self.places)
+        WeatherCategorizer(self.places, index_file=self.index_file)
+        indexed = WeatherCategorizer(self.places, index_file=self.index_file)
+
+        self.assertDictEqual(_normalize(indexed.process_text(text)), _normalize(parsed.process_text(text)))
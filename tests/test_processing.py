@@ -1 +1,179 @@
-# TODO
\ No newline at end of file
+from threading import Event
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from wxmonitor.aggregation import EventLayers, RollingCountyAggregator
+from wxmonitor.cache import Cache
+from wxmonitor.reporting import ProcessingImpl, ProcessingWorkerThread, ReportTrigger
+
+
+def _status(counties=(), cities=(), events=(), spotter=False):
+    return Mock(counties=tuple(counties), cities=tuple(cities), events=tuple(events), spotter=spotter)
+
+
+class ProcessingImplTests(TestCase):
+    statuses = [_status(["knox"], ["knoxville"]), _status(["knox", "davidson"]), _status()]
+
+    def _render_args(self, aggregated):
+        aggregator = RollingCountyAggregator(ttl=10) if aggregated else None
+        cache = Cache(ttl=10, observers=[aggregator] if aggregated else None)
+        reporter = Mock()
+
+        for status in self.statuses:
+            cache.add(status)
+
+        impl = ProcessingImpl(reporter=reporter, cacher=cache, tracking_tag="#tag", aggregator=aggregator)
+        with patch.object(impl, "render_map") as render_map:
+            impl.process()
+
+        return render_map.call_args, reporter.create_output.call_args
+
+    def test_reports_on_first_statuses(self):
+        render_args, output_args = self._render_args(aggregated=False)
+
+        self.assertEqual(render_args[0], (2, 1, {"knox": 2, "davidson": 1}))
+        self.assertIn("Total Statuses: 3\nTotal Uncategorized: 1", output_args[1]["summary"])
+
+    def test_aggregator_reports_same_as_cache(self):
+        self.assertEqual(self._render_args(aggregated=True), self._render_args(aggregated=False))
+
+    def test_skips_report_when_counts_unchanged(self):
+        cache = Cache(ttl=10)
+        reporter = Mock()
+        renderer = Mock()
+        renderer.render.return_value = b"png"
+        impl = ProcessingImpl(reporter=reporter, cacher=cache, tracking_tag="#tag", seconds_between_reports=0,
+                              map_renderer=renderer)
+
+        cache.add(_status(["knox"]))
+        impl.process()
+        impl.process()
+        self.assertEqual(renderer.render.call_count, 1)
+        self.assertEqual(reporter.create_output.call_count, 1)
+        self.assertEqual(impl.last_image, b"png")
+
+        cache.add(_status(["knox"]))
+        impl.process()
+        self.assertEqual(renderer.render.call_count, 2)
+        self.assertEqual(reporter.create_output.call_count, 2)
+
+    def test_retries_report_after_render_error(self):
+        cache = Cache(ttl=10)
+        reporter = Mock()
+        renderer = Mock()
+        renderer.render.side_effect = [RuntimeError("render failed"), b"png"]
+        impl = ProcessingImpl(reporter=reporter, cacher=cache, tracking_tag="#tag", seconds_between_reports=0,
+                              map_renderer=renderer)
+
+        cache.add(_status(["knox"]))
+        with self.assertRaises(RuntimeError):
+            impl.process()
+        impl.process()
+
+        self.assertEqual(reporter.create_output.call_count, 1)
+
+    def test_encodes_figures_once_for_outputs(self):
+        cache = Cache(ttl=10)
+        reporter = Mock()
+        figure = Mock()
+        figure.savefig.side_effect = lambda output, format: output.write(format.encode("UTF8"))
+        impl = ProcessingImpl(reporter=reporter, cacher=cache, tracking_tag="#tag",
+                              map_renderer=Mock(render=Mock(return_value=figure)))
+
+        cache.add(_status(["knox"]))
+        impl.process()
+
+        self.assertEqual(reporter.create_output.call_args[1]["image"], b"png")
+        self.assertEqual(figure.savefig.call_count, 1)
+
+    def _layer_output(self, aggregated):
+        event_layers = EventLayers(spotter_weight=2)
+        aggregator = RollingCountyAggregator(ttl=10, event_layers=event_layers) if aggregated else None
+        cache = Cache(ttl=10, observers=[aggregator] if aggregated else None)
+        reporter = Mock()
+        renderer = Mock()
+        renderer.render.side_effect = lambda seen, minimum, maximum, state, layer: repr((layer, seen)).encode("UTF8")
+        impl = ProcessingImpl(reporter=reporter, cacher=cache, tracking_tag="#tag", aggregator=aggregator,
+                              map_renderer=renderer, event_layers=event_layers)
+
+        cache.add(_status(["knox"], events=["hail"], spotter=True))
+        cache.add(_status(["knox", "blount"], events=["flooding", "hail"]))
+        cache.add(_status(["blount"]))
+        impl.process()
+
+        return reporter.create_output.call_args[1]
+
+    def test_renders_event_layers(self):
+        output = self._layer_output(aggregated=True)
+
+        self.assertEqual(output["image"], repr((None, {"knox": 2, "blount": 2})).encode("UTF8"))
+        self.assertDictEqual(output["layers"], {
+            "hail": repr(("hail", {"knox": 3, "blount": 1})).encode("UTF8"),
+            "flooding": repr(("flooding", {"knox": 1, "blount": 1})).encode("UTF8"),
+        })
+        self.assertEqual(output, self._layer_output(aggregated=False))
+
+
+class ReportTriggerTests(TestCase):
+    def setUp(self):
+        self.trigger = ReportTrigger(county_delta=3)
+
+    def test_triggers_on_first_status(self):
+        self.trigger.add(_status(["knox"]))
+
+        self.assertTrue(self.trigger.wakeup.is_set())
+        self.assertTrue(self.trigger.consume())
+        self.assertFalse(self.trigger.consume())
+
+    def test_triggers_on_new_county(self):
+        self.trigger.reported({"knox": 4}, 4)
+
+        self.trigger.add(_status(["knox"]))
+        self.assertFalse(self.trigger.consume())
+
+        self.trigger.add(_status(["knox", "blount"]))
+        self.assertTrue(self.trigger.consume())
+
+    def test_triggers_on_county_delta(self):
+        self.trigger.reported({"knox": 4}, 4)
+
+        for _ in range(2):
+            self.trigger.add(_status(["knox"]))
+        self.assertFalse(self.trigger.consume())
+
+        self.trigger.add(_status(["knox"]))
+        self.assertTrue(self.trigger.consume())
+
+    def test_triggered_impl_reports_before_threshold(self):
+        trigger = ReportTrigger()
+        cache = Cache(ttl=10, observers=[trigger])
+        reporter = Mock()
+        impl = ProcessingImpl(reporter=reporter, cacher=cache, tracking_tag="#tag", trigger=trigger,
+                              map_renderer=Mock(render=Mock(return_value=b"png")))
+
+        cache.add(_status(["knox"]))
+        impl.process()
+        cache.add(_status(["knox"]))
+        impl.process()
+        self.assertEqual(reporter.create_output.call_count, 1)
+
+        cache.add(_status(["blount"]))
+        impl.process()
+        self.assertEqual(reporter.create_output.call_count, 2)
+
+
+class ProcessingWorkerThreadTests(TestCase):
+    def test_wakes_on_trigger(self):
+        wakeup = Event()
+        processed = Event()
+        impl = Mock(seconds_until_report=Mock(return_value=600))
+        impl.process.side_effect = lambda: processed.set() if impl.process.call_count > 1 else None
+        thread = ProcessingWorkerThread(impl, wakeup=wakeup, loop_sleep_timeout=60, debounce=0, min_interval=0)
+
+        thread.start()
+        wakeup.set()
+        self.assertTrue(processed.wait(5))
+
+        thread.stop()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
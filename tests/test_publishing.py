@@ -0,0 +1,122 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+from tweepy import TweepError
+
+from wxmonitor.publishing import ReportPublisher
+from wxmonitor.reporting import TweetReportOutput
+
+
+class FakeTweetAPI(object):
+    """Records uploads like API.update_with_media, failing the first failures calls. Like tweepy, it closes file."""
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+        self.uploads = []
+
+    def update_with_media(self, filename, status=None, file=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise TweepError("Over capacity")
+
+        self.uploads.append((filename, status, file.read()))
+        file.close()
+
+
+class TweetReportOutputTests(TestCase):
+    def test_uploads_image_from_memory(self):
+        api = FakeTweetAPI()
+
+        output = TweetReportOutput(tweet_api=api).create_output(summary="Data over 1hr", image=b"png bytes")
+
+        self.assertListEqual(api.uploads, [("report.png", "Data over 1hr", b"png bytes")])
+        self.assertEqual(output.read(), b"png bytes")
+
+    def test_attaches_layer_maps(self):
+        def media_upload(filename, file):
+            media_id = filename + ":" + file.read().decode()
+            file.close()
+            return Mock(media_id=media_id)
+
+        api = Mock()
+        api.media_upload.side_effect = media_upload
+
+        output = TweetReportOutput(tweet_api=api, max_layers=2).create_output(
+            summary="Data over 1hr", image=b"map", layers={"hail": b"a", "trees down": b"b", "wind": b"c"})
+
+        api.update_status.assert_called_once_with(status="Data over 1hr",
+                                                  media_ids=["report.png:map", "hail.png:a", "trees_down.png:b"])
+        api.update_with_media.assert_not_called()
+        self.assertEqual(output.read(), b"map")
+
+
+class ReportPublisherTests(TestCase):
+    def _publisher(self, api, **args):
+        publisher = ReportPublisher(TweetReportOutput(tweet_api=api), **args)
+        publisher.start()
+        self.addCleanup(publisher.stop, drain=False)
+        return publisher
+
+    def test_publishes_in_background(self):
+        api = FakeTweetAPI()
+        publisher = self._publisher(api)
+
+        publisher.create_output(summary="one", image=b"1")
+        publisher.stop()
+
+        self.assertListEqual(api.uploads, [("report.png", "one", b"1")])
+        metrics = publisher.metrics.snapshot()
+        self.assertEqual(metrics["published"], 1)
+        self.assertEqual(metrics["latency"]["upload"]["count"], 1)
+
+    def test_retries_with_backoff(self):
+        api = FakeTweetAPI(failures=2)
+        publisher = ReportPublisher(TweetReportOutput(tweet_api=api), backoff=0.01)
+
+        publisher.create_output(summary="one", image=b"1")
+        publisher.publish_pending(timeout=0)
+
+        self.assertEqual(api.calls, 3)
+        self.assertListEqual(api.uploads, [("report.png", "one", b"1")])
+        self.assertEqual(publisher.metrics.snapshot()["failed"], 2)
+
+    def test_gives_up_after_max_attempts(self):
+        api = FakeTweetAPI(failures=10)
+        publisher = ReportPublisher(TweetReportOutput(tweet_api=api), max_attempts=3, backoff=0.01)
+
+        publisher.create_output(summary="one", image=b"1")
+        publisher.publish_pending(timeout=0)
+
+        self.assertEqual(api.calls, 3)
+        metrics = publisher.metrics.snapshot()
+        self.assertEqual(metrics["failed"], 3)
+        self.assertEqual(metrics["abandoned"], 1)
+
+    def test_only_newest_pending_report_is_sent(self):
+        api = FakeTweetAPI()
+        publisher = ReportPublisher(TweetReportOutput(tweet_api=api))
+
+        for summary in ("one", "two", "three"):
+            publisher.create_output(summary=summary, image=summary.encode("UTF8"))
+        publisher.publish_pending(timeout=0)
+        publisher.publish_pending(timeout=0)
+
+        self.assertListEqual(api.uploads, [("report.png", "three", b"three")])
+        self.assertEqual(publisher.metrics.snapshot()["coalesced"], 2)
+
+    def test_newer_report_supersedes_failed_one(self):
+        output = Mock()
+        publisher = ReportPublisher(output, backoff=5)
+
+        def fail_and_queue_newer(**data):
+            if data["summary"] == "one":
+                publisher.create_output(summary="two")
+                raise RuntimeError("upload failed")
+
+        output.create_output.side_effect = fail_and_queue_newer
+        publisher.create_output(summary="one")
+        publisher.publish_pending(timeout=0)
+        publisher.publish_pending(timeout=0)
+
+        self.assertListEqual([c[1]["summary"] for c in output.create_output.call_args_list], ["one", "two"])
+        self.assertEqual(publisher.metrics.snapshot()["superseded"], 1)
@@ -0,0 +1,127 @@
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import Mock
+
+from wxmonitor.graphing import make_county_hash, make_county_key_hash
+from wxmonitor.regions import RegionRenderPool, read_regions
+from wxmonitor.reporting import ProcessingImplGroup
+from wxmonitor.weather_categorizer import WeatherCategorizer
+
+places = """STATE|STATEFP|PLACEFP|PLACENAME|TYPE|FUNCSTAT|COUNTY
+TN|47|38320|Johnson City city|Incorporated Place|A|Washington County, Carter County
+VA|51|01000|Abingdon town|Incorporated Place|A|Washington County
+"""
+
+regions_config = """[Tennessee]
+states = tn
+places = tn_places.txt
+lat_0 = 39.1622
+lon_0 = -86.5292
+lower_left_lon = -90.60
+lower_left_lat = 34.80
+upper_right_lon = -81.31
+upper_right_lat = 36.71
+
+[Virginias]
+states = va, wv
+places = va_places.txt
+place_index = va_places.idx
+resolution = i
+lat_0 = 38
+lon_0 = -79
+lower_left_lon = -84
+lower_left_lat = 36
+upper_right_lon = -75
+upper_right_lat = 41
+"""
+
+
+class FakeRenderer(object):
+    def __init__(self, label):
+        self._label = label
+        self._renders = 0
+
+    def render(self, seen_counties, minimum, maximum, state=None, layer=None):
+        self._renders += 1
+        return "{0}:{1}:{2}".format(self._label, self._renders, sorted(seen_counties)).encode("UTF8")
+
+
+def _normalize(tags):
+    return {key: sorted(value) if isinstance(value, list) else value for key, value in tags.items()}
+
+
+class RegionConfigTests(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_reads_regions(self):
+        config_file = join(self.directory, "regions.cfg")
+        with open(config_file, "w") as f:
+            f.write(regions_config)
+
+        tennessee, virginias = read_regions(config_file)
+
+        self.assertEqual(tennessee.name, "Tennessee")
+        self.assertListEqual(tennessee.states, ["tn"])
+        self.assertIsNone(tennessee.place_index)
+        self.assertEqual(tennessee.resolution, "h")
+        self.assertEqual(tennessee.map_args["upper_right_lat"], 36.71)
+        self.assertListEqual(virginias.states, ["va", "wv"])
+        self.assertEqual(virginias.place_index, "va_places.idx")
+        self.assertEqual(virginias.resolution, "i")
+
+    def test_missing_config(self):
+        with self.assertRaises(ValueError):
+            read_regions(join(self.directory, "missing.cfg"))
+
+    def test_qualified_counties_are_told_apart_by_state(self):
+        places_file = join(self.directory, "places.txt")
+        with open(places_file, "w") as f:
+            f.write(places)
+
+        categorizer = WeatherCategorizer(places_file, qualify_counties=True)
+
+        self.assertListEqual(_normalize(categorizer.process_text("hail in johnson city"))["counties"],
+                             ["tn:carter", "tn:washington"])
+        self.assertListEqual(_normalize(categorizer.process_text("hail in abingdon"))["counties"],
+                             ["va:washington"])
+        self.assertListEqual(_normalize(categorizer.process_text("flooding in washington county"))["counties"],
+                             ["tn:washington", "va:washington"])
+        self.assertListEqual(WeatherCategorizer(places_file).process_text("hail in abingdon")["counties"],
+                             ["washington"])
+
+    def test_county_key_hash(self):
+        self.assertEqual(make_county_key_hash("va:washington", "tn"), make_county_hash("va", "washington"))
+        self.assertEqual(make_county_key_hash("washington", "tn"), make_county_hash("tn", "washington"))
+
+
+class RegionRenderPoolTests(TestCase):
+    def test_renders_each_region_in_its_own_worker(self):
+        render_pool = RegionRenderPool({"a": dict(label="a"), "b": dict(label="b"), "c": dict(label="c")},
+                                       FakeRenderer, workers=2)
+        try:
+            self.assertEqual(render_pool.render("a", {"knox": 1}, 1, 1), b"a:1:['knox']")
+            self.assertEqual(render_pool.renderer("b").render({}, 0, 0), b"b:1:[]")
+            # The region's renderer is kept between renders.
+            self.assertEqual(render_pool.render("a", {}, 0, 0), b"a:2:[]")
+        finally:
+            render_pool.close()
+
+
+class ProcessingImplGroupTests(TestCase):
+    def test_processes_every_region(self):
+        for threads in (1, 3):
+            impls = [Mock(_region_name=str(i)) for i in range(3)]
+            impls[0].process.side_effect = RuntimeError("boom")
+            group = ProcessingImplGroup(impls, threads=threads)
+
+            group.process()
+            group.close()
+
+            for impl in impls:
+                impl.process.assert_called_once_with()
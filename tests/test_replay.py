@@ -0,0 +1,78 @@
+import json
+from csv import writer
+from os import remove
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+from unittest.mock import Mock
+
+from wxmonitor.replay import StatusReplayer, ReplayStatus, log_header, read_csv_log, read_jsonl_log
+
+
+class ReadLogTests(TestCase):
+    def _write(self, suffix, write):
+        with NamedTemporaryFile("w", suffix=suffix, delete=False, newline="") as f:
+            write(f)
+        self.addCleanup(remove, f.name)
+        return f.name
+
+    def test_reads_csv_log_with_header(self):
+        def write(f):
+            w = writer(f)
+            w.writerow(log_header)
+            w.writerow([10.5, "someone", "Nashville, TN", {"type": "Point", "coordinates": [-86.7, 36.1]}, "hail"])
+            w.writerow([11.0, "other", "", None, "multi\nline"])
+
+        statuses = list(read_csv_log(self._write(".csv", write)))
+
+        self.assertEqual(len(statuses), 2)
+        self.assertEqual(statuses[0].timestamp, 10.5)
+        self.assertEqual(statuses[0].user.screen_name, "someone")
+        self.assertEqual(statuses[0].coordinates["coordinates"], [-86.7, 36.1])
+        self.assertIsNone(statuses[1].coordinates)
+        self.assertEqual(statuses[1].text, "multi\nline")
+
+    def test_reads_jsonl_log(self):
+        def write(f):
+            f.write(json.dumps({"time": 1.0, "screen_name": "a", "text": "rain"}) + "\n")
+            f.write(json.dumps({"id": 9, "timestamp_ms": "2000", "text": "hail", "lang": "en",
+                                "user": {"screen_name": "b", "location": "TN"}}) + "\n")
+
+        statuses = list(read_jsonl_log(self._write(".jsonl", write)))
+
+        self.assertListEqual([(s.timestamp, s.user.screen_name, s.text) for s in statuses],
+                             [(1.0, "a", "rain"), (2.0, "b", "hail")])
+        self.assertEqual(statuses[1].id, 9)
+
+    def test_reads_retweeted_status(self):
+        def write(f):
+            f.write(json.dumps({"id": 10, "timestamp_ms": "2000", "text": "RT @b: hail",
+                                "user": {"screen_name": "c"},
+                                "retweeted_status": {"id": 9, "text": "hail", "user": {"screen_name": "b"}}}) + "\n")
+
+        status = next(read_jsonl_log(self._write(".jsonl", write)))
+
+        self.assertEqual((status.retweeted_status.id, status.retweeted_status.text), (9, "hail"))
+
+
+class StatusReplayerTests(TestCase):
+    statuses = [ReplayStatus(i, 100.0 + i * 10, "user", None, None, "text") for i in range(3)]
+
+    def test_replays_at_max_speed(self):
+        listener = Mock()
+        sleeper = Mock()
+        replayer = StatusReplayer(speed=None, sleeper=sleeper)
+
+        replayed, _ = replayer.replay(self.statuses, listener)
+
+        self.assertEqual(replayed, 3)
+        self.assertEqual(listener.on_status.call_count, 3)
+        sleeper.assert_not_called()
+        self.assertEqual(replayer.clock(), 120.0)
+
+    def test_scales_delays_by_speed(self):
+        sleeper = Mock()
+        StatusReplayer(speed=100.0, sleeper=sleeper).replay(self.statuses, Mock())
+
+        delays = [call[0][0] for call in sleeper.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertAlmostEqual(delays[0], 0.1, places=2)
@@ -0,0 +1,98 @@
+from os import listdir
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import Mock
+
+from wxmonitor.aggregation import RollingCountyAggregator
+from wxmonitor.cache import BucketCache
+from wxmonitor.snapshot import CacheSnapshotter, SnapshotError, read_snapshot, restore_snapshot, write_snapshot
+from wxmonitor.stream_listeners import ProcessedStatus
+
+
+def _status(timestamp, status_id, counties=(), cities=(), events=(), spotter=False):
+    return ProcessedStatus(timestamp, status_id, tuple(cities), tuple(counties), tuple(events), spotter)
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.filename = join(self.directory, "cache.snapshot")
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_round_trips_statuses(self):
+        statuses = [
+            _status(100.5, 1, counties=["knox"], cities=["knoxville"], events=["tornado"], spotter=True),
+            _status(101.25, 2 ** 62, counties=["knox", "blount"]),
+            _status(102.0, 3),
+        ]
+        write_snapshot(self.filename, statuses)
+
+        loaded = read_snapshot(self.filename)
+
+        self.assertEqual([repr(s) for s in loaded], [repr(s) for s in statuses])
+        self.assertIs(loaded[0].counties[0], loaded[1].counties[0])
+        self.assertListEqual(listdir(self.directory), ["cache.snapshot"])
+
+    def test_rejects_other_files(self):
+        with open(self.filename, "wb") as f:
+            f.write(b"not a snapshot at all")
+
+        with self.assertRaises(SnapshotError):
+            read_snapshot(self.filename)
+
+    def test_rejects_truncated_snapshot(self):
+        write_snapshot(self.filename, [_status(100, 1, counties=["knox"])])
+        with open(self.filename, "rb") as f:
+            data = f.read()
+        with open(self.filename, "wb") as f:
+            f.write(data[:-3])
+
+        with self.assertRaises(SnapshotError):
+            read_snapshot(self.filename)
+
+    def test_restore_skips_expired_statuses(self):
+        write_snapshot(self.filename, [_status(0, 1, counties=["knox"]), _status(50, 2, counties=["blount"])])
+        timer = Mock(return_value=70)
+        aggregator = RollingCountyAggregator(ttl=60, timer=timer)
+        cache = BucketCache(ttl=60, timer=timer, observers=[aggregator], bucket_seconds=1)
+
+        restored = restore_snapshot(self.filename, cache, ttl=60, now=70)
+
+        self.assertEqual(restored, 1)
+        self.assertEqual([s.status_id for s in cache.get_statuses()], [2])
+        self.assertDictEqual(aggregator.get_seen_counties(), {"blount": 1})
+
+        # Restored statuses still expire at their original timestamps.
+        timer.return_value = 112
+        cache.expire()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(len(aggregator), 0)
+
+
+class CacheSnapshotterTests(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.filename = join(self.directory, "cache.snapshot")
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def test_restore_without_snapshot(self):
+        snapshotter = CacheSnapshotter(BucketCache(), self.filename)
+
+        self.assertEqual(snapshotter.restore(), 0)
+
+    def test_writes_snapshot_on_stop(self):
+        cache = BucketCache(timer=Mock(return_value=1000))
+        snapshotter = CacheSnapshotter(cache, self.filename, interval=60)
+        snapshotter.start()
+        cache.add(_status(1000, 7, counties=["knox"]))
+        snapshotter.stop()
+
+        restored = BucketCache(timer=Mock(return_value=1000))
+        self.assertEqual(CacheSnapshotter(restored, self.filename).restore(now=1000), 1)
+        self.assertEqual(restored.get_statuses()[0].counties, ("knox",))
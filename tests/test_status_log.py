@@ -0,0 +1,102 @@
+from csv import reader
+from glob import glob
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from wxmonitor.replay import read_csv_log
+from wxmonitor.status_log import RotatingStatusLogWriter, log_header, open_log
+
+
+class RotatingStatusLogWriterTests(TestCase):
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.filename = join(self.directory, "status.csv")
+
+    def tearDown(self):
+        rmtree(self.directory)
+
+    def _rows(self, filename):
+        with open_log(filename) as f:
+            return list(reader(f))
+
+    def test_writes_header_and_all_rows_on_stop(self):
+        log_writer = RotatingStatusLogWriter(self.filename, batch_size=7, flush_interval=60)
+        log_writer.start()
+        for i in range(100):
+            log_writer.write([i, "user", "", None, "text {0}".format(i)])
+        log_writer.stop()
+
+        rows = self._rows(self.filename)
+        self.assertListEqual(rows[0], log_header)
+        self.assertListEqual([row[0] for row in rows[1:]], [str(i) for i in range(100)])
+
+    def test_does_not_repeat_header_when_appending(self):
+        for i in range(2):
+            log_writer = RotatingStatusLogWriter(self.filename)
+            log_writer.start()
+            log_writer.write([i, "user", "", None, "text"])
+            log_writer.stop()
+
+        self.assertEqual(self._rows(self.filename).count(log_header), 1)
+        self.assertEqual(len(self._rows(self.filename)), 3)
+
+    def test_rotates_by_size_and_compresses(self):
+        log_writer = RotatingStatusLogWriter(self.filename, batch_size=10, max_bytes=200)
+        log_writer.start()
+        for i in range(50):
+            log_writer.write([i, "user", "", None, "some longer status text {0}".format(i)])
+        log_writer.stop()
+
+        segments = sorted(glob(self.filename + ".*.gz"))
+        self.assertTrue(len(segments) > 1)
+
+        replayed = [status.timestamp for segment in segments for status in read_csv_log(segment)]
+        replayed.extend(status.timestamp for status in read_csv_log(self.filename))
+        self.assertListEqual(sorted(replayed), [float(i) for i in range(50)])
+
+    def test_rotates_by_time(self):
+        timer = Mock(return_value=0)
+        log_writer = RotatingStatusLogWriter(self.filename, flush_interval=0.01, rotate_interval=60,
+                                             compression=None, timer=timer)
+        log_writer.start()
+        log_writer.write([1, "user", "", None, "text"])
+        timer.return_value = 61
+        log_writer.stop()
+
+        self.assertEqual(len(glob(self.filename + ".*")), 1)
+        self.assertListEqual(self._rows(self.filename), [log_header])
+
+    def test_retries_rows_after_write_error(self):
+        log_writer = RotatingStatusLogWriter(self.filename, flush_interval=0.01, retry_interval=0.01)
+        log_writer.start()
+        log_writer._writer = Mock(writerows=Mock(side_effect=OSError("No space left on device")))
+        for i in range(3):
+            log_writer.write([i, "user", "", None, "text"])
+        log_writer.stop()
+
+        self.assertListEqual([row[0] for row in self._rows(self.filename)[1:]], ["0", "1", "2"])
+
+    def test_drops_rows_beyond_max_pending(self):
+        log_writer = RotatingStatusLogWriter(self.filename, max_pending=2)
+        for i in range(3):
+            log_writer.write([i, "user", "", None, "text"])
+
+        self.assertEqual(log_writer.dropped, 1)
+        self.assertEqual(log_writer.unwritten, 2)
+
+    def test_keeps_writing_when_compression_fails(self):
+        log_writer = RotatingStatusLogWriter(self.filename, batch_size=10, max_bytes=200)
+        with patch("wxmonitor.status_log.copyfileobj", side_effect=OSError("No space left on device")):
+            log_writer.start()
+            for i in range(50):
+                log_writer.write([i, "user", "", None, "some longer status text {0}".format(i)])
+            log_writer.stop()
+
+        segments = glob(self.filename + ".*")
+        self.assertFalse([segment for segment in segments if segment.endswith(".gz")])
+        replayed = [status.timestamp for segment in segments for status in read_csv_log(segment)]
+        replayed.extend(status.timestamp for status in read_csv_log(self.filename))
+        self.assertListEqual(sorted(replayed), [float(i) for i in range(50)])
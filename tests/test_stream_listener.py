@@ -1 +1,175 @@
-# TODO
\ No newline at end of file
+from time import sleep
+from unittest import TestCase
+from unittest.mock import Mock
+
+from wxmonitor.cache import TextStore
+from wxmonitor.dedup import StatusDeduplicator
+from wxmonitor.stream_listeners import CountingListenerAction, ProcessingListenerAction, QueuedListenerAction
+
+
+class ProcessingListenerActionTests(TestCase):
+    def setUp(self):
+        self.categorizer = Mock()
+        self.categorizer.process.side_effect = self._tags
+        self.categorizer.process_batch.side_effect = lambda statuses: [self._tags(s) for s in statuses]
+        self.cache = Mock()
+
+    @staticmethod
+    def _tags(status):
+        return {"cities": [], "counties": [status.text], "events": [], "spotter": False}
+
+    def _added(self):
+        return [call[0][0] for call in self.cache.add.call_args_list]
+
+    def test_processes_immediately_without_batching(self):
+        action = ProcessingListenerAction(self.categorizer, self.cache)
+        action.process(Mock(text="a"))
+
+        self.assertEqual(self._added()[0].tags, self._tags(Mock(text="a")))
+        self.categorizer.process_batch.assert_not_called()
+
+    def test_processes_full_batch_in_order(self):
+        action = ProcessingListenerAction(self.categorizer, self.cache, batch_size=3)
+        action.process(Mock(text="a"))
+        action.process(Mock(text="b"))
+        self.cache.add.assert_not_called()
+
+        action.process(Mock(text="c"))
+        self.assertListEqual([p.counties[0] for p in self._added()], ["a", "b", "c"])
+        self.categorizer.process_batch.assert_called_once()
+
+    def test_stores_compact_status_and_text(self):
+        text_store = TextStore()
+        action = ProcessingListenerAction(self.categorizer, self.cache, text_store=text_store)
+        action.process(Mock(id=7, text="knox"))
+
+        processed = self._added()[0]
+        self.assertEqual(processed.status_id, 7)
+        self.assertEqual(processed.counties, ("knox",))
+        self.assertFalse(hasattr(processed, "__dict__"))
+        self.assertEqual(text_store[7], "knox")
+        self.assertEqual(len(text_store), 1)
+
+    def test_archives_processed_status_to_history(self):
+        history = Mock()
+        action = ProcessingListenerAction(self.categorizer, self.cache, history=history)
+        action.process(Mock(id=7, text="knox"))
+
+        history.add.assert_called_once_with(self._added()[0])
+
+    def _deduplicated(self, batch_size, suppress_duplicates=True):
+        action = ProcessingListenerAction(self.categorizer, self.cache, batch_size=batch_size,
+                                          deduplicator=StatusDeduplicator(), suppress_duplicates=suppress_duplicates)
+        for status_id, text in enumerate(["hail in knox county today", "Hail in Knox county today! https://t.co/x",
+                                          "flooding on the roads in shelby"]):
+            action.process(Mock(id=status_id, text=text, retweeted_status=None))
+        action.process(Mock(id=3, text="RT @a: hail", retweeted_status=Mock(id=0)))
+        action.flush()
+
+        return [p.counties[0] for p in self._added()]
+
+    def test_suppresses_duplicates(self):
+        for batch_size in (1, 10):
+            self.cache.reset_mock()
+            self.categorizer.reset_mock()
+
+            self.assertListEqual(self._deduplicated(batch_size), ["hail in knox county today",
+                                                                 "flooding on the roads in shelby"])
+            self.assertEqual(self.categorizer.process.call_count + self.categorizer.process_batch.call_count,
+                             2 if batch_size == 1 else 1)
+
+    def test_keeps_duplicates_with_original_tags(self):
+        self.assertListEqual(self._deduplicated(10, suppress_duplicates=False),
+                             ["hail in knox county today"] * 2 + ["flooding on the roads in shelby",
+                                                                  "hail in knox county today"])
+        self.assertEqual(len(self.categorizer.process_batch.call_args[0][0]), 2)
+
+    def test_categorizes_copies_of_failed_original(self):
+        for batch_size in (1, 2):
+            for suppress_duplicates in (True, False):
+                self.cache.reset_mock()
+                failures = [ValueError("categorizer failed")]
+
+                def process_batch(statuses):
+                    if failures:
+                        raise failures.pop()
+                    return [self._tags(status) for status in statuses]
+
+                self.categorizer.process.side_effect = lambda status: process_batch([status])[0]
+                self.categorizer.process_batch.side_effect = process_batch
+                action = ProcessingListenerAction(self.categorizer, self.cache, batch_size=batch_size,
+                                                  deduplicator=StatusDeduplicator(),
+                                                  suppress_duplicates=suppress_duplicates)
+
+                statuses = [Mock(id=status_id, text="hail in knox county today", retweeted_status=None)
+                            for status_id in range(5)]
+                with self.assertRaises(ValueError):
+                    for status in statuses[:batch_size]:
+                        action.process(status)
+                for status in statuses[batch_size:]:
+                    action.process(status)
+                action.flush()
+
+                # The first copy after the failure is categorized; later copies duplicate it.
+                self.assertEqual(len(self._added()), 1 if suppress_duplicates else 5 - batch_size)
+
+    def test_flushes_partial_batch(self):
+        action = ProcessingListenerAction(self.categorizer, self.cache, batch_size=10)
+        action.process(Mock(text="a"))
+        action.flush()
+
+        self.assertListEqual([p.counties[0] for p in self._added()], ["a"])
+
+    def test_flushes_after_batch_window(self):
+        action = ProcessingListenerAction(self.categorizer, self.cache, batch_size=10, batch_window=0.05)
+        action.process(Mock(text="a"))
+        sleep(0.3)
+
+        self.assertListEqual([p.counties[0] for p in self._added()], ["a"])
+
+
+class QueuedListenerActionTests(TestCase):
+    def test_runs_actions_on_workers(self):
+        action = CountingListenerAction()
+        queued = QueuedListenerAction([action], workers=2)
+        queued.start()
+
+        for i in range(50):
+            queued.process(Mock(text=str(i)))
+        queued.stop()
+
+        self.assertEqual(action.counter, 50)
+        self.assertEqual(queued.metrics.snapshot()["latency"]["CountingListenerAction"]["count"], 50)
+
+    def test_drop_newest_when_full(self):
+        queued = QueuedListenerAction([CountingListenerAction()], workers=1, maxsize=2,
+                                      policy=QueuedListenerAction.DROP_NEWEST)
+        for i in range(5):
+            queued.process(Mock(text=str(i)))
+
+        self.assertEqual(queued.queue_depth, 2)
+        self.assertEqual(queued.metrics.snapshot()["dropped"], 3)
+
+    def test_drop_oldest_when_full(self):
+        action = Mock()
+        queued = QueuedListenerAction([action], workers=1, maxsize=2, policy=QueuedListenerAction.DROP_OLDEST)
+        for i in range(5):
+            queued.process(i)
+
+        queued.start()
+        queued.stop()
+
+        self.assertListEqual([call[0][0] for call in action.process.call_args_list], [3, 4])
+        self.assertEqual(queued.metrics.snapshot()["dropped"], 3)
+
+    def test_failing_action_does_not_stop_others(self):
+        failing = Mock()
+        failing.process.side_effect = ValueError("boom")
+        counting = CountingListenerAction()
+        queued = QueuedListenerAction([failing, counting], workers=1)
+        queued.start()
+
+        queued.process(Mock())
+        queued.stop()
+
+        self.assertEqual(counting.counter, 1)
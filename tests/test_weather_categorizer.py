@@ -1 +1,122 @@
-# TODO
\ No newline at end of file
+from os.path import dirname, join
+from unittest import TestCase
+from unittest.mock import Mock
+
+from wxmonitor.weather_categorizer import CategoryMemo, RegexWeatherCategorizer, WeatherCategorizer
+
+places_file = join(dirname(__file__), "data", "tn_places.txt")
+
+
+def _normalize(tags):
+    return {key: sorted(value) if isinstance(value, list) else value for key, value in tags.items()}
+
+
+class WeatherCategorizerTests(TestCase):
+    samples = [
+        "Hail in Knoxville right now",
+        "Trees are down on I-40 near Oak Ridge, wind damage everywhere",
+        "Flooding in Davidson County #tspotter",
+        "Johnson City rain",
+        "Just a nice day in Memphis",
+        "nothing to see here",
+        "TREES\nDOWN in Spring Hill",
+        "Heavy snow in Knoxville",
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.categorizer = WeatherCategorizer(places_file)
+        cls.reference = RegexWeatherCategorizer(places_file)
+
+    def test_finds_city_and_its_counties(self):
+        tags = self.categorizer.process(Mock(text="Hail in Knoxville right now"))
+        self.assertListEqual(tags["cities"], ["knoxville"])
+        self.assertListEqual(tags["counties"], ["knox"])
+        self.assertListEqual(tags["events"], ["hail"])
+        self.assertFalse(tags["spotter"])
+
+    def test_finds_county_mentions(self):
+        tags = _normalize(self.categorizer.process_text("Flooding in Davidson County #TSpotter"))
+        self.assertListEqual(tags["counties"], ["davidson"])
+        self.assertListEqual(tags["events"], ["flooding"])
+        self.assertTrue(tags["spotter"])
+
+    def test_finds_snow(self):
+        self.assertListEqual(self.categorizer.process_text("Heavy SNOW in Knoxville")["events"], ["snow"])
+
+    def test_matches_regex_categorizer(self):
+        for sample in self.samples:
+            self.assertDictEqual(_normalize(self.categorizer.process_text(sample)),
+                                 _normalize(self.reference.process_text(sample)), sample)
+
+    def test_process_batch_keeps_order(self):
+        statuses = [Mock(text=sample) for sample in self.samples]
+        expected = [_normalize(self.categorizer.process(status)) for status in statuses]
+
+        self.assertListEqual([_normalize(tags) for tags in self.categorizer.process_batch(statuses)], expected)
+
+    def test_process_batch_with_workers(self):
+        statuses = [Mock(text=sample) for sample in self.samples]
+        expected = [_normalize(self.categorizer.process(status)) for status in statuses]
+
+        categorizer = WeatherCategorizer(places_file, workers=2)
+        try:
+            self.assertListEqual([_normalize(tags) for tags in categorizer.process_batch(statuses)], expected)
+        finally:
+            categorizer.close()
+
+
+class CategoryMemoTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.categorizer = WeatherCategorizer(places_file)
+
+    def setUp(self):
+        self.memoized = WeatherCategorizer(places_file, memo_size=2)
+
+    def test_matches_categorizer(self):
+        samples = WeatherCategorizerTests.samples + [
+            "Flooding in Knox  County https://t.co/x",
+            "Flooding in Knox County https://t.co/x",
+            "Hail in knox county http://knoxville.com/x",
+            "RT @memphis: trees\tdown   in Spring Hill",
+        ]
+        for sample in samples + samples:
+            self.assertDictEqual(_normalize(self.memoized.process_text(sample)),
+                                 _normalize(self.categorizer.process_text(sample)), sample)
+
+        statuses = [Mock(text=sample) for sample in samples + samples]
+        self.assertListEqual([_normalize(tags) for tags in self.memoized.process_batch(statuses)],
+                             [_normalize(self.categorizer.process(status)) for status in statuses])
+
+    def test_repeated_text_hits_regardless_of_case(self):
+        self.memoized.process_text("Hail in Knoxville right now")
+        tags = self.memoized.process_text("HAIL in Knoxville right now")
+
+        self.assertListEqual(tags["counties"], ["knox"])
+        self.assertDictEqual(self.memoized.memo.metrics.snapshot(),
+                             {"hits": 1, "misses": 1, "evictions": 0, "hit_rate": 0.5})
+
+    def test_returned_tags_are_copies(self):
+        self.memoized.process_text("Hail in Knoxville right now")["counties"].append("davidson")
+        self.assertListEqual(self.memoized.process_text("Hail in Knoxville right now")["counties"], ["knox"])
+
+    def test_evicts_least_recently_used(self):
+        memo = CategoryMemo(maxsize=2)
+        for text in ("a", "b", "a", "c"):
+            memo.put(text, {"counties": [text]})
+            memo.get("a")
+
+        self.assertIsNone(memo.get("b"))
+        self.assertListEqual(memo.get("c")["counties"], ["c"])
+        self.assertEqual(len(memo), 2)
+        self.assertEqual(memo.metrics.snapshot()["evictions"], 1)
+
+    def test_process_batch_categorizes_repeats_once(self):
+        samples = WeatherCategorizerTests.samples[:2]
+        statuses = [Mock(text=sample) for sample in samples + samples]
+        expected = [_normalize(self.categorizer.process(status)) for status in statuses]
+
+        self.assertListEqual([_normalize(tags) for tags in self.memoized.process_batch(statuses)], expected)
+        self.assertEqual(len(self.memoized.memo), 2)
+        self.assertEqual(self.memoized.memo.metrics.snapshot()["misses"], 4)
@@ -0,0 +1,11 @@
+from argparse import ArgumentParser
+
+from wxmonitor.place_index import build_place_index
+
+parser = ArgumentParser(description="Build the place index loaded by WeatherCategorizer(index_file=...)")
+parser.add_argument("places", help="ANSI places file")
+parser.add_argument("index", help="Place index file to write")
+args = parser.parse_args()
+
+index = build_place_index(args.places, args.index)
+print("Indexed {0} cities and {1} counties into {2}".format(len(index.cities), len(index.counties), args.index))
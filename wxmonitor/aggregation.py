@@ -0,0 +1,245 @@
+from collections import deque
+from logging import getLogger
+from math import ceil
+from sys import float_info
+from threading import RLock
+from time import time
+
+logger = getLogger(__name__)
+
+# Event layers and the event words mapped to them. Span events, e.g. "trees are down", map by their first word.
+default_event_layers = {
+    "hail": ("hail",),
+    "flooding": ("flood", "flooding", "ponding", "rain"),
+    "wind": ("wind",),
+    "trees down": ("trees",),
+    "damage": ("damage", "roof"),
+    "snow": ("snow",),
+}
+
+
+class EventLayers(object):
+    """Groups categorized events into map layers, e.g. every flooding word into "flooding".
+
+    A status counts once towards each layer its events fall in, for each of its counties. spotter_weight is what a
+    #tspotter status counts for instead of 1.
+    """
+    def __init__(self, layers=None, spotter_weight=1):
+        layers = default_event_layers if layers is None else layers
+        self.names = tuple(layers)
+        self.spotter_weight = spotter_weight
+        self._word_layers = {word: name for name, words in layers.items() for word in words}
+
+    def layers_of(self, events):
+        """Returns the names of the layers events fall in, in layer order."""
+        word_layers = self._word_layers
+        found = set(word_layers.get(event.split(None, 1)[0]) for event in events if event.strip())
+        return tuple(name for name in self.names if name in found)
+
+    def weigh(self, count, spotter_count):
+        """Returns the weighted count of count statuses, spotter_count of them from spotters."""
+        return count + (self.spotter_weight - 1) * spotter_count
+
+
+def get_layer_counts(statuses, event_layers):
+    """Returns {layer: {county: weighted count}} of the non-empty layers, counted over statuses in one pass."""
+    counts = {}
+    for status in statuses:
+        if not status.counties:
+            continue
+
+        for layer in event_layers.layers_of(status.events):
+            layer_counts = counts.setdefault(layer, {})
+            for county in status.counties:
+                county_counts = layer_counts.get(county)
+                if county_counts is None:
+                    county_counts = layer_counts[county] = [0, 0]
+                county_counts[0] += 1
+                if status.spotter:
+                    county_counts[1] += 1
+
+    return {layer: {county: event_layers.weigh(*county_counts) for county, county_counts in counts[layer].items()}
+            for layer in event_layers.names if layer in counts}
+
+
+class RollingCountyAggregator(object):
+    """Per-county status counts over a rolling ttl window.
+
+    Counts are updated as statuses are added and decremented as they age out, so reading them costs O(counties)
+    rather than a walk over every cached status. Register it as a Cache observer to keep it in step with the cache.
+    Given EventLayers, per-layer county counts are kept the same way; see layer_snapshot.
+    """
+    def __init__(self, ttl=3600, timer=time, event_layers=None):
+        logger.debug("Setting up rolling county aggregator, ttl=%d", ttl)
+        self._ttl = ttl
+        self._timer = timer
+        self._event_layers = event_layers
+
+        # (expires, counties, categorized, layers, spotter) in arrival order.
+        self._entries = deque()
+        self._county_counts = {}
+        # count -> number of counties currently at that count, used for min/max.
+        self._count_frequencies = {}
+        self._uncategorized = 0
+        # layer -> county -> [statuses, spotter statuses]
+        self._layer_counts = {}
+
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, processed_status, timestamp=None):
+        counties = processed_status.counties
+        categorized = len(counties) != 0 or len(processed_status.cities) != 0
+        layers = ()
+        spotter = False
+        if self._event_layers is not None and counties:
+            layers = self._event_layers.layers_of(processed_status.events)
+            spotter = processed_status.spotter
+
+        with self._lock:
+            added = self._timer() if timestamp is None else timestamp
+            self._entries.append((added + self._ttl, counties, categorized, layers, spotter))
+
+            for county in counties:
+                self._change_count(county, 1)
+
+            for layer in layers:
+                self._change_layer_counts(layer, counties, 1, spotter)
+
+            if not categorized:
+                self._uncategorized += 1
+
+    def expire(self):
+        with self._lock:
+            now = self._timer()
+            entries = self._entries
+
+            while entries and entries[0][0] < now:
+                _, counties, categorized, layers, spotter = entries.popleft()
+
+                for county in counties:
+                    self._change_count(county, -1)
+
+                for layer in layers:
+                    self._change_layer_counts(layer, counties, -1, spotter)
+
+                if not categorized:
+                    self._uncategorized -= 1
+
+    def _change_count(self, county, delta):
+        old = self._county_counts.get(county, 0)
+        new = old + delta
+
+        if old:
+            self._remove_frequency(old)
+
+        if new:
+            self._county_counts[county] = new
+            self._count_frequencies[new] = self._count_frequencies.get(new, 0) + 1
+        else:
+            del self._county_counts[county]
+
+    def _change_layer_counts(self, layer, counties, delta, spotter):
+        layer_counts = self._layer_counts.get(layer)
+        if layer_counts is None:
+            layer_counts = self._layer_counts[layer] = {}
+
+        for county in counties:
+            counts = layer_counts.get(county)
+            if counts is None:
+                counts = layer_counts[county] = [0, 0]
+
+            counts[0] += delta
+            if spotter:
+                counts[1] += delta
+
+            if not counts[0]:
+                del layer_counts[county]
+
+    def _remove_frequency(self, count):
+        remaining = self._count_frequencies[count] - 1
+        if remaining:
+            self._count_frequencies[count] = remaining
+        else:
+            del self._count_frequencies[count]
+
+    @property
+    def uncategorized_count(self):
+        with self._lock:
+            return self._uncategorized
+
+    def get_seen_counties(self):
+        with self._lock:
+            return dict(self._county_counts)
+
+    def get_min_max_county_count(self):
+        with self._lock:
+            if not self._count_frequencies:
+                return float_info.max, float_info.min
+
+            return min(self._count_frequencies), max(self._count_frequencies)
+
+    def snapshot(self):
+        """Returns (seen_counties, minimum, maximum, uncategorized_count) as one consistent view."""
+        with self._lock:
+            minimum, maximum = self.get_min_max_county_count()
+            return self.get_seen_counties(), minimum, maximum, self._uncategorized
+
+    def layer_snapshot(self):
+        """Returns {layer: {county: weighted count}} of the non-empty event layers, like get_layer_counts."""
+        if self._event_layers is None:
+            return {}
+
+        weigh = self._event_layers.weigh
+        with self._lock:
+            return {layer: {county: weigh(*counts) for county, counts in self._layer_counts[layer].items()}
+                    for layer in self._event_layers.names if self._layer_counts.get(layer)}
+
+
+def window_frames(bucket_counts, start, bucket_seconds, window_buckets=1):
+    """Sums per-bucket {county: count} dicts over a sliding window of window_buckets buckets.
+
+    The first window_buckets - 1 buckets only lead in; the bucket after them starts at start. Returns (frame end time,
+    {county: count}) per bucket from start on.
+    """
+    frames = []
+    running = {}
+
+    for index, counts in enumerate(bucket_counts):
+        for county, count in counts.items():
+            running[county] = running.get(county, 0) + count
+
+        if index >= window_buckets:
+            for county, count in bucket_counts[index - window_buckets].items():
+                remaining = running[county] - count
+                if remaining:
+                    running[county] = remaining
+                else:
+                    del running[county]
+
+        frame = index - window_buckets + 1
+        if frame >= 0:
+            frames.append((start + (frame + 1) * bucket_seconds, dict(running)))
+
+    return frames
+
+
+def county_count_frames(statuses, start, end, bucket_seconds=300, window_seconds=None):
+    """Returns window_frames of the county counts of statuses, one frame per bucket_seconds over [start, end).
+
+    Each frame counts the statuses of the window_seconds before its end, or of its own bucket by default.
+    """
+    window_buckets = max(1, int(round(window_seconds / bucket_seconds))) if window_seconds else 1
+    first = start - (window_buckets - 1) * bucket_seconds
+    bucket_counts = [{} for _ in range(int(ceil((end - first) / bucket_seconds)))]
+
+    for status in statuses:
+        index = int((status.timestamp - first) // bucket_seconds)
+        if 0 <= index < len(bucket_counts):
+            counts = bucket_counts[index]
+            for county in status.counties:
+                counts[county] = counts.get(county, 0) + 1
+
+    return window_frames(bucket_counts, start, bucket_seconds, window_buckets)
@@ -0,0 +1,119 @@
+from datetime import datetime
+from io import BytesIO
+from logging import getLogger
+from multiprocessing import Pool
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from wxmonitor.graphing import get_county_colors
+
+logger = getLogger(__name__)
+
+animation_formats = {"gif": "GIF", "png": "PNG"}
+
+_worker_renderer = None
+
+
+def _init_frame_worker(renderer):
+    global _worker_renderer
+    _worker_renderer = renderer
+
+
+def _render_frame(frame):
+    return render_frame(_worker_renderer, *frame)
+
+
+def render_frame(renderer, timestamp, seen_counties, minimum, maximum, state, color_scale, palette):
+    """Composites one animation frame, stamped with its time, as a PIL image, mapped onto palette when given."""
+    image = Image.fromarray(renderer.composite(seen_counties, minimum, maximum, state, color_scale))
+
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((4, 4, 96, 18), fill=(255, 255, 255))
+    draw.text((8, 6), datetime.fromtimestamp(timestamp).strftime("%m/%d %H:%M"), fill=(0, 0, 0))
+
+    if palette is not None:
+        image = image.quantize(palette=palette, dither=Image.NONE)
+    return image
+
+
+class AnimationRenderer(object):
+    """Renders a sequence of county count frames, e.g. from county_count_frames, as an animated GIF or PNG.
+
+    renderer is a RasterMapRenderer. Its labelled background is built once here and handed to workers processes, so a
+    frame there is only a color lookup; frames are then assembled and encoded by Pillow. Every frame is colored on the
+    range of the whole sequence so frames compare, through color_scale's scale when given. GIF frames share one
+    palette: the background quantized once, plus up to ramp_colors colors of the counts being shown.
+    frame_duration and last_frame_duration are in milliseconds; compress_level is the zlib level of animated PNGs.
+    """
+    def __init__(self, renderer, workers=0, image_format="gif", frame_duration=500, last_frame_duration=2000,
+                 color_scale=None, ramp_colors=32, compress_level=3):
+        if image_format not in animation_formats:
+            raise ValueError("Unknown animation format: {0}".format(image_format))
+
+        self._renderer = renderer
+        self._workers = workers
+        self._image_format = image_format
+        self._frame_duration = frame_duration
+        self._last_frame_duration = last_frame_duration
+        self._color_scale = color_scale
+        self._ramp_colors = ramp_colors
+        self._compress_level = compress_level
+        self._background_palette = None
+        self._pool = None
+
+    def _map(self, frames):
+        if self._workers <= 0:
+            return [render_frame(self._renderer, *frame) for frame in frames]
+
+        if self._pool is None:
+            # Built before the workers start so they receive the finished raster rather than each rebuilding it.
+            self._renderer.county_ids
+            logger.debug("Starting %d frame render workers", self._workers)
+            self._pool = Pool(self._workers, initializer=_init_frame_worker, initargs=(self._renderer,))
+
+        return self._pool.map(_render_frame, frames, chunksize=max(1, len(frames) // (self._workers * 4)))
+
+    def _palette(self, counts, minimum, maximum, color_scale):
+        if self._background_palette is None:
+            background = Image.fromarray(self._renderer.composite({}, 0, 0))
+            quantized = background.quantize(colors=256 - self._ramp_colors, dither=Image.NONE)
+            self._background_palette = quantized.getpalette()[:(256 - self._ramp_colors) * 3]
+
+        values = sorted(set(counts))
+        if len(values) > self._ramp_colors:
+            values = np.linspace(minimum, maximum, self._ramp_colors)
+
+        ramp = np.round(get_county_colors(values, minimum, maximum, color_scale) * 255).astype(np.uint8)
+
+        palette = Image.new("P", (1, 1))
+        palette.putpalette(self._background_palette + ramp.ravel().tolist())
+        return palette
+
+    def render(self, frames, state="tn"):
+        """Returns the encoded animation of frames, a sequence of (timestamp, {county: count})."""
+        if not frames:
+            raise ValueError("No frames to render")
+
+        counts = [count for _, seen_counties in frames for count in seen_counties.values()]
+        minimum, maximum = (min(counts), max(counts)) if counts else (0, 0)
+        color_scale = None if self._color_scale is None else self._color_scale.fixed(minimum, maximum)
+        palette = self._palette(counts, minimum, maximum, color_scale) if self._image_format == "gif" else None
+
+        images = self._map([(timestamp, seen_counties, minimum, maximum, state, color_scale, palette)
+                            for timestamp, seen_counties in frames])
+
+        durations = [self._frame_duration] * (len(images) - 1) + [self._last_frame_duration]
+        output = BytesIO()
+        # Pillow's GIF optimize pass costs more than rendering the frames; delta frames are still cropped to the
+        # changed area without it.
+        images[0].save(output, format=animation_formats[self._image_format], save_all=True,
+                       append_images=images[1:], duration=durations, loop=0, optimize=False,
+                       compress_level=self._compress_level)
+        return output.getvalue()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
@@ -1,17 +1,28 @@
+from collections import deque
+from itertools import chain
 from logging import getLogger
 from threading import RLock
+from time import perf_counter, time
 from uuid import uuid4
 
 from cachetools import TTLCache
 
+from wxmonitor.metrics import registry
+
 logger = getLogger(__name__)
 
+_expire_seconds = registry.histogram("wxmonitor_cache_expire_seconds",
+                                     "Time expiring a cache, including its observers", ("cache",))
+
 
 class Cache(object):
-    """Thread-safe cache composed of TTLCache."""
+    """Thread-safe cache composed of TTLCache.
+
+    observers are notified of every add and expire, e.g. a RollingCountyAggregator.
+    """
     # TODO: Investigate actual need for this class given the usage and underlying TTLCache implementation.
     # The dict type may provice an appropriate level of thread-safety.
-    def __init__(self, ttl=3600, timer=None):
+    def __init__(self, ttl=3600, timer=None, observers=None):
         logger.debug("Setting up processed cache, ttl=%d", ttl)
 
         if timer is None:
@@ -19,6 +30,7 @@ class Cache(object):
         else:
             self._cache = TTLCache(maxsize=10000000, ttl=ttl, timer=timer)
 
+        self._observers = list(observers or [])
         self._lock = RLock()
 
     def __len__(self):
@@ -28,6 +40,9 @@ class Cache(object):
         with self._lock:
             self._cache[uuid4()] = processed_status
 
+        for observer in self._observers:
+            observer.add(processed_status)
+
     def get_statuses(self):
         statuses = []
         with self._lock:
@@ -36,5 +51,148 @@ class Cache(object):
         return statuses
 
     def expire(self):
+        start = perf_counter()
+        with self._lock:
+            self._cache.expire()
+
+        for observer in self._observers:
+            observer.expire()
+        _expire_seconds.observe(perf_counter() - start, ("ttl",))
+
+
+class BucketCache(object):
+    """Thread-safe cache that groups statuses into fixed time buckets.
+
+    Every status shares one ttl and normally arrives in time order, so statuses are appended to the newest bucket and
+    expiry drops whole buckets from the front of a deque. A status therefore lives between ttl and ttl + bucket_seconds.
+    Appends only take the lock when a new bucket has to be started. observers are notified like Cache observers.
+    """
+    def __init__(self, ttl=3600, timer=None, observers=None, bucket_seconds=60):
+        logger.debug("Setting up bucketed cache, ttl=%d, bucket_seconds=%d", ttl, bucket_seconds)
+        self._ttl = ttl
+        self._timer = time if timer is None else timer
+        self._bucket_seconds = bucket_seconds
+
+        # (bucket key, statuses) oldest first.
+        self._buckets = deque()
+        self._newest = None
+
+        self._observers = list(observers or [])
+        self._lock = RLock()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(statuses) for _, statuses in self._buckets)
+
+    def add(self, processed_status, timestamp=None):
+        """Adds a status, at timestamp when given (e.g. when reloading a snapshot) or at the timer's time."""
+        key = int((self._timer() if timestamp is None else timestamp) // self._bucket_seconds)
+
+        newest = self._newest
+        if newest is None or newest[0] != key:
+            with self._lock:
+                newest = self._bucket(key)
+
+        newest[1].append(processed_status)
+
+        for observer in self._observers:
+            if timestamp is None:
+                observer.add(processed_status)
+            else:
+                observer.add(processed_status, timestamp)
+
+    def _bucket(self, key):
+        newest = self._newest
+        if newest is None or newest[0] < key:
+            newest = self._newest = (key, [])
+            self._buckets.append(newest)
+            return newest
+
+        # Older than the newest bucket: only expected for explicit timestamps, so a linear search is fine.
+        for index in range(len(self._buckets) - 1, -1, -1):
+            bucket_key = self._buckets[index][0]
+            if bucket_key == key:
+                return self._buckets[index]
+            if bucket_key < key:
+                break
+        else:
+            index = -1
+
+        bucket = (key, [])
+        self._buckets.insert(index + 1, bucket)
+        return bucket
+
+    def get_statuses(self):
+        self.expire()
+
+        with self._lock:
+            return list(chain.from_iterable(statuses for _, statuses in self._buckets))
+
+    def expire(self):
+        start = perf_counter()
+        # A bucket is expired once its newest possible status is older than the ttl.
+        cutoff = (self._timer() - self._ttl) // self._bucket_seconds
+
+        with self._lock:
+            while self._buckets and self._buckets[0][0] < cutoff:
+                if self._buckets.popleft() is self._newest:
+                    self._newest = None
+
+        for observer in self._observers:
+            observer.expire()
+        _expire_seconds.observe(perf_counter() - start, ("bucket",))
+
+
+class TextStore(object):
+    """Thread-safe status texts by status id, kept as long as a cache with the same ttl keeps their statuses.
+
+    Meant as the text_store of a ProcessingListenerAction and an observer of its cache, sharing the cache's timer:
+    texts are dropped on the cache's expire, so memory follows the cache instead of growing forever. For a BucketCache
+    pass its bucket_seconds, so texts expire with whole buckets just like their statuses.
+    """
+    def __init__(self, ttl=3600, timer=time, bucket_seconds=None):
+        self._ttl = ttl
+        self._timer = timer
+        self._bucket_seconds = bucket_seconds
+
+        # (expiry key, status id) oldest first.
+        self._added = deque()
+        self._texts = {}
+        self._lock = RLock()
+
+    def _key(self, timestamp):
+        return timestamp if self._bucket_seconds is None else timestamp // self._bucket_seconds
+
+    def __len__(self):
+        with self._lock:
+            return len(self._texts)
+
+    def __contains__(self, status_id):
+        with self._lock:
+            return status_id in self._texts
+
+    def __getitem__(self, status_id):
+        with self._lock:
+            return self._texts[status_id]
+
+    def __setitem__(self, status_id, text):
+        with self._lock:
+            self._texts[status_id] = text
+            self._added.append((self._key(self._timer()), status_id))
+
+    def get(self, status_id, default=None):
+        with self._lock:
+            return self._texts.get(status_id, default)
+
+    def add(self, processed_status, timestamp=None):
+        # Texts are set by status id before the status reaches the cache; only expiry is observed.
+        pass
+
+    def expire(self):
+        # The same cutoff as Cache (ttl) or BucketCache (whole buckets older than the ttl).
+        cutoff = self._key(self._timer() - self._ttl)
+
         with self._lock:
-            self._cache.expire()
\ No newline at end of file
+            while self._added and self._added[0][0] < cutoff:
+                _, status_id = self._added.popleft()
+                self._texts.pop(status_id, None)
@@ -0,0 +1,223 @@
+from collections import OrderedDict
+from logging import getLogger
+from threading import RLock
+from time import time
+
+import numpy as np
+
+from wxmonitor.matching import normalize_text, words as text_words
+from wxmonitor.metrics import registry
+
+logger = getLogger(__name__)
+
+_dedup_results = registry.counter("wxmonitor_dedup_total", "Statuses checked for duplicates, by result", ("result",))
+
+_bands = 4
+_band_bits = 64 // _bands
+_band_mask = (1 << _band_bits) - 1
+
+
+def simhash(features):
+    """Returns the 64 bit SimHash of features: each bit is set when it is set in most of the features' hashes.
+
+    Features are hashed with the builtin hash, which is several times cheaper than hashlib's. String hashes are salted
+    per process, so fingerprints only compare within one process; the index is never persisted.
+    """
+    hashes = np.array([hash(feature) for feature in features], dtype=np.int64)
+    # Packing back in the order unpacked keeps every bit in its place.
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1)
+    majority = bits.sum(axis=0) * 2 > len(features)
+    return int.from_bytes(np.packbits(majority).tobytes(), "little")
+
+
+def text_features(words):
+    """Returns the words and word pairs of a normalized text, so word order counts as well as word choice."""
+    return words + [first + " " + second for first, second in zip(words, words[1:])]
+
+
+class DedupEntry(object):
+    """A status in the index. tags stay None until the status has been categorized."""
+    __slots__ = ("entry_id", "added", "fingerprint", "text_hash", "status_ids", "tags")
+
+    def __init__(self, entry_id, added, fingerprint, text_hash, status_ids, tags=None):
+        self.entry_id = entry_id
+        self.added = added
+        self.fingerprint = fingerprint
+        self.text_hash = text_hash
+        # The ids retweets of this status match on: its own and, for a retweet, the retweeted status'.
+        self.status_ids = status_ids
+        self.tags = tags
+
+
+class DedupMetrics(object):
+    """Thread-safe counts of StatusDeduplicator results."""
+    counter_names = ("unique", "retweet", "near_duplicate")
+
+    def __init__(self):
+        self._lock = RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = dict.fromkeys(self.counter_names, 0)
+
+    def increment(self, name):
+        _dedup_results.inc(labels=(name,))
+        with self._lock:
+            self._counters[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self._counters)
+
+        checked = sum(snapshot.values())
+        snapshot["hit_rate"] = (snapshot["retweet"] + snapshot["near_duplicate"]) / checked if checked else 0.0
+        return snapshot
+
+
+class StatusDeduplicator(object):
+    """Recognizes retweets and near duplicate texts of statuses seen within the last ttl seconds.
+
+    A retweet matches an earlier retweet of the same status, or the status itself. Other texts are normalized and
+    fingerprinted with SimHash over their words and word pairs; texts whose fingerprints differ in at most
+    max_distance of the 64 bits are duplicates. Fingerprints are split into 4 bands indexed separately, so only
+    statuses sharing a band are compared, which finds every match while max_distance < 4. Texts shorter than
+    min_words words are too alike to tell apart and are only matched as retweets. Exact copies of a normalized text
+    are looked up by its hash before any fingerprint is computed.
+
+    The index holds at most maxsize statuses, dropping the oldest first, so its memory stays flat during bursts.
+    """
+    def __init__(self, ttl=3600, maxsize=100000, max_distance=3, min_words=4, timer=time):
+        if max_distance >= _bands:
+            logger.warning("max_distance %d can miss duplicates differing in every band", max_distance)
+
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._max_distance = max_distance
+        self._min_words = min_words
+        self._timer = timer
+
+        # entry id -> DedupEntry, oldest first.
+        self._entries = OrderedDict()
+        # per band: band value -> entry ids
+        self._band_index = [{} for _ in range(_bands)]
+        # normalized text hash -> entry id, for matching exact copies
+        self._texts = {}
+        # status id -> entry id, for matching retweets
+        self._retweets = {}
+        self._next_id = 0
+        self._lock = RLock()
+        self.metrics = DedupMetrics()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def check(self, status):
+        """Returns (entry, duplicate).
+
+        For a duplicate, entry is the earlier status' DedupEntry, whose tags can be reused. Otherwise status is added
+        to the index and entry is its new DedupEntry; set its tags once status is categorized.
+        """
+        retweeted_id = getattr(getattr(status, "retweeted_status", None), "id", None)
+
+        with self._lock:
+            now = self._timer()
+            self._expire(now)
+
+            if retweeted_id is not None:
+                entry_id = self._retweets.get(retweeted_id)
+                if entry_id is not None:
+                    self.metrics.increment("retweet")
+                    return self._entries[entry_id], True
+
+        text = normalize_text(status.text)
+        words = text_words(text)
+        if len(words) < self._min_words:
+            text_hash = fingerprint = None
+        else:
+            # Most copies are the same text once normalized: they are found by its hash, skipping the SimHash.
+            text_hash = hash(text)
+            with self._lock:
+                entry_id = self._texts.get(text_hash)
+                if entry_id is not None:
+                    self.metrics.increment("near_duplicate")
+                    return self._entries[entry_id], True
+
+            fingerprint = simhash(text_features(words))
+
+        with self._lock:
+            if fingerprint is not None:
+                entry = self._find(fingerprint)
+                if entry is not None:
+                    self.metrics.increment("near_duplicate")
+                    return entry, True
+
+            self.metrics.increment("unique")
+            return self._add(now, fingerprint, text_hash, retweeted_id, status.id), False
+
+    def discard(self, entry):
+        """Removes a status added by check, e.g. when it couldn't be categorized, so its copies aren't duplicates."""
+        with self._lock:
+            if self._entries.get(entry.entry_id) is entry:
+                del self._entries[entry.entry_id]
+                self._remove(entry.entry_id, entry)
+
+    def _find(self, fingerprint):
+        candidates = set()
+        for band, index in enumerate(self._band_index):
+            candidates.update(index.get((fingerprint >> (band * _band_bits)) & _band_mask, ()))
+
+        for entry_id in sorted(candidates):
+            entry = self._entries[entry_id]
+            if bin(entry.fingerprint ^ fingerprint).count("1") <= self._max_distance:
+                return entry
+
+        return None
+
+    def _add(self, now, fingerprint, text_hash, retweeted_id, status_id):
+        entry_id = self._next_id
+        self._next_id += 1
+        status_ids = (status_id,) if retweeted_id is None else (status_id, retweeted_id)
+        entry = self._entries[entry_id] = DedupEntry(entry_id, now, fingerprint, text_hash, status_ids)
+        if text_hash is not None:
+            self._texts[text_hash] = entry_id
+
+        # Retweets of this status, and further retweets of the status it retweets, match it.
+        for key in status_ids:
+            self._retweets[key] = entry_id
+
+        if fingerprint is not None:
+            for band, index in enumerate(self._band_index):
+                index.setdefault((fingerprint >> (band * _band_bits)) & _band_mask, set()).add(entry_id)
+
+        return entry
+
+    def _expire(self, now):
+        cutoff = now - self._ttl
+        entries = self._entries
+
+        while entries:
+            entry_id, entry = next(iter(entries.items()))
+            # Room is kept for the status being checked.
+            if entry.added >= cutoff and len(entries) < self._maxsize:
+                break
+
+            entries.popitem(last=False)
+            self._remove(entry_id, entry)
+
+    def _remove(self, entry_id, entry):
+        if entry.fingerprint is not None:
+            for band, index in enumerate(self._band_index):
+                key = (entry.fingerprint >> (band * _band_bits)) & _band_mask
+                ids = index[key]
+                ids.discard(entry_id)
+                if not ids:
+                    del index[key]
+
+        if entry.text_hash is not None and self._texts.get(entry.text_hash) == entry_id:
+            del self._texts[entry.text_hash]
+
+        for key in entry.status_ids:
+            if self._retweets.get(key) == entry_id:
+                del self._retweets[key]
@@ -0,0 +1,91 @@
+from logging import getLogger
+from math import floor
+from os.path import join
+
+import numpy as np
+import shapefile
+from matplotlib.path import Path
+from mpl_toolkits.basemap import basemap_datadir
+
+logger = getLogger(__name__)
+
+default_county_shapefile = join(basemap_datadir, "UScounties")
+
+
+def status_point(status):
+    """Returns the (lon, lat) a status is geotagged with, or None.
+
+    coordinates is GeoJSON, {"type": "Point", "coordinates": [lon, lat]}, for both tweepy statuses and ReplayStatus.
+    """
+    coordinates = getattr(status, "coordinates", None)
+    if not coordinates:
+        return None
+
+    try:
+        lon, lat = coordinates["coordinates"][:2]
+        return float(lon), float(lat)
+    except (KeyError, TypeError, ValueError):
+        logger.debug("Unexpected coordinates: %r", coordinates)
+        return None
+
+
+class CountyLocator(object):
+    """Resolves longitude/latitude points to the county containing them.
+
+    County polygons come from the Basemap UScounties shapefile, unprojected, limited to states when given. Their
+    bounding boxes are registered in a grid of cell_size degree cells, so a lookup only tests the few polygons whose
+    box overlaps the point's cell.
+    """
+    def __init__(self, states=None, county_shapefile=default_county_shapefile, cell_size=0.25):
+        self._cell_size = cell_size
+        self._counties = []
+        self._grid = {}
+
+        self._load(county_shapefile, set(state.upper() for state in states) if states else None)
+
+    def __len__(self):
+        return len(self._counties)
+
+    def _load(self, county_shapefile, states):
+        logger.debug("Loading county polygons from %s", county_shapefile)
+        reader = shapefile.Reader(county_shapefile, encoding="latin-1")
+        fields = [field[0] for field in reader.fields[1:]]
+        state_index = fields.index("STATE")
+        name_index = fields.index("NAME")
+
+        for i, record in enumerate(reader.iterRecords()):
+            if states is not None and record[state_index] not in states:
+                continue
+
+            shape = reader.shape(i)
+            points = np.asarray(shape.points)
+            parts = list(shape.parts) + [len(points)]
+            path = Path.make_compound_path(*(Path(points[start:end]) for start, end in zip(parts, parts[1:])))
+
+            county_id = len(self._counties)
+            self._counties.append(((record[state_index].lower(), record[name_index].lower()), shape.bbox, path))
+
+            x0, y0, x1, y1 = shape.bbox
+            for cell_x in range(self._cell(x0), self._cell(x1) + 1):
+                for cell_y in range(self._cell(y0), self._cell(y1) + 1):
+                    self._grid.setdefault((cell_x, cell_y), []).append(county_id)
+
+        logger.debug("Indexed %d counties in %d cells", len(self._counties), len(self._grid))
+
+    def _cell(self, degrees):
+        return int(floor(degrees / self._cell_size))
+
+    def locate(self, lon, lat):
+        """Returns (state, county), both lower case, of the county containing the point, or None."""
+        for county_id in self._grid.get((self._cell(lon), self._cell(lat)), ()):
+            county, (x0, y0, x1, y1), path = self._counties[county_id]
+            if x0 <= lon <= x1 and y0 <= lat <= y1 and path.contains_point((lon, lat)):
+                return county
+
+        return None
+
+    def locate_status(self, status):
+        point = status_point(status)
+        if point is None:
+            return None
+        return self.locate(*point)
@@ -1,5 +1,20 @@
-from mpl_toolkits.basemap import Basemap
+import pickle
+from collections import deque
+from hashlib import sha1
+from io import BytesIO
+from logging import getLogger
+from os import makedirs, replace
+from os.path import exists, join
 
+import numpy as np
+from matplotlib import pyplot as plt
+from matplotlib.collections import PolyCollection
+from matplotlib.patches import Polygon
+from matplotlib.path import Path
+from mpl_toolkits.basemap import Basemap, basemap_datadir
+from PIL import Image
+
+logger = getLogger(__name__)
 
 
 _default_state_boundry_options = dict(linewidth=0.5, linestyle="solid", color=(0,0,0),
@@ -9,17 +24,20 @@ _default_county_boundry_options = dict(linewidth=0.1, linestyle="solid", color=(
                                        antialiased=1, ax=None, zorder=None, drawbounds=False)
 
 
-def make_basemap(lat_0, lon_0, lower_left_lon, lower_left_lat, upper_right_lon, upper_right_lat):
+def make_basemap(lat_0, lon_0, lower_left_lon, lower_left_lat, upper_right_lon, upper_right_lat, resolution='h'):
+    m = build_basemap(lat_0, lon_0, lower_left_lon, lower_left_lat, upper_right_lon, upper_right_lat, resolution)
+    draw_background(m)
+    return m
+
+
+def build_basemap(lat_0, lon_0, lower_left_lon, lower_left_lat, upper_right_lon, upper_right_lat, resolution='h'):
+    """Builds the projected Basemap and loads the county polygons without drawing anything."""
     m = Basemap(projection='lcc', lat_0=lat_0, lon_0=lon_0,
-                resolution='h', area_thresh=0.1,
+                resolution=resolution, area_thresh=0.1,
                 llcrnrlon=lower_left_lon, llcrnrlat=lower_left_lat,
                 urcrnrlon=upper_right_lon, urcrnrlat=upper_right_lat)
 
-    m.drawcoastlines()
-    m.drawcountries()
-    m.drawstates(**_default_state_boundry_options)
-    m.drawcounties(**_default_county_boundry_options)
-    m.drawmapboundary()
+    m.readshapefile(join(basemap_datadir, "UScounties"), "counties", default_encoding="latin-1", drawbounds=False)
 
     # monkey patch on the county poly map.
     m.county_poly_map = {}
@@ -30,6 +48,232 @@ def make_basemap(lat_0, lon_0, lower_left_lon, lower_left_lat, upper_right_lon,
     return m
 
 
+def load_basemap(cache_dir=None, **basemap_args):
+    """Returns build_basemap(**basemap_args), pickled in cache_dir keyed by the projection arguments."""
+    if cache_dir is None:
+        return build_basemap(**basemap_args)
+
+    key = sha1(repr(sorted(basemap_args.items())).encode("UTF8")).hexdigest()
+    filename = join(cache_dir, "basemap_{0}.pickle".format(key))
+
+    if exists(filename):
+        logger.debug("Loading cached basemap: %s", filename)
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+
+    m = build_basemap(**basemap_args)
+
+    makedirs(cache_dir, exist_ok=True)
+    with open(filename + ".tmp", "wb") as f:
+        pickle.dump(m, f, protocol=pickle.HIGHEST_PROTOCOL)
+    replace(filename + ".tmp", filename)
+    logger.debug("Cached basemap: %s", filename)
+
+    return m
+
+
+def draw_background(m, ax=None):
+    m.drawcoastlines(ax=ax)
+    m.drawcountries(ax=ax)
+    m.drawstates(**dict(_default_state_boundry_options, ax=ax))
+    _draw_counties(m, **dict(_default_county_boundry_options, ax=ax))
+    m.drawmapboundary(ax=ax)
+
+
+def _draw_counties(m, linewidth, linestyle, color, antialiased, ax=None, zorder=None, **kwargs):
+    # Same as Basemap.drawcounties, but uses the already loaded polygons instead of re-reading the shapefile.
+    ax = ax or m._check_ax()
+    counties = PolyCollection(m.counties, antialiaseds=(antialiased,))
+    counties.set_linestyle(linestyle)
+    counties.set_linewidth(linewidth)
+    counties.set_edgecolor(color)
+    counties.set_facecolor("none")
+    counties.set_label("counties")
+    if zorder:
+        counties.set_zorder(zorder)
+    ax.add_collection(counties)
+    return counties
+
+
+class CountyMapRenderer(object):
+    """Renders county count maps onto a persistent figure.
+
+    The Basemap and county polygons are built on first use, or loaded from cache_dir, and the background is drawn
+    once. Each render only shows and recolors the county patches, then makes the figure current for the report
+    outputs. Counties are colored by color_scale when given, else linearly between the minimum and maximum passed to
+    render. layer names the map being rendered, e.g. an event layer, so each keeps its own color_scale window.
+    """
+    def __init__(self, lat_0, lon_0, lower_left_lon, lower_left_lat, upper_right_lon, upper_right_lat,
+                 resolution='h', figsize=(12, 6), cache_dir=None, color_scale=None):
+        self._basemap_args = dict(lat_0=lat_0, lon_0=lon_0,
+                                  lower_left_lon=lower_left_lon, lower_left_lat=lower_left_lat,
+                                  upper_right_lon=upper_right_lon, upper_right_lat=upper_right_lat,
+                                  resolution=resolution)
+        self._figsize = figsize
+        self._cache_dir = cache_dir
+        self._color_scale = color_scale
+
+        self._basemap = None
+        self._figure = None
+        self._ax = None
+        self._patches = {}
+
+    @property
+    def basemap(self):
+        if self._basemap is None:
+            self._basemap = load_basemap(cache_dir=self._cache_dir, **self._basemap_args)
+        return self._basemap
+
+    @property
+    def axes(self):
+        return self.figure.axes[0]
+
+    @property
+    def figure(self):
+        if self._figure is None:
+            m = self.basemap
+            self._figure = plt.figure(figsize=self._figsize)
+            self._ax = self._figure.gca()
+            draw_background(m, ax=self._ax)
+        return self._figure
+
+    def render(self, seen_counties, minimum, maximum, state="tn", layer=None):
+        plt.figure(self.figure.number)
+
+        for patch in self._patches.values():
+            patch.set_visible(False)
+
+        counties = list(seen_counties)
+        colors = get_county_colors([seen_counties[county] for county in counties], minimum, maximum,
+                                   self._color_scale, layer)
+
+        for county, color in zip(counties, colors):
+            county_hash = make_county_key_hash(county, state)
+            patch = self._patches.get(county_hash)
+
+            if patch is None:
+                patch = Polygon(self.basemap.county_poly_map[county_hash], edgecolor=(0.9, 0.9, 0.9))
+                self._ax.add_patch(patch)
+                self._patches[county_hash] = patch
+
+            patch.set_facecolor(color)
+            patch.set_visible(True)
+
+        return self._figure
+
+
+class RasterMapRenderer(object):
+    """Renders county count maps as PNG bytes by compositing county colors over a pre-rendered background.
+
+    The background drawn by a CountyMapRenderer is rasterized once and every pixel inside a county polygon is
+    labelled with that county's id, leaving county borders uncovered. A render is then a NumPy color lookup over the
+    labelled pixels and a PNG encode, without going through matplotlib.
+    """
+    def __init__(self, lat_0, lon_0, lower_left_lon, lower_left_lat, upper_right_lon, upper_right_lat,
+                 resolution='h', figsize=(12, 6), dpi=100, cache_dir=None, compress_level=3, color_scale=None):
+        self._vector = CountyMapRenderer(lat_0, lon_0, lower_left_lon, lower_left_lat, upper_right_lon,
+                                         upper_right_lat, resolution=resolution, figsize=figsize, cache_dir=cache_dir)
+        self._color_scale = color_scale
+        self._dpi = dpi
+        self._compress_level = compress_level
+
+        self._background = None
+        self._county_ids = None
+        self._pixel_index = None
+        self._pixel_ids = None
+
+    @property
+    def county_ids(self):
+        self._build()
+        return self._county_ids
+
+    def _build(self):
+        if self._background is not None:
+            return
+
+        logger.debug("Rasterizing map background.")
+        figure = self._vector.figure
+        figure.set_dpi(self._dpi)
+        figure.canvas.draw()
+        self._background = np.asarray(figure.canvas.buffer_rgba())[:, :, :3].copy()
+
+        height, width = self._background.shape[:2]
+        transform = self._vector.axes.transData
+        mask = np.zeros((height, width), dtype=np.int32)
+        self._county_ids = {}
+
+        for county_hash, seg in self._vector.basemap.county_poly_map.items():
+            vertices = transform.transform(seg)
+            x0, y0 = np.maximum(np.floor(vertices.min(axis=0)).astype(int), 0)
+            x1, y1 = np.minimum(np.ceil(vertices.max(axis=0)).astype(int), (width, height))
+            if x0 >= x1 or y0 >= y1:
+                continue
+
+            # Display coordinates start at the bottom left, image rows at the top left.
+            xs, ys = np.meshgrid(np.arange(x0, x1) + 0.5, np.arange(y0, y1) + 0.5)
+            inside = Path(vertices).contains_points(np.column_stack([xs.ravel(), ys.ravel()])).reshape(xs.shape)
+            if not inside.any():
+                continue
+
+            county_id = self._county_ids[county_hash] = len(self._county_ids) + 1
+            mask[height - y1:height - y0, x0:x1][inside[::-1]] = county_id
+
+        # Leave the pixels where counties meet to the background so the county outlines stay visible.
+        border = np.zeros_like(mask, dtype=bool)
+        border[:, 1:] |= mask[:, 1:] != mask[:, :-1]
+        border[1:, :] |= mask[1:, :] != mask[:-1, :]
+        mask[border] = 0
+
+        self._pixel_index = np.flatnonzero(mask)
+        self._pixel_ids = mask.ravel()[self._pixel_index]
+
+        plt.close(figure)
+        logger.debug("Labelled %d counties over %d pixels.", len(self._county_ids), len(self._pixel_index))
+
+    def __getstate__(self):
+        # Workers only need the labelled raster, not the basemap and figure it was made from.
+        self._build()
+        state = dict(self.__dict__)
+        state["_vector"] = None
+        return state
+
+    def render(self, seen_counties, minimum, maximum, state="tn", layer=None):
+        return encode_png(self.composite(seen_counties, minimum, maximum, state, layer=layer), self._compress_level)
+
+    def composite(self, seen_counties, minimum, maximum, state="tn", color_scale=None, layer=None):
+        """Returns the map as an RGB array. color_scale, when given, is used instead of the renderer's."""
+        self._build()
+
+        county_ids = []
+        counts = []
+        for county, count in seen_counties.items():
+            county_id = self._county_ids.get(make_county_key_hash(county, state))
+            if county_id is None:
+                logger.debug("County not on the map: %s", county)
+                continue
+
+            county_ids.append(county_id)
+            counts.append(count)
+
+        colors = np.zeros((len(self._county_ids) + 1, 3), dtype=np.uint8)
+        seen = np.zeros(len(self._county_ids) + 1, dtype=bool)
+        color_scale = self._color_scale if color_scale is None else color_scale
+        colors[county_ids] = np.round(get_county_colors(counts, minimum, maximum, color_scale, layer) * 255)
+        seen[county_ids] = True
+
+        image = self._background.copy()
+        selected = seen[self._pixel_ids]
+        image.reshape(-1, 3)[self._pixel_index[selected]] = colors[self._pixel_ids[selected]]
+
+        return image
+
+
+def encode_png(image, compress_level=3):
+    output = BytesIO()
+    Image.fromarray(image).save(output, format="PNG", compress_level=compress_level)
+    return output.getvalue()
+
+
 def get_rgb(val, min, max):
     mid = min + (max - min) / 2
 
@@ -53,9 +297,100 @@ def get_rgb(val, min, max):
     return [r, g, b]
 
 
+def get_rgb_array(values, minimum, maximum):
+    """Vectorized get_rgb: returns an (N, 3) array with the get_rgb color of each value."""
+    values = np.asarray(values, dtype=float)
+    mid = minimum + (maximum - minimum) / 2.0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        above = (maximum - values) / (maximum - mid)
+        below = (mid - values) / (mid - minimum)
+
+    rgb = np.zeros((len(values), 3))
+    rgb[:, 1] = 1
+
+    is_above = values > mid
+    rgb[is_above, 0] = 1 - above[is_above]
+    rgb[is_above, 1] = above[is_above]
+
+    is_below = values < mid
+    rgb[is_below, 1] = 1 - below[is_below]
+    rgb[is_below, 2] = below[is_below]
+
+    return rgb
+
+
+def get_county_colors(counts, minimum, maximum, color_scale=None, layer=None):
+    if color_scale is None:
+        return get_rgb_array(counts, minimum, maximum)
+    return color_scale.colors(counts, layer)
+
+
+class ColorScale(object):
+    """Maps county counts onto the get_rgb color ramp.
+
+    scale is "linear" or "log" (counts are mapped through log1p). minimum and maximum fix the ends of the ramp;
+    any left as None follows the counts, taking the extreme over the last window calls so colors don't jump when a
+    busy county drops out. Each layer passed to bounds and colors has its own window.
+    """
+    LINEAR = "linear"
+    LOG = "log"
+
+    def __init__(self, minimum=None, maximum=None, scale=LINEAR, window=1):
+        if scale not in (self.LINEAR, self.LOG):
+            raise ValueError("Unknown color scale: {0}".format(scale))
+
+        self._minimum = minimum
+        self._maximum = maximum
+        self._scale = scale
+        self._window = window
+        self._recent = {}
+
+    def bounds(self, counts, layer=None):
+        """Returns the (minimum, maximum) used for counts, recording them in the layer's rolling window."""
+        recent = self._recent.get(layer)
+        if recent is None:
+            recent = self._recent[layer] = deque(maxlen=self._window)
+
+        if len(counts):
+            recent.append((np.min(counts), np.max(counts)))
+
+        minimum, maximum = self._minimum, self._maximum
+        if recent:
+            if minimum is None:
+                minimum = min(low for low, _ in recent)
+            if maximum is None:
+                maximum = max(high for _, high in recent)
+
+        return minimum, maximum
+
+    def fixed(self, minimum, maximum):
+        """Returns a copy with the ends left to follow the counts fixed at minimum and maximum."""
+        return ColorScale(minimum=minimum if self._minimum is None else self._minimum,
+                          maximum=maximum if self._maximum is None else self._maximum, scale=self._scale)
+
+    def colors(self, counts, layer=None):
+        counts = np.asarray(counts, dtype=float)
+        minimum, maximum = self.bounds(counts, layer)
+
+        if minimum is None or maximum is None:
+            return np.zeros((0, 3))
+
+        # Fixed ends can be passed by the counts; those take the color of the end.
+        counts = np.clip(counts, minimum, maximum)
+        if self._scale == self.LOG:
+            return get_rgb_array(np.log1p(counts), np.log1p(minimum), np.log1p(maximum))
+        return get_rgb_array(counts, minimum, maximum)
+
+
 def make_county_hash(state, county):
     if type(state) == str:
         state = bytes(state, "UTF8")
     if type(county) == str:
         county = bytes(county, "UTF8")
-    return (state + b"_" + county).lower()
\ No newline at end of file
+    return (state + b"_" + county).lower()
+
+def make_county_key_hash(county, state):
+    """make_county_hash for a county key, which is qualified as "state:county" or taken to be in state."""
+    county_state, _, name = county.rpartition(":")
+    return make_county_hash(county_state or state, name)
@@ -0,0 +1,214 @@
+import json
+from datetime import datetime, timezone
+from logging import getLogger
+from os import listdir, makedirs, replace
+from os.path import exists, getsize, isdir, join
+from threading import RLock
+
+import numpy as np
+
+from wxmonitor.utils import ExcThread
+
+logger = getLogger(__name__)
+
+_status_dtype = np.dtype([("timestamp", "<f8"), ("spotter", "u1")])
+_mention_dtype = np.dtype([("timestamp", "<f8"), ("id", "<u4")])
+
+_partition_format = "%Y%m%d"
+_names_file = "names.json"
+
+
+def _partition(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime(_partition_format)
+
+
+def _read_rows(filename, dtype):
+    if not exists(filename):
+        return np.zeros(0, dtype=dtype)
+    # A row cut short by a crash mid write is ignored until the next append drops it.
+    return np.fromfile(filename, dtype=dtype, count=getsize(filename) // dtype.itemsize)
+
+
+class HistoryFlushThread(ExcThread):
+    def __init__(self, store, interval):
+        self._store = store
+        super(HistoryFlushThread, self).__init__(loop_sleep_timeout=interval)
+
+    def _do_work(self):
+        self._store.flush()
+
+
+class HistoryStore(object):
+    """Append-only, columnar archive of processed statuses, partitioned by UTC day.
+
+    Each day directory holds fixed width binary tables: statuses (timestamp, spotter) and one row per county and per
+    event mention (timestamp, name id). Names are numbered in names.json. Appends are buffered and written every
+    flush_rows statuses and, once start() is called, at least every flush_interval seconds from a background thread,
+    so quiet periods still reach disk. Queries flush first, then scan only the days overlapping the window with NumPy.
+    """
+    def __init__(self, directory, flush_rows=1000, flush_interval=60):
+        self._directory = directory
+        self._flush_rows = flush_rows
+        self._flush_interval = flush_interval
+        self._thread = None
+        self._lock = RLock()
+
+        makedirs(directory, exist_ok=True)
+        self._names = {"counties": [], "events": []}
+        names_file = join(directory, _names_file)
+        if exists(names_file):
+            with open(names_file, "r") as f:
+                self._names = json.load(f)
+        self._ids = {table: {name: i for i, name in enumerate(names)} for table, names in self._names.items()}
+        self._names_changed = False
+
+        self._pending = []
+
+    def add(self, processed_status):
+        with self._lock:
+            self._pending.append(processed_status)
+            if len(self._pending) >= self._flush_rows:
+                self.flush()
+
+    def _name_id(self, table, name):
+        ids = self._ids[table]
+        name_id = ids.get(name)
+        if name_id is None:
+            name_id = ids[name] = len(ids)
+            self._names[table].append(name)
+            self._names_changed = True
+        return name_id
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+
+            partitions = {}
+            for status in self._pending:
+                rows = partitions.get(_partition(status.timestamp))
+                if rows is None:
+                    rows = partitions[_partition(status.timestamp)] = ([], [], [])
+
+                statuses, counties, events = rows
+                statuses.append((status.timestamp, status.spotter))
+                counties.extend((status.timestamp, self._name_id("counties", county)) for county in status.counties)
+                events.extend((status.timestamp, self._name_id("events", event)) for event in status.events)
+
+            # Names first, so every id written to a table can be resolved.
+            if self._names_changed:
+                self._write_names()
+
+            for partition, (statuses, counties, events) in partitions.items():
+                directory = join(self._directory, partition)
+                makedirs(directory, exist_ok=True)
+                self._append(join(directory, "statuses.bin"), statuses, _status_dtype)
+                self._append(join(directory, "counties.bin"), counties, _mention_dtype)
+                self._append(join(directory, "events.bin"), events, _mention_dtype)
+
+            logger.debug("Archived %d statuses", len(self._pending))
+            self._pending = []
+
+    def _write_names(self):
+        filename = join(self._directory, _names_file)
+        with open(filename + ".tmp", "w") as f:
+            json.dump(self._names, f)
+        replace(filename + ".tmp", filename)
+        self._names_changed = False
+
+    @staticmethod
+    def _append(filename, rows, dtype):
+        if rows:
+            with open(filename, "ab") as f:
+                # Drop a row cut short by a crash, so the appended rows stay aligned.
+                partial = f.seek(0, 2) % dtype.itemsize
+                if partial:
+                    f.truncate(f.tell() - partial)
+                f.write(np.array(rows, dtype=dtype).tobytes())
+
+    def start(self):
+        self._thread = HistoryFlushThread(self, self._flush_interval)
+        self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def partitions(self, start=None, end=None):
+        """Returns the day directories overlapping [start, end), oldest first."""
+        first = None if start is None else _partition(start)
+        last = None if end is None else _partition(end)
+
+        return [name for name in sorted(listdir(self._directory))
+                if isdir(join(self._directory, name)) and (first is None or name >= first) and
+                (last is None or name <= last)]
+
+    def _scan(self, table, dtype, start, end):
+        self.flush()
+
+        chunks = []
+        for partition in self.partitions(start, end):
+            rows = _read_rows(join(self._directory, partition, table), dtype)
+            mask = np.ones(len(rows), dtype=bool)
+            if start is not None:
+                mask &= rows["timestamp"] >= start
+            if end is not None:
+                mask &= rows["timestamp"] < end
+            chunks.append(rows[mask])
+
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype)
+
+    def _counts(self, table, start, end):
+        rows = self._scan(table + ".bin", _mention_dtype, start, end)
+        names = self._names[table]
+        counts = np.bincount(rows["id"], minlength=len(names))
+        return {names[i]: int(counts[i]) for i in np.flatnonzero(counts)}
+
+    def status_count(self, start=None, end=None, spotter_only=False):
+        rows = self._scan("statuses.bin", _status_dtype, start, end)
+        return int(rows["spotter"].sum()) if spotter_only else len(rows)
+
+    def county_counts(self, start=None, end=None):
+        """Returns {county: statuses mentioning it} for statuses in [start, end)."""
+        return self._counts("counties", start, end)
+
+    def event_counts(self, start=None, end=None):
+        return self._counts("events", start, end)
+
+    def top_counties(self, start=None, end=None, limit=10):
+        counts = self.county_counts(start, end)
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def county_buckets(self, start, end, bucket_seconds=300):
+        """Returns a {county: count} dict per bucket_seconds bucket of [start, end), e.g. for window_frames."""
+        buckets = int(np.ceil((end - start) / bucket_seconds))
+        rows = self._scan("counties.bin", _mention_dtype, start, end)
+        names = self._names["counties"]
+
+        bucket_counts = [{} for _ in range(buckets)]
+        if len(rows):
+            # Count each (bucket, county) pair in one pass.
+            keys = ((rows["timestamp"] - start) // bucket_seconds).astype(np.int64) * len(names) + rows["id"]
+            pairs, counts = np.unique(keys, return_counts=True)
+            for bucket, county_id, count in zip(pairs // len(names), pairs % len(names), counts):
+                bucket_counts[bucket][names[county_id]] = int(count)
+
+        return bucket_counts
+
+    def county_series(self, county, start, end, bucket_seconds=3600):
+        """Returns (bucket start times, counts) of statuses mentioning county, in bucket_seconds buckets."""
+        county_id = self._ids["counties"].get(county)
+        buckets = int(np.ceil((end - start) / bucket_seconds))
+        starts = start + np.arange(buckets) * bucket_seconds
+
+        if county_id is None:
+            return starts, np.zeros(buckets, dtype=np.int64)
+
+        rows = self._scan("counties.bin", _mention_dtype, start, end)
+        timestamps = rows["timestamp"][rows["id"] == county_id]
+        counts = np.bincount(((timestamps - start) // bucket_seconds).astype(np.int64), minlength=buckets)
+        return starts, counts[:buckets]
+
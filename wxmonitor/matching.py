@@ -0,0 +1,119 @@
+import re
+
+_word_regex = re.compile(r"\w+")
+_url_regex = re.compile(r"https?://\S+|www\.\S+")
+_retweet_prefix_regex = re.compile(r"^rt @\w+:?\s*")
+_terminal = None
+
+
+def tokenize(content):
+    """Split content into (start, end, word) tuples using the same word definition as the regex \\b anchor."""
+    return [(m.start(), m.end(), m.group()) for m in _word_regex.finditer(content)]
+
+
+def words(content):
+    """Returns the words of content, as tokenize finds them, without their positions."""
+    return _word_regex.findall(content)
+
+
+def normalize_text(content):
+    """Lower cases content, drops URLs and a leading "RT @user:" and collapses whitespace."""
+    content = _url_regex.sub(" ", content.lower())
+    return " ".join(_retweet_prefix_regex.sub("", content.strip()).split())
+
+
+class PhraseMatcher(object):
+    """Finds whole word phrases in a single pass over a tokenized text.
+
+    Phrases are stored in a trie keyed on their words and the separators between them, so a phrase matches when
+    consecutive words of the text and the text between them are equal to the phrase, the same criteria as a
+    \\bphrase\\b regex. Matches are leftmost-longest and do not overlap. Both phrases and the content are expected to
+    be lower case.
+    """
+    def __init__(self, phrases=()):
+        self._root = {}
+
+        for phrase in phrases:
+            self.add(phrase)
+
+    def add(self, phrase):
+        tokens = tokenize(phrase)
+        if not tokens:
+            return
+
+        node = self._root
+        prev_end = None
+        for start, end, word in tokens:
+            key = word if prev_end is None else (phrase[prev_end:start], word)
+            node = node.setdefault(key, {})
+            prev_end = end
+
+        node[_terminal] = phrase
+
+    def findall(self, content, tokens):
+        matches = []
+        root = self._root
+        count = len(tokens)
+
+        i = 0
+        while i < count:
+            node = root.get(tokens[i][2])
+            match = None
+            match_index = i
+            j = i
+
+            while node is not None:
+                if _terminal in node:
+                    match = node[_terminal]
+                    match_index = j
+
+                j += 1
+                if j >= count:
+                    break
+
+                node = node.get((content[tokens[j - 1][1]:tokens[j][0]], tokens[j][2]))
+
+            if match is not None:
+                matches.append(match)
+            i = match_index + 1
+
+        return matches
+
+
+class EventMatcher(object):
+    """Finds event words and word spans in a single pass over a tokenized text.
+
+    words are matched as whole words (\\bword\\b). spans are (prefix, suffix) pairs matched like \\bprefix.*?suffix\\b
+    and returned as the full matched text. Words inside a matched span are not matched again. Both the configuration
+    and the content are expected to be lower case.
+    """
+    def __init__(self, words, spans=()):
+        self._words = frozenset(words)
+        self._spans = [(prefix, re.compile(re.escape(suffix) + r"\b")) for prefix, suffix in spans]
+
+    def findall(self, content, tokens):
+        matches = []
+        words = self._words
+        covered_until = 0
+
+        for start, end, word in tokens:
+            if start < covered_until:
+                continue
+
+            if word in words:
+                matches.append(word)
+                continue
+
+            for prefix, suffix_regex in self._spans:
+                if not word.startswith(prefix):
+                    continue
+
+                m = suffix_regex.search(content, start + len(prefix))
+                if m is None or content.find("\n", start, m.start()) != -1:
+                    continue
+
+                matches.append(content[start:m.end()])
+                covered_until = m.end()
+                break
+
+        return matches
@@ -0,0 +1,234 @@
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from logging import getLogger
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+
+logger = getLogger(__name__)
+
+default_buckets = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(object):
+    kind = "untyped"
+
+    def __init__(self, registry, name, help, labelnames=()):
+        self._registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def _labels(self, labels, extra=()):
+        pairs = list(zip(self.labelnames, labels)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join("{0}=\"{1}\"".format(name, _escape(value)) for name, value in pairs) + "}"
+
+    def samples(self):
+        """Yields (name, labels text, value) for the exposition format."""
+        with self._lock:
+            values = list(self._values.items())
+
+        for labels, value in sorted(values):
+            yield self.name, self._labels(labels), value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, labels=()):
+        if not self._registry.enabled:
+            return
+
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+
+class Gauge(Metric):
+    """A value that goes up and down, either set directly or read from a function when scraped."""
+    kind = "gauge"
+
+    def __init__(self, registry, name, help, labelnames=()):
+        super(Gauge, self).__init__(registry, name, help, labelnames)
+        self._functions = {}
+
+    def set(self, value, labels=()):
+        if not self._registry.enabled:
+            return
+
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, function, labels=()):
+        with self._lock:
+            self._functions[labels] = function
+
+    def samples(self):
+        for sample in super(Gauge, self).samples():
+            yield sample
+
+        with self._lock:
+            functions = list(self._functions.items())
+
+        for labels, function in sorted(functions, key=lambda item: item[0]):
+            yield self.name, self._labels(labels), function()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=default_buckets):
+        super(Histogram, self).__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        if not self._registry.enabled:
+            return
+
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            stats = self._values.get(labels)
+            if stats is None:
+                # per bucket counts (the last one above every bound), sum, count
+                stats = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+            stats[0][index] += 1
+            stats[1] += value
+            stats[2] += 1
+
+    def count(self, labels=()):
+        with self._lock:
+            stats = self._values.get(labels)
+            return 0 if stats is None else stats[2]
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items()]
+
+        for labels, (counts, total, count) in sorted(values, key=lambda item: item[0]):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield self.name + "_bucket", self._labels(labels, [("le", _format_value(bound))]), cumulative
+            yield self.name + "_sum", self._labels(labels), total
+            yield self.name + "_count", self._labels(labels), count
+
+
+class MetricsRegistry(object):
+    """Holds the metrics and renders them in the Prometheus text format.
+
+    Metrics only record while the registry is enabled; disabled, recording is a single attribute check, so modules
+    create their metrics on import and record unconditionally.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = Lock()
+
+    def _get_or_create(self, metric_type, name, help, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_type(self, name, help, labelnames, **kwargs)
+            elif type(metric) is not metric_type:
+                raise ValueError("Metric {0} is already a {1}".format(name, metric.kind))
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=default_buckets):
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def reset(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        for metric in metrics:
+            metric.reset()
+
+    def render(self):
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+        lines = []
+        for metric in metrics:
+            lines.append("# HELP {0} {1}".format(metric.name, _escape(metric.help)))
+            lines.append("# TYPE {0} {1}".format(metric.name, metric.kind))
+            for name, labels, value in metric.samples():
+                lines.append("{0}{1} {2}".format(name, labels, _format_value(value)))
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer(object):
+    """Serves registry.render() at /metrics over HTTP from a background thread."""
+    def __init__(self, metrics_registry=registry, port=9108, host="127.0.0.1"):
+        self._registry = metrics_registry
+        self._address = (host, port)
+        self._server = None
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        metrics_registry = self._registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = metrics_registry.render().encode("UTF8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("Metrics request: " + format, *args)
+
+        self._server = _ThreadingHTTPServer(self._address, Handler)
+        self._thread = Thread(target=self._server.serve_forever, name="metrics-server")
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info("Serving metrics on http://%s:%d/metrics", self._address[0], self.port)
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
@@ -0,0 +1,142 @@
+import pickle
+from csv import DictReader
+from hashlib import sha1
+from logging import getLogger
+from os import replace
+from struct import Struct
+
+from wxmonitor.matching import PhraseMatcher
+
+logger = getLogger(__name__)
+
+place_index_magic = b"WXPLACES"
+place_index_version = 2
+
+# magic, version, sha1 of the source place file
+_header = Struct("<8sH20s")
+
+
+class PlaceIndexError(Exception):
+    pass
+
+
+def source_hash(ansi_code_file):
+    with open(ansi_code_file, "rb") as f:
+        return sha1(f.read()).digest()
+
+
+class PlaceIndex(object):
+    """Place data parsed from an ANSI place file, along with the phrase matchers built from it.
+
+    county_states maps each county to the states it is in. qualified_city_county_map is city_county_map with every
+    county prefixed by its state, as "state:county", for place files covering more than one state.
+    """
+    def __init__(self, cities, counties, zipcodes, city_county_map, city_zip_map, city_matcher, county_matcher,
+                 county_states, qualified_city_county_map):
+        self.cities = cities
+        self.counties = counties
+        self.zipcodes = zipcodes
+        self.city_county_map = city_county_map
+        self.city_zip_map = city_zip_map
+        self.county_states = county_states
+        self.qualified_city_county_map = qualified_city_county_map
+        self.city_matcher = city_matcher
+        self.county_matcher = county_matcher
+
+    @classmethod
+    def from_ansi_file(cls, ansi_code_file):
+        logger.debug("Building place data with ansi code file: %s", ansi_code_file)
+        cities = set()
+        counties = set()
+        zipcodes = set()
+        city_county_map = {}
+        city_zip_map = {}
+        county_states = {}
+        qualified_city_county_map = {}
+
+        with open(ansi_code_file, "r") as f:
+            reader = DictReader(f, delimiter="|")
+
+            for row in reader:
+                zipcode = row["PLACEFP"]
+                city = " ".join(row["PLACENAME"].split()[:-1]).lower()
+                state = row["STATE"].strip().lower()
+
+                for county in map(str.strip, row["COUNTY"].split(",")):
+                    county = county.lower()
+
+                    counties.add(county)
+                    city_county_map.setdefault(city, []).append(county)
+                    qualified_city_county_map.setdefault(city, []).append(state + ":" + county)
+
+                    states = county_states.setdefault(county, [])
+                    if state not in states:
+                        states.append(state)
+
+                zipcodes.add(zipcode)
+                cities.add(city)
+                city_zip_map[city] = zipcode
+                city_zip_map[zipcode] = city
+
+        logger.debug("Building matchers")
+        return cls(cities, counties, zipcodes, city_county_map, city_zip_map, PhraseMatcher(cities),
+                   PhraseMatcher(counties), county_states, qualified_city_county_map)
+
+
+def write_place_index(index, filename, digest):
+    """Writes index to filename atomically, stamped with the digest of the place file it was built from."""
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(_header.pack(place_index_magic, place_index_version, digest))
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    replace(tmp_filename, filename)
+    logger.debug("Wrote place index %s", filename)
+
+
+def read_place_index(filename, digest=None):
+    """Reads a place index in a single read.
+
+    Raises PlaceIndexError when the file is not a current version index, or was built from a place file other than
+    the one with the given digest.
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+
+    if len(data) < _header.size:
+        raise PlaceIndexError("Truncated place index: {0}".format(filename))
+
+    magic, version, index_digest = _header.unpack_from(data)
+    if magic != place_index_magic or version != place_index_version:
+        raise PlaceIndexError("Not a version {0} place index: {1}".format(place_index_version, filename))
+
+    if digest is not None and digest != index_digest:
+        raise PlaceIndexError("Place index {0} was built from a different place file".format(filename))
+
+    return pickle.loads(data[_header.size:])
+
+
+def build_place_index(ansi_code_file, filename):
+    digest = source_hash(ansi_code_file)
+    index = PlaceIndex.from_ansi_file(ansi_code_file)
+    write_place_index(index, filename, digest)
+    return index
+
+
+def load_place_index(ansi_code_file, filename):
+    """Loads the place index in filename, rebuilding it when it is missing, outdated or stale for ansi_code_file."""
+    digest = source_hash(ansi_code_file)
+    try:
+        return read_place_index(filename, digest)
+    except FileNotFoundError:
+        logger.info("No place index at %s, building it", filename)
+    except (PlaceIndexError, pickle.UnpicklingError, EOFError) as e:
+        logger.info("Rebuilding place index: %s", e)
+
+    index = PlaceIndex.from_ansi_file(ansi_code_file)
+    try:
+        write_place_index(index, filename, digest)
+    except OSError:
+        logger.exception("Could not write place index %s", filename)
+
+    return index
@@ -0,0 +1,157 @@
+from logging import getLogger
+from threading import Condition, RLock
+from time import monotonic
+
+from wxmonitor.metrics import registry
+from wxmonitor.reporting import ReportOutput
+from wxmonitor.utils import ExcThread
+
+logger = getLogger(__name__)
+
+_publish_events = registry.counter("wxmonitor_publish_events_total", "Report publishing outcomes", ("event",))
+_publish_seconds = registry.histogram("wxmonitor_publish_seconds", "Report publishing latency", ("stage",))
+
+
+class PublisherMetrics(object):
+    """Thread-safe counters and latencies for ReportPublisher."""
+    counter_names = ("published", "failed", "abandoned", "coalesced", "superseded")
+
+    def __init__(self):
+        self._lock = RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = dict.fromkeys(self.counter_names, 0)
+            self._latencies = {}
+
+    def increment(self, name):
+        _publish_events.inc(labels=(name,))
+        with self._lock:
+            self._counters[name] += 1
+
+    def record_latency(self, name, seconds):
+        _publish_seconds.observe(seconds, (name,))
+        with self._lock:
+            stats = self._latencies.get(name)
+            if stats is None:
+                stats = self._latencies[name] = [0, 0.0, 0.0]
+
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self._counters)
+            snapshot["latency"] = {name: {"count": count, "mean": total / count, "max": maximum}
+                                   for name, (count, total, maximum) in self._latencies.items()}
+            return snapshot
+
+
+class PublisherThread(ExcThread):
+    def __init__(self, publisher, drain):
+        self._publisher = publisher
+        self.drain = drain
+        super(PublisherThread, self).__init__(loop_sleep_timeout=0)
+
+    def _do_work(self):
+        self._publisher.publish_pending(timeout=0.25)
+
+    def _do_stop(self):
+        if self.drain:
+            self._publisher.publish_pending(timeout=0)
+
+
+class ReportPublisher(ReportOutput):
+    """Passes reports to output from a background thread, retrying failures with exponential backoff.
+
+    create_output() only queues the report and returns, so a slow or failing upload does not hold up processing.
+    Only the newest report is kept: one queued while another is waiting to be sent replaces it, and one arriving while
+    a failed report is backing off is sent instead of retrying the old one. A report is given up after max_attempts.
+    """
+    def __init__(self, output, max_attempts=5, backoff=1.0, max_backoff=300.0, timer=monotonic):
+        self._output = output
+        self._max_attempts = max_attempts
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._timer = timer
+
+        # (queued at, report data) of the report waiting to be sent.
+        self._pending = None
+        self._stopping = False
+        self._condition = Condition()
+        self._thread = None
+        self.metrics = PublisherMetrics()
+
+    def start(self):
+        self._stopping = False
+        self._thread = PublisherThread(self, drain=True)
+        self._thread.start()
+
+    def stop(self, drain=True):
+        """Stops the publisher. With drain a pending report gets one last attempt; retries are not waited out."""
+        self._thread.drain = drain
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+
+        self._thread.stop()
+        self._thread.join()
+
+    def create_output(self, **data):
+        with self._condition:
+            if self._pending is not None:
+                self.metrics.increment("coalesced")
+
+            self._pending = (self._timer(), data)
+            self._condition.notify_all()
+
+    def publish_pending(self, timeout=None):
+        with self._condition:
+            if self._pending is None and timeout != 0:
+                self._condition.wait(timeout)
+
+            pending, self._pending = self._pending, None
+
+        if pending is not None:
+            self._publish(*pending)
+
+    def _publish(self, queued_at, data):
+        delay = self._backoff
+
+        for attempt in range(1, self._max_attempts + 1):
+            start = self._timer()
+            try:
+                self._output.create_output(**data)
+            except Exception:
+                logger.warning("Publishing report failed, attempt %d of %d", attempt, self._max_attempts,
+                               exc_info=True)
+                self.metrics.increment("failed")
+            else:
+                now = self._timer()
+                self.metrics.increment("published")
+                self.metrics.record_latency("upload", now - start)
+                self.metrics.record_latency("report", now - queued_at)
+                return
+
+            if attempt == self._max_attempts:
+                break
+
+            with self._condition:
+                if self._pending is None and not self._stopping:
+                    self._condition.wait(delay)
+
+                if self._pending is not None:
+                    logger.info("Dropping failed report for a newer one")
+                    self.metrics.increment("superseded")
+                    return
+
+                if self._stopping:
+                    break
+
+            delay = min(delay * 2, self._max_backoff)
+
+        logger.error("Giving up on report after %d attempts", attempt)
+        self.metrics.increment("abandoned")
@@ -0,0 +1,138 @@
+from configparser import RawConfigParser
+from io import BytesIO
+from logging import getLogger
+from multiprocessing import Pool
+
+from wxmonitor.graphing import RasterMapRenderer
+
+logger = getLogger(__name__)
+
+map_arg_names = ("lat_0", "lon_0", "lower_left_lon", "lower_left_lat", "upper_right_lon", "upper_right_lat")
+
+
+class Region(object):
+    """An area reported on separately: the states it covers, its place file and its map bounds."""
+    def __init__(self, name, places, states, map_args, place_index=None, resolution="h"):
+        self.name = name
+        self.places = places
+        self.states = states
+        self.map_args = map_args
+        self.place_index = place_index
+        self.resolution = resolution
+
+    def __repr__(self):
+        return "Region(name={0!r}, states={1!r}, places={2!r})".format(self.name, self.states, self.places)
+
+
+def read_regions(config_file):
+    """Reads regions from a config file with one section per region, e.g.
+
+        [Tennessee]
+        states = tn
+        places = places/tn_places.txt
+        place_index = places/tn_places.idx
+        lat_0 = 39.1622
+        lon_0 = -86.5292
+        lower_left_lon = -90.60
+        lower_left_lat = 34.80
+        upper_right_lon = -81.31
+        upper_right_lat = 36.71
+
+    place_index and resolution are optional. states is a comma separated list of state codes.
+    """
+    config = RawConfigParser()
+    if not config.read(config_file):
+        raise ValueError("Could not read region config: {0}".format(config_file))
+
+    regions = []
+    for section in config.sections():
+        map_args = {name: config.getfloat(section, name) for name in map_arg_names}
+        states = [state.strip().lower() for state in config.get(section, "states").split(",") if state.strip()]
+        regions.append(Region(section, config.get(section, "places"), states, map_args,
+                              place_index=config.get(section, "place_index", fallback=None),
+                              resolution=config.get(section, "resolution", fallback="h")))
+
+    if not regions:
+        raise ValueError("No regions in {0}".format(config_file))
+
+    return regions
+
+
+_worker_renderers = {}
+_worker_renderer_args = None
+_worker_renderer_type = None
+
+
+def _init_render_worker(renderer_type, renderer_args):
+    global _worker_renderer_type, _worker_renderer_args
+    _worker_renderer_type = renderer_type
+    _worker_renderer_args = renderer_args
+
+
+def _render_region(name, seen_counties, minimum, maximum, state, layer):
+    renderer = _worker_renderers.get(name)
+    if renderer is None:
+        renderer = _worker_renderers[name] = _worker_renderer_type(**_worker_renderer_args[name])
+
+    image = renderer.render(seen_counties, minimum, maximum, state=state, layer=layer)
+    if isinstance(image, bytes):
+        return image
+
+    output = BytesIO()
+    image.savefig(output, format="png")
+    return output.getvalue()
+
+
+class RegionRenderPool(object):
+    """Renders region maps in worker processes, so regions render in parallel and off the reporting thread.
+
+    renderer_args maps region names to the arguments of renderer_type. Each region is pinned to one single process
+    pool, so its renderer, with its cached background and color scale window, is built once and kept in that process.
+    Renders come back as PNG bytes.
+    """
+    def __init__(self, renderer_args, renderer_type=RasterMapRenderer, workers=1):
+        self._renderer_args = renderer_args
+        self._renderer_type = renderer_type
+        self._workers = max(1, min(workers, len(renderer_args)))
+
+        self._assignments = {name: i % self._workers for i, name in enumerate(sorted(renderer_args))}
+        self._pools = None
+
+    def _pool(self, name):
+        if self._pools is None:
+            logger.debug("Starting %d render workers", self._workers)
+            self._pools = []
+            for worker in range(self._workers):
+                args = {name: self._renderer_args[name] for name, assigned in self._assignments.items()
+                        if assigned == worker}
+                self._pools.append(Pool(1, initializer=_init_render_worker, initargs=(self._renderer_type, args)))
+
+        return self._pools[self._assignments[name]]
+
+    def render_async(self, name, seen_counties, minimum, maximum, state=None, layer=None):
+        return self._pool(name).apply_async(_render_region, (name, seen_counties, minimum, maximum, state, layer))
+
+    def render(self, name, seen_counties, minimum, maximum, state=None, layer=None):
+        return self.render_async(name, seen_counties, minimum, maximum, state, layer).get()
+
+    def renderer(self, name):
+        return PooledMapRenderer(self, name)
+
+    def close(self):
+        if self._pools is None:
+            return
+
+        for pool in self._pools:
+            pool.terminate()
+            pool.join()
+        self._pools = None
+
+
+class PooledMapRenderer(object):
+    """Map renderer for one region of a RegionRenderPool, usable as a ProcessingImpl map_renderer."""
+    def __init__(self, render_pool, name):
+        self._render_pool = render_pool
+        self._name = name
+
+    def render(self, seen_counties, minimum, maximum, state=None, layer=None):
+        return self._render_pool.render(self._name, seen_counties, minimum, maximum, state, layer)
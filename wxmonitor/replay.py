@@ -0,0 +1,128 @@
+import json
+from ast import literal_eval
+from csv import reader
+from itertools import count
+from logging import getLogger
+from time import perf_counter, sleep
+
+from wxmonitor.status_log import log_header, open_log
+
+logger = getLogger(__name__)
+
+
+class ReplayUser(object):
+    def __init__(self, screen_name, location=None):
+        self.screen_name = screen_name
+        self.location = location
+
+
+class ReplayStatus(object):
+    """Stand-in for a tweepy Status rebuilt from a status log, with the attributes the listener actions use."""
+    def __init__(self, id, timestamp, screen_name, location, coordinates, text, lang=None, retweeted_status=None):
+        self.id = id
+        self.timestamp = timestamp
+        self.user = ReplayUser(screen_name, location)
+        self.coordinates = coordinates
+        self.text = text
+        self.lang = lang
+        self.retweeted_status = retweeted_status
+
+    def __repr__(self):
+        return "ReplayStatus(id={0!r}, timestamp={1!r}, text={2!r})".format(self.id, self.timestamp, self.text)
+
+
+def _parse_coordinates(value):
+    if not value or value == "None":
+        return None
+    return literal_eval(value)
+
+
+def read_csv_log(filename):
+    """Yields ReplayStatus from a status csv log, skipping the header if there is one.
+
+    Rotated segments compressed by RotatingStatusLogWriter are read directly.
+    """
+    ids = count(1)
+    with open_log(filename) as f:
+        for row in reader(f):
+            if not row or row == log_header:
+                continue
+
+            timestamp, screen_name, location, coordinates, text = row
+            yield ReplayStatus(next(ids), float(timestamp), screen_name, location, _parse_coordinates(coordinates),
+                               text)
+
+
+def _raw_status(data, id, timestamp):
+    text = data.get("extended_tweet", {}).get("full_text", data["text"])
+    retweeted = data.get("retweeted_status")
+    if retweeted is not None:
+        retweeted = _raw_status(retweeted, retweeted["id"], timestamp)
+
+    return ReplayStatus(id, timestamp, data["user"]["screen_name"], data["user"].get("location"),
+                        data.get("coordinates"), text, data.get("lang"), retweeted)
+
+
+def read_jsonl_log(filename):
+    """Yields ReplayStatus from a file of one JSON object per line.
+
+    Lines are either raw Twitter status JSON or objects with the csv log fields.
+    """
+    ids = count(1)
+    with open_log(filename) as f:
+        for line in f:
+            if not line.strip():
+                continue
+
+            data = json.loads(line)
+            if "user" in data:
+                yield _raw_status(data, data.get("id", next(ids)), int(data["timestamp_ms"]) / 1000.0)
+            else:
+                yield ReplayStatus(data.get("id", next(ids)), float(data["time"]), data["screen_name"],
+                                   data.get("location"), data.get("coordinates"), data["text"])
+
+
+def read_log(filename):
+    if ".jsonl" in filename or filename.endswith(".json"):
+        return read_jsonl_log(filename)
+    return read_csv_log(filename)
+
+
+class StatusReplayer(object):
+    """Feeds logged statuses to a stream listener as the live stream would.
+
+    speed scales the gaps between the logged timestamps: 1.0 is real time, 10.0 ten times faster and None replays as
+    fast as possible. clock() returns the log time of the status being replayed and can be passed as the timer of the
+    caches so ttl expiry follows the log rather than the wall clock.
+    """
+    def __init__(self, speed=1.0, sleeper=sleep):
+        self._speed = speed
+        self._sleeper = sleeper
+        self._log_time = 0.0
+
+    def clock(self):
+        return self._log_time
+
+    def replay(self, statuses, listener):
+        """Replays statuses into listener.on_status, returning (count, elapsed seconds)."""
+        replayed = 0
+        first_log_time = None
+        start = perf_counter()
+
+        for status in statuses:
+            if first_log_time is None:
+                first_log_time = status.timestamp
+
+            if self._speed:
+                delay = (status.timestamp - first_log_time) / self._speed - (perf_counter() - start)
+                if delay > 0:
+                    self._sleeper(delay)
+
+            self._log_time = status.timestamp
+            listener.on_status(status)
+            replayed += 1
+
+        elapsed = perf_counter() - start
+        logger.debug("Replayed %d statuses in %.3fs", replayed, elapsed)
+
+        return replayed, elapsed
@@ -1,29 +1,76 @@
 from io import BytesIO
 from logging import getLogger
+from multiprocessing.pool import ThreadPool
+from os.path import splitext
 import matplotlib as mpl
 mpl.use('Agg')
 from matplotlib import pyplot as plt
-from matplotlib.patches import Polygon
-from tempfile import NamedTemporaryFile
 from datetime import datetime, timedelta
+from threading import Event, RLock
+from time import monotonic, perf_counter
 
-from wxmonitor.graphing import make_basemap, make_county_hash, get_rgb
+from wxmonitor.aggregation import get_layer_counts
+from wxmonitor.graphing import CountyMapRenderer
+from wxmonitor.metrics import registry
 from wxmonitor.utils import ExcThread, get_seen_counties, get_min_max_county_count, get_uncategorized
 
 logger = getLogger(__name__)
 
+_reports = registry.counter("wxmonitor_reports_total", "Reports made or skipped as unchanged", ("outcome",))
+_report_stage_seconds = registry.histogram("wxmonitor_report_stage_seconds", "Time spent in each stage of a report",
+                                           ("stage",))
+
+# TODO: make this configurable... TN for now.
+default_map_args = dict(lat_0=39.1622, lon_0=-86.5292,
+                        lower_left_lon=-90.60, lower_left_lat=34.80,
+                        upper_right_lon=-81.31, upper_right_lat=36.71)
+
 
 class ProcessingWorkerThread(ExcThread):
-    def __init__(self, processor_impl):
+    """Runs the processor every loop_sleep_timeout seconds.
+
+    Given a wakeup event, set by ReportTriggers, it also runs when the event is set, and sleeps only until the
+    processor's next report deadline when that is sooner. A wakeup is debounced by debounce seconds so a burst of
+    statuses is reported together, and runs are at least min_interval seconds apart.
+    """
+    def __init__(self, processor_impl, wakeup=None, loop_sleep_timeout=120, debounce=5, min_interval=30):
         logger.debug("Start data processing worker.")
         self._impl = processor_impl
-        super(ProcessingWorkerThread, self).__init__(loop_sleep_timeout=120)
+        self._wakeup = wakeup
+        self._debounce = debounce
+        self._min_interval = min_interval
+        self._last_run = None
+        super(ProcessingWorkerThread, self).__init__(loop_sleep_timeout=loop_sleep_timeout)
+
+    def stop(self):
+        super(ProcessingWorkerThread, self).stop()
+        if self._wakeup is not None:
+            self._wakeup.set()
 
     def _do_work(self):
         logger.debug("Processing...")
+        self._last_run = monotonic()
         self._impl.process()
         logger.debug("Processing Complete")
 
+    def _do_wait(self):
+        if self._wakeup is None:
+            super(ProcessingWorkerThread, self)._do_wait()
+            return
+
+        timeout = self._loop_sleep_timeout
+        until_report = self._impl.seconds_until_report()
+        if 0 < until_report < timeout:
+            timeout = until_report
+
+        if not self._wakeup.wait(timeout) or self._stop_event.is_set():
+            return
+
+        self._wakeup.clear()
+        delay = max(self._debounce, self._min_interval - (monotonic() - self._last_run))
+        logger.debug("Woken for a report, processing in %.1fs", delay)
+        self._stop_event.wait(delay)
+
     def _do_start(self):
         logger.debug("Starting reporter worker.")
 
@@ -31,19 +78,102 @@ class ProcessingWorkerThread(ExcThread):
         logger.debug("Stopping reporter worker.")
 
 
+class ReportTrigger(object):
+    """Cache observer asking for a report before the report threshold when the counts change meaningfully.
+
+    It triggers on the first status after an empty report, on a county missing from the last report, and once a
+    county has gained county_delta statuses since the last report. Triggering sets wakeup, an Event shared with the
+    ProcessingWorkerThread; the ProcessingImpl given this trigger then reports on its next run.
+    """
+    def __init__(self, wakeup=None, county_delta=5):
+        self.wakeup = Event() if wakeup is None else wakeup
+        self._county_delta = county_delta
+
+        self._triggered = False
+        self._empty = True
+        self._reported_counties = frozenset()
+        self._added = {}
+        self._lock = RLock()
+
+    def add(self, processed_status, timestamp=None):
+        if self._triggered:
+            return
+
+        with self._lock:
+            if self._empty:
+                self._trigger("first status")
+                return
+
+            for county in processed_status.counties:
+                if county not in self._reported_counties:
+                    self._trigger("new county")
+                    return
+
+                added = self._added[county] = self._added.get(county, 0) + 1
+                if added >= self._county_delta:
+                    self._trigger("county count delta")
+                    return
+
+    def expire(self):
+        pass
+
+    def _trigger(self, reason):
+        logger.debug("Report triggered: %s", reason)
+        self._triggered = True
+        self.wakeup.set()
+
+    def consume(self):
+        """Returns whether a report was triggered, clearing the trigger."""
+        with self._lock:
+            triggered, self._triggered = self._triggered, False
+            return triggered
+
+    def reported(self, seen_counties, status_count):
+        """Records the counts of a report as the baseline for the next trigger."""
+        with self._lock:
+            self._empty = status_count == 0
+            self._reported_counties = frozenset(seen_counties)
+            self._added = {}
+
+
 class ProcessingImpl(object):
-    def __init__(self, reporter, cacher, tracking_tag, seconds_between_reports=600, image_format="png"):
+    def __init__(self, reporter, cacher, tracking_tag, seconds_between_reports=600, image_format="png",
+                 aggregator=None, map_renderer=None, state="tn", region_name=None, skip_unchanged=True,
+                 trigger=None, event_layers=None):
         logger.debug("Creating Processing Impl.")
         self._reporter = reporter
         self._cacher = cacher
+        # When given, aggregator must observe cacher; counts are then read from it instead of walking the cache.
+        self._aggregator = aggregator
         self._tracking_tag = tracking_tag
         self._prev_cacher_len = 0
         self._seconds_between_reports = seconds_between_reports
         self._image_format = image_format
+        # state is the state of unqualified county keys. region_name heads the summary when there are several regions.
+        self._state = state
+        self._region_name = region_name
+        # With skip_unchanged nothing is rendered or posted while the county counts and uncategorized total are the
+        # same as in the last report.
+        self._skip_unchanged = skip_unchanged
+        self._last_fingerprint = None
+        self._last_image = None
+        # A ReportTrigger observing cacher; when it has triggered the next process() reports regardless of the
+        # report threshold.
+        self._trigger = trigger
+        # With EventLayers, the ones the aggregator was given if any, each report also maps every non-empty event
+        # layer and passes the images to the reporter as layers.
+        self._event_layers = event_layers
+
+        if map_renderer is None:
+            map_renderer = CountyMapRenderer(**default_map_args)
+        self._map_renderer = map_renderer
 
         self._next_report_time_threshold = None
         self._set_next_report_time_threshold()
 
+    def seconds_until_report(self):
+        return (self._next_report_time_threshold - datetime.now()).total_seconds()
+
     def _report_time_threshold_exceeded(self):
         return datetime.now() >= self._next_report_time_threshold
 
@@ -52,10 +182,15 @@ class ProcessingImpl(object):
         logger.debug("Next report time: %s", self._next_report_time_threshold)
 
     def process(self):
-        statuses = self._cacher.get_statuses()
-
-        current_len = len(statuses)
+        statuses = None
+        if self._aggregator is not None:
+            self._cacher.expire()
+            current_len = len(self._aggregator)
+        else:
+            statuses = self._cacher.get_statuses()
+            current_len = len(statuses)
 
+        triggered = self._trigger is not None and self._trigger.consume()
 
         logger.debug("(self._prev_cacher_len == 0 and current_len > 0) => %s",
                      (self._prev_cacher_len == 0 and current_len > 0))
@@ -68,47 +203,141 @@ class ProcessingImpl(object):
 
         if not ((self._prev_cacher_len == 0 and current_len > 0) or
                     (self._prev_cacher_len > 0 and current_len == 0) or
-                    (current_len != 0 and self._report_time_threshold_exceeded())):
+                    (current_len != 0 and (triggered or self._report_time_threshold_exceeded()))):
             return
 
         self._prev_cacher_len = current_len
 
         logger.debug("Cache len changed from/to Zero or the report threshold has been exceeded.")
 
-        seen_counties = get_seen_counties(statuses)
-        minimum, maximum = get_min_max_county_count(seen_counties)
-        uncategorized = get_uncategorized(statuses)
+        layer_counts = {}
+        if self._aggregator is not None:
+            seen_counties, minimum, maximum, uncategorized_count = self._aggregator.snapshot()
+            if self._event_layers is not None:
+                layer_counts = self._aggregator.layer_snapshot()
+        else:
+            seen_counties = get_seen_counties(statuses)
+            minimum, maximum = get_min_max_county_count(seen_counties)
+            uncategorized_count = len(get_uncategorized(statuses))
+            if self._event_layers is not None:
+                layer_counts = get_layer_counts(statuses, self._event_layers)
 
         logger.debug("Seen counties: %s", repr(seen_counties))
 
-        logger.debug("Uncategorized Statuses: %d", len(uncategorized))
+        logger.debug("Uncategorized Statuses: %d", uncategorized_count)
 
         #print("There are {0} uncategorized tweets.".format(len(uncategorized)), uncategorized)
 
-        self.render_map(maximum, minimum, seen_counties)
+        if self._trigger is not None:
+            self._trigger.reported(seen_counties, current_len)
+
+        fingerprint = (frozenset(seen_counties.items()), uncategorized_count,
+                       frozenset((layer, frozenset(counts.items())) for layer, counts in layer_counts.items()))
+        if self._skip_unchanged and fingerprint == self._last_fingerprint:
+            logger.debug("Counts unchanged since the last report, skipping it.")
+            _reports.inc(labels=("unchanged",))
+            self._set_next_report_time_threshold()
+            return
+
+        start = perf_counter()
+        rendered = self.render_map(maximum, minimum, seen_counties)
+        rendered_at = perf_counter()
+        image = self._last_image = self._encode_image(rendered)
+        _report_stage_seconds.observe(rendered_at - start, ("render",))
+        _report_stage_seconds.observe(perf_counter() - rendered_at, ("encode",))
+
+        data = {}
+        if layer_counts:
+            start = perf_counter()
+            data["layers"] = self.render_layers(layer_counts)
+            _report_stage_seconds.observe(perf_counter() - start, ("layers",))
 
         summary = "Data over 1hr\nTotal Statuses: {0}\nTotal Uncategorized: {1}\n{2}".format(current_len,
-                                                                                             len(uncategorized),
+                                                                                             uncategorized_count,
                                                                                              self._tracking_tag)
+        if self._region_name is not None:
+            summary = "{0}\n{1}".format(self._region_name, summary)
 
-        self._reporter.create_output(summary=summary)
+        start = perf_counter()
+        self._reporter.create_output(summary=summary, image=image, **data)
+        _report_stage_seconds.observe(perf_counter() - start, ("output",))
+        # Only now, so counts whose report failed to render or send are retried on the next run.
+        self._last_fingerprint = fingerprint
+        _reports.inc(labels=("reported",))
 
         self._set_next_report_time_threshold()
 
-    def render_map(self, maximum, minimum, seen_counties):
-        plt.figure(figsize=(12, 6))
-        # TODO: make this configurable... TN for now.
-        state_map = make_basemap(lat_0=39.1622, lon_0=-86.5292,
-                                 lower_left_lon=-90.60, lower_left_lat=34.80,
-                                 upper_right_lon=-81.31, upper_right_lat=36.71)
-        ax = plt.gca()
-        for county, count in seen_counties.items():
-            seg = state_map.county_poly_map[make_county_hash("tn", county)]
-            poly = Polygon(seg, facecolor=get_rgb(count, minimum, maximum), edgecolor=(0.9, 0.9, 0.9))
-            ax.add_patch(poly)
+    @property
+    def last_image(self):
+        """The encoded image of the last report, or None before the first one."""
+        return self._last_image
+
+    def _encode_image(self, image):
+        # Encode figures once here so every output reuses the same bytes instead of saving the figure again.
+        if isinstance(image, bytes):
+            return image
+
+        output = BytesIO()
+        image.savefig(output, format=self._image_format)
+        return output.getvalue()
+
+    def render_map(self, maximum, minimum, seen_counties, layer=None):
+        """Returns the encoded image for renderers that produce one, e.g. RasterMapRenderer, else the figure."""
+        return self._map_renderer.render(seen_counties, minimum, maximum, state=self._state, layer=layer)
+
+    def render_layers(self, layer_counts):
+        """Returns {layer: encoded image} for {layer: {county: count}}, each layer colored on its own range."""
+        images = {}
+        for layer, seen_counties in layer_counts.items():
+            minimum, maximum = get_min_max_county_count(seen_counties)
+            images[layer] = self._encode_image(self.render_map(maximum, minimum, seen_counties, layer=layer))
+        return images
+
+
+class ProcessingImplGroup(object):
+    """Runs process() of several ProcessingImpls, one per region.
+
+    With threads > 1 regions are processed concurrently, which lets regions rendering through a RegionRenderPool
+    render in parallel. Keep threads at 1 for renderers drawing with pyplot in this process.
+    """
+    def __init__(self, processor_impls, threads=1):
+        self._impls = processor_impls
+        self._threads = threads
+        self._pool = None
+
+    def seconds_until_report(self):
+        # Regions already past their threshold wait for statuses rather than the clock.
+        return min((seconds for seconds in (impl.seconds_until_report() for impl in self._impls) if seconds > 0),
+                   default=0)
+
+    def process(self):
+        if self._threads <= 1:
+            for impl in self._impls:
+                self._process(impl)
+            return
+
+        if self._pool is None:
+            self._pool = ThreadPool(self._threads)
+        self._pool.map(self._process, self._impls)
+
+    def _process(self, impl):
+        try:
+            impl.process()
+        except Exception:
+            logger.exception("Processing failed for region %s", impl._region_name)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
 
 
 class ReportOutput(object):
+    """Outputs a report. data holds the summary and, when the map was rendered straight to PNG, image bytes.
+
+    Without image the map is on the current matplotlib figure. With event layers data also holds layers, the encoded
+    map of each non-empty layer by name.
+    """
     def create_output(self, **data):
         return None
 
@@ -116,6 +345,12 @@ class ReportOutput(object):
 class DisplayReportOutput(ReportOutput):
     def create_output(self, **data):
         print("Summary:" + data.get("summary", "")[0:140])
+
+        if data.get("image") is not None:
+            plt.figure()
+            plt.imshow(plt.imread(BytesIO(data["image"])))
+            plt.axis("off")
+
         plt.show()
         return None
 
@@ -127,7 +362,18 @@ class FileReportOutput(ReportOutput):
         self._reset_seek = reset_seek
 
     def create_output(self, **data):
-        plt.savefig(self._filename, format=self._format)
+        if data.get("image") is not None:
+            with open(self._filename, "wb") as f:
+                f.write(data["image"])
+        else:
+            plt.savefig(self._filename, format=self._format)
+
+        # Layer maps go next to the report map, e.g. report_hail.png.
+        root, extension = splitext(self._filename)
+        for layer, image in data.get("layers", {}).items():
+            with open("{0}_{1}{2}".format(root, layer.replace(" ", "_"), extension), "wb") as f:
+                f.write(image)
+
         return self._filename
 
 
@@ -137,6 +383,9 @@ class BytesReportOutput(ReportOutput):
         self._reset_seek = reset_seek
 
     def create_output(self, **data):
+        if data.get("image") is not None:
+            return BytesIO(data["image"])
+
         results = BytesIO()
         plt.savefig(results, format=self._format)
 
@@ -147,22 +396,31 @@ class BytesReportOutput(ReportOutput):
 
 
 class TweetReportOutput(BytesReportOutput):
-    def __init__(self, tweet_api):
+    """Tweets the summary with the report map, followed by up to max_layers event layer maps when there are any."""
+    def __init__(self, tweet_api, max_layers=3):
         logger.debug("Creating tweet report generator")
         self._api = tweet_api
+        self._max_layers = max_layers
 
         super(TweetReportOutput, self).__init__(format="png")
 
     def create_output(self, **data):
         output = super(TweetReportOutput, self).create_output(**data)
-
-        with NamedTemporaryFile(suffix=".png") as f:
-            f.write(output.read())
-            logger.debug("Named Temp File: %s", f.name)
-            self._api.update_with_media(f.name, data.get("summary", "")[0:140])
+        status = data.get("summary", "")[0:140]
+        layers = list(data.get("layers", {}).items())[:self._max_layers]
+
+        # Uploaded straight from memory; the file name only tells tweepy the image type. tweepy closes the file it
+        # uploads, so it gets its own copy and output stays readable for the caller.
+        filename = "report.{0}".format(self._format)
+        image = output.getvalue()
+        if not layers:
+            self._api.update_with_media(filename, status=status, file=BytesIO(image))
+        else:
+            # A tweet holds up to 4 images, so several are uploaded first and attached by media id.
+            media_ids = [self._api.media_upload(filename, file=BytesIO(image)).media_id]
+            for layer, image in layers:
+                media_ids.append(self._api.media_upload("{0}.png".format(layer.replace(" ", "_")),
+                                                        file=BytesIO(image)).media_id)
+            self._api.update_status(status=status, media_ids=media_ids)
 
         return output
-
-
-
-
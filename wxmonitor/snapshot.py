@@ -0,0 +1,180 @@
+from array import array
+from logging import getLogger
+from os import replace
+from struct import Struct
+from sys import byteorder, intern
+from time import time
+
+from wxmonitor.stream_listeners import ProcessedStatus
+from wxmonitor.utils import ExcThread
+
+logger = getLogger(__name__)
+
+snapshot_magic = b"WXSNAP"
+snapshot_version = 1
+
+# magic, version, status count, name count
+_header = Struct("<6sHII")
+_name_length = Struct("<H")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _write_array(f, typecode, values):
+    column = array(typecode, values)
+    if byteorder != "little":
+        column.byteswap()
+    f.write(column.tobytes())
+
+
+def _read_array(f, typecode, length):
+    column = array(typecode)
+    data = f.read(column.itemsize * length)
+    if len(data) != column.itemsize * length:
+        raise SnapshotError("Truncated snapshot")
+
+    column.frombytes(data)
+    if byteorder != "little":
+        column.byteswap()
+    return column
+
+
+def write_snapshot(filename, statuses):
+    """Writes ProcessedStatus records to filename, replacing it atomically.
+
+    The file holds a table of the distinct place and event names followed by one column per field, with the names
+    stored as indexes into the table, so a snapshot costs a few bytes per status.
+    """
+    names = {}
+    columns = {"cities": [], "counties": [], "events": []}
+    counts = {"cities": [], "counties": [], "events": []}
+
+    for status in statuses:
+        for field, column in columns.items():
+            values = getattr(status, field)
+            counts[field].append(len(values))
+            column.extend(names.setdefault(value, len(names)) for value in values)
+
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(_header.pack(snapshot_magic, snapshot_version, len(statuses), len(names)))
+
+        for name in names:
+            encoded = name.encode("utf-8")
+            f.write(_name_length.pack(len(encoded)))
+            f.write(encoded)
+
+        _write_array(f, "d", (status.timestamp for status in statuses))
+        _write_array(f, "Q", (status.status_id for status in statuses))
+        _write_array(f, "B", (status.spotter for status in statuses))
+        for field in ("cities", "counties", "events"):
+            _write_array(f, "H", counts[field])
+        for field in ("cities", "counties", "events"):
+            _write_array(f, "I", columns[field])
+
+    replace(tmp_filename, filename)
+    logger.debug("Wrote snapshot of %d statuses to %s", len(statuses), filename)
+
+
+def read_snapshot(filename):
+    """Reads the ProcessedStatus records of a snapshot written by write_snapshot, oldest first."""
+    with open(filename, "rb") as f:
+        header = f.read(_header.size)
+        if len(header) != _header.size:
+            raise SnapshotError("Truncated snapshot")
+
+        magic, version, status_count, name_count = _header.unpack(header)
+        if magic != snapshot_magic or version != snapshot_version:
+            raise SnapshotError("Not a version {0} snapshot: {1}".format(snapshot_version, filename))
+
+        names = []
+        for _ in range(name_count):
+            data = f.read(_name_length.size)
+            if len(data) != _name_length.size:
+                raise SnapshotError("Truncated snapshot")
+
+            length, = _name_length.unpack(data)
+            names.append(intern(f.read(length).decode("utf-8")))
+
+        timestamps = _read_array(f, "d", status_count)
+        status_ids = _read_array(f, "Q", status_count)
+        spotters = _read_array(f, "B", status_count)
+        counts = [_read_array(f, "H", status_count) for _ in range(3)]
+        columns = [iter(_read_array(f, "I", sum(field_counts))) for field_counts in counts]
+
+    statuses = []
+    for index in range(status_count):
+        cities, counties, events = (tuple(names[next(column)] for _ in range(field_counts[index]))
+                                    for column, field_counts in zip(columns, counts))
+        statuses.append(ProcessedStatus(timestamps[index], status_ids[index], cities, counties, events,
+                                        bool(spotters[index])))
+
+    statuses.sort(key=lambda status: status.timestamp)
+    return statuses
+
+
+def restore_snapshot(filename, cacher, ttl=3600, now=None):
+    """Adds the unexpired statuses of a snapshot to cacher at their original timestamps.
+
+    cacher must accept a timestamp in add(), like BucketCache. Returns the number of statuses restored.
+    """
+    now = time() if now is None else now
+    restored = 0
+
+    for status in read_snapshot(filename):
+        if status.timestamp + ttl < now:
+            continue
+
+        cacher.add(status, timestamp=status.timestamp)
+        restored += 1
+
+    logger.info("Restored %d statuses from %s", restored, filename)
+    return restored
+
+
+class SnapshotWorkerThread(ExcThread):
+    def __init__(self, snapshotter, interval):
+        self._snapshotter = snapshotter
+        super(SnapshotWorkerThread, self).__init__(loop_sleep_timeout=interval)
+
+    def _do_work(self):
+        self._snapshotter.save()
+
+    def _do_stop(self):
+        self._snapshotter.save()
+
+
+class CacheSnapshotter(object):
+    """Periodically snapshots the statuses of a cache to filename from a background thread.
+
+    The cache is only locked while its statuses are copied; encoding and writing happen outside the lock. stop()
+    writes a final snapshot.
+    """
+    def __init__(self, cacher, filename, interval=60):
+        self._cacher = cacher
+        self._filename = filename
+        self._interval = interval
+        self._thread = None
+
+    def restore(self, ttl=3600, now=None):
+        """Restores a previous snapshot into the cache, if there is a readable one."""
+        try:
+            return restore_snapshot(self._filename, self._cacher, ttl, now)
+        except FileNotFoundError:
+            logger.info("No snapshot at %s", self._filename)
+        except (OSError, SnapshotError):
+            logger.exception("Could not restore snapshot %s", self._filename)
+        return 0
+
+    def save(self):
+        write_snapshot(self._filename, self._cacher.get_statuses())
+
+    def start(self):
+        self._thread = SnapshotWorkerThread(self, self._interval)
+        self._thread.start()
+
+    def stop(self):
+        self._thread.stop()
+        self._thread.join()
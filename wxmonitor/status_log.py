@@ -0,0 +1,224 @@
+import bz2
+import gzip
+import lzma
+from csv import writer
+from datetime import datetime
+from logging import getLogger
+from os import remove, rename
+from os.path import exists
+from queue import Empty, Full, Queue
+from shutil import copyfileobj
+from threading import Thread
+from time import monotonic, time
+
+from wxmonitor.utils import ExcThread
+
+logger = getLogger(__name__)
+
+log_header = ["time", "screen_name", "location", "coordinates", "text"]
+
+_compressors = {
+    "gzip": (gzip.open, ".gz"),
+    "bz2": (bz2.open, ".bz2"),
+    "xz": (lzma.open, ".xz"),
+}
+
+
+def open_log(filename, mode="r"):
+    """Opens a status log as text, decompressing rotated segments based on their extension."""
+    for opener, extension in _compressors.values():
+        if filename.endswith(extension):
+            return opener(filename, mode + "t", newline="")
+    return open(filename, mode, newline="")
+
+
+def write_header_if_new(handler, header=log_header):
+    if handler.tell() == 0:
+        writer(handler).writerow(header)
+
+
+class StatusLogWriterThread(ExcThread):
+    def __init__(self, log_writer, retry_interval):
+        self._log_writer = log_writer
+        self._retry_interval = retry_interval
+        super(StatusLogWriterThread, self).__init__(loop_sleep_timeout=0)
+
+    def _do_work(self):
+        try:
+            self._log_writer.write_pending()
+        except Exception:
+            # The rows are kept and retried, in a reopened file, once the wait is over.
+            logger.exception("Could not write the status log, retrying in %.0fs", self._retry_interval)
+            self._stop_event.wait(self._retry_interval)
+
+    def _do_stop(self):
+        try:
+            self._log_writer.write_pending(drain=True)
+        except Exception:
+            logger.exception("Could not write the status log, losing %d rows", self._log_writer.unwritten)
+        self._log_writer.close()
+
+
+class RotatingStatusLogWriter(object):
+    """Writes status log rows as csv from a background thread.
+
+    Rows are queued by write() and written in batches of up to batch_size, flushing at least every flush_interval
+    seconds. The file is rotated once it reaches max_bytes or has been open rotate_interval seconds; the rotated
+    segment is renamed with a timestamp and compressed with compression ("gzip", "bz2", "xz" or None) on a separate
+    thread, so writing goes on meanwhile. Each new file starts with the header. stop() writes every queued row before
+    closing, so nothing is lost on a clean shutdown.
+
+    When writing fails (e.g. a full disk) the error is logged and the rows are retried every retry_interval seconds in
+    a reopened file. At most max_pending rows wait in the queue meanwhile; rows beyond that are dropped with a warning.
+    """
+    def __init__(self, filename, batch_size=100, flush_interval=1.0, max_bytes=None, rotate_interval=None,
+                 compression="gzip", header=log_header, timer=time, max_pending=100000, retry_interval=5.0):
+        if compression is not None and compression not in _compressors:
+            raise ValueError("Unknown compression: {0}".format(compression))
+
+        self._filename = filename
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_bytes = max_bytes
+        self._rotate_interval = rotate_interval
+        self._compression = compression
+        self._header = header
+        self._timer = timer
+        self._retry_interval = retry_interval
+
+        self._queue = Queue(maxsize=max_pending)
+        # Rows taken from the queue whose write failed, retried first.
+        self._unwritten = []
+        self.dropped = 0
+        self._handler = None
+        self._writer = None
+        self._opened_at = None
+        self._rows_in_file = 0
+        self._thread = None
+        self._compressions = []
+
+    @property
+    def unwritten(self):
+        return len(self._unwritten) + self._queue.qsize()
+
+    def start(self):
+        self._open()
+        self._thread = StatusLogWriterThread(self, self._retry_interval)
+        self._thread.start()
+
+    def stop(self):
+        self._thread.stop()
+        self._thread.join()
+
+        for compression in self._compressions:
+            compression.join()
+        self._compressions = []
+
+    def write(self, row):
+        try:
+            self._queue.put_nowait(row)
+        except Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning("Status log queue is full, %d rows dropped so far", self.dropped)
+
+    def _open(self):
+        self._handler = open(self._filename, "a", newline="")
+        self._writer = writer(self._handler)
+        self._opened_at = self._timer()
+        self._rows_in_file = 0
+        write_header_if_new(self._handler, self._header)
+
+    def close(self):
+        if self._handler is not None:
+            self._handler.close()
+            self._handler = None
+
+    def _close_quietly(self):
+        try:
+            self.close()
+        except OSError:
+            self._handler = None
+
+    def write_pending(self, drain=False):
+        """Writes a batch of queued rows, or all of them when draining, then flushes and checks rotation.
+
+        A batch ends at batch_size rows or flush_interval seconds after its first row.
+        """
+        rows = self._unwritten
+        self._unwritten = []
+        deadline = None
+        while drain or len(rows) < self._batch_size:
+            try:
+                if drain:
+                    row = self._queue.get_nowait()
+                else:
+                    timeout = self._flush_interval if deadline is None else deadline - monotonic()
+                    if timeout <= 0:
+                        break
+                    row = self._queue.get(timeout=timeout)
+            except Empty:
+                break
+
+            rows.append(row)
+            if deadline is None:
+                deadline = monotonic() + self._flush_interval
+
+        if rows:
+            try:
+                if self._handler is None:
+                    self._open()
+                self._writer.writerows(rows)
+                self._handler.flush()
+            except Exception:
+                # A failed write may leave the file in any state, so it is reopened before the rows are retried.
+                self._unwritten = rows
+                self._close_quietly()
+                raise
+            self._rows_in_file += len(rows)
+
+        if self._should_rotate():
+            self.rotate()
+
+    def _should_rotate(self):
+        if self._handler is None or not self._rows_in_file:
+            return False
+
+        if self._max_bytes is not None and self._handler.tell() >= self._max_bytes:
+            return True
+
+        return self._rotate_interval is not None and self._timer() - self._opened_at >= self._rotate_interval
+
+    def rotate(self):
+        self.close()
+
+        segment = self._segment_name()
+        rename(self._filename, segment)
+        logger.debug("Rotated status log to %s", segment)
+        self._open()
+
+        if self._compression is not None:
+            compression = Thread(target=self._compress, args=(segment,), daemon=True)
+            compression.start()
+            self._compressions = [thread for thread in self._compressions if thread.is_alive()] + [compression]
+
+    def _segment_name(self):
+        base = "{0}.{1}".format(self._filename, datetime.fromtimestamp(self._timer()).strftime("%Y%m%d-%H%M%S"))
+        segment = base
+        suffix = 1
+        extension = _compressors[self._compression][1] if self._compression is not None else ""
+        while exists(segment) or exists(segment + extension):
+            segment = "{0}-{1}".format(base, suffix)
+            suffix += 1
+        return segment
+
+    def _compress(self, segment):
+        opener, extension = _compressors[self._compression]
+        try:
+            with open(segment, "rb") as source, opener(segment + extension, "wb") as target:
+                copyfileobj(source, target)
+            remove(segment)
+        except OSError:
+            logger.exception("Could not compress %s, leaving it uncompressed", segment)
+            if exists(segment + extension):
+                remove(segment + extension)
@@ -1,13 +1,29 @@
-from collections import namedtuple
 from csv import writer
 from logging import getLogger
-from threading import RLock
-from time import time
+from queue import Empty, Full, Queue
+from sys import intern
+from threading import RLock, Timer
+from time import perf_counter, time
 
 from tweepy import StreamListener
 
+from wxmonitor.metrics import registry
+from wxmonitor.status_log import RotatingStatusLogWriter, write_header_if_new
+from wxmonitor.utils import ExcThread
+
 logger = getLogger(__name__)
 
+_statuses_received = registry.counter("wxmonitor_statuses_received_total", "Statuses received from the stream")
+_action_seconds = registry.histogram("wxmonitor_action_seconds", "Time a listener action takes per status",
+                                     ("action",))
+_categorize_seconds = registry.histogram("wxmonitor_categorize_seconds", "Time categorizing statuses per call",
+                                         ("mode",))
+_twitter_errors = registry.counter("wxmonitor_twitter_errors_total", "Error responses from the streaming API",
+                                   ("code",))
+_twitter_limits = registry.counter("wxmonitor_twitter_limit_notices_total", "Limit notices from the streaming API")
+_twitter_undelivered = registry.gauge("wxmonitor_twitter_undelivered_statuses",
+                                      "Matching statuses not delivered, from the last limit notice")
+
 
 class ListenerAction(object):
     def __init__(self, *args, **kwargs):
@@ -55,32 +71,364 @@ class LoggingStreamListenerAction(ListenerAction):
         self._logfile = logfile
         self._handler = None
         self._writer = None
+        self._lock = RLock()
 
     def start_logger(self):
-        self._handler = open(self._logfile, "a")
+        self._handler = open(self._logfile, "a", newline="")
         self._writer = writer(self._handler)
-        # TODO: If file doesn't exist, write header.
+        write_header_if_new(self._handler)
 
     def stop_logger(self):
         self._handler.close()
 
     def process(self, status):
-        self._writer.writerow([time(), status.user.screen_name, status.user.location, status.coordinates, status.text])
-        self._handler.flush()
+        row = [time(), status.user.screen_name, status.user.location, status.coordinates, status.text]
+        with self._lock:
+            self._writer.writerow(row)
+            self._handler.flush()
+
+
+class BufferedLoggingListenerAction(ListenerAction):
+    """Logs the same rows as LoggingStreamListenerAction through a RotatingStatusLogWriter.
+
+    The stream thread only queues the row; writing, batching, rotation and compression happen on the writer's
+    thread. writer_args are passed to RotatingStatusLogWriter.
+    """
+    def __init__(self, logfile, **writer_args):
+        self._log_writer = RotatingStatusLogWriter(logfile, **writer_args)
+
+    def start_logger(self):
+        self._log_writer.start()
+
+    def stop_logger(self):
+        self._log_writer.stop()
+
+    def process(self, status):
+        self._log_writer.write([time(), status.user.screen_name, status.user.location, status.coordinates,
+                                status.text])
+
+
+class ProcessedStatus(object):
+    """Compact record of a categorized status, holding only what reporting needs.
+
+    Place and event names are interned so every record mentioning a county shares one string.
+    """
+    __slots__ = ("timestamp", "status_id", "cities", "counties", "events", "spotter")
+
+    def __init__(self, timestamp, status_id, cities, counties, events, spotter):
+        self.timestamp = timestamp
+        self.status_id = status_id
+        self.cities = cities
+        self.counties = counties
+        self.events = events
+        self.spotter = spotter
+
+    @classmethod
+    def from_status(cls, status, tags, timestamp=None):
+        return cls(time() if timestamp is None else timestamp,
+                   status.id,
+                   tuple(map(intern, tags["cities"])),
+                   tuple(map(intern, tags["counties"])),
+                   tuple(map(intern, tags["events"])),
+                   bool(tags["spotter"]))
 
+    @property
+    def tags(self):
+        return {
+            "cities": list(self.cities),
+            "counties": list(self.counties),
+            "events": list(self.events),
+            "spotter": self.spotter
+        }
 
-ProcessedStatus = namedtuple("ProcessedStatus", field_names=["status", "tags"])
+    def __repr__(self):
+        return "ProcessedStatus(timestamp={0!r}, status_id={1!r}, cities={2!r}, counties={3!r}, events={4!r}, " \
+               "spotter={5!r})".format(self.timestamp, self.status_id, self.cities, self.counties, self.events,
+                                       self.spotter)
 
 
 class ProcessingListenerAction(ListenerAction):
-    def __init__(self, categorizer, cacher, *args, **kwargs):
+    """Categorizes statuses and adds them to the cache.
+
+    With batch_size > 1 statuses are collected and categorized together through categorizer.process_batch once
+    batch_size statuses are pending or batch_window seconds have passed since the first pending status.
+
+    Only a compact ProcessedStatus is cached. Pass a TextStore observing the cache, with the cache's ttl, timer and
+    bucket_seconds, as text_store to also keep status texts by status id for as long as their statuses are cached;
+    nothing removes texts from other mappings, so a plain dict grows without bound. Pass a HistoryStore as history to archive the processed statuses beyond the cache ttl.
+    timer stamps the processed statuses and should match the cache's timer.
+
+    Given a StatusDeduplicator, retweets and near duplicates of recent statuses are not categorized. They are dropped
+    with suppress_duplicates, else cached with the tags of the status they duplicate.
+    """
+    def __init__(self, categorizer, cacher, batch_size=1, batch_window=None, text_store=None, timer=time,
+                 history=None, deduplicator=None, suppress_duplicates=True, *args, **kwargs):
         self._categorizer = categorizer
         self._cacher = cacher
+        self._text_store = text_store
+        self._history = history
+        self._deduplicator = deduplicator
+        self._suppress_duplicates = suppress_duplicates
+        self._timer = timer
+        self._batch_size = batch_size
+        self._batch_window = batch_window
+
+        self._pending = []
+        self._batch_timer = None
+        self._lock = RLock()
         super(ProcessingListenerAction, self).__init__(*args, **kwargs)
 
     def process(self, status):
-        logger.debug("Processing status: %s", status)
-        self._cacher.add(ProcessedStatus(status=status, tags=self._categorizer.process(status)))
+        if self._batch_size <= 1:
+            entry, duplicate = self._check_duplicate(status)
+            if duplicate and self._add_duplicate(status, entry):
+                return
+
+            start = perf_counter()
+            try:
+                tags = self._categorizer.process(status)
+            except Exception:
+                self._discard([None if duplicate else entry])
+                raise
+            _categorize_seconds.observe(perf_counter() - start, ("single",))
+            self._add(status, tags, None if duplicate else entry)
+            return
+
+        with self._lock:
+            self._pending.append(status)
+
+            if len(self._pending) < self._batch_size:
+                if self._batch_timer is None and self._batch_window is not None:
+                    self._batch_timer = Timer(self._batch_window, self.flush)
+                    self._batch_timer.daemon = True
+                    self._batch_timer.start()
+                return
+
+            batch = self._take_pending()
+
+        self._process_batch(batch)
+
+    def flush(self):
+        with self._lock:
+            batch = self._take_pending()
+
+        self._process_batch(batch)
+
+    def _take_pending(self):
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+
+        batch = self._pending
+        self._pending = []
+        return batch
+
+    def _process_batch(self, batch):
+        if not batch:
+            return
+
+        checks = [self._check_duplicate(status) for status in batch]
+        # Duplicates of statuses earlier in this batch get their tags once the batch is categorized.
+        categorize = [status for status, (_, duplicate) in zip(batch, checks) if not duplicate]
+
+        logger.debug("Processing batch of %d statuses, %d duplicates", len(batch), len(batch) - len(categorize))
+        batch_tags = iter(())
+        if categorize:
+            start = perf_counter()
+            try:
+                batch_tags = iter(self._categorizer.process_batch(categorize))
+            except Exception:
+                self._discard([entry for entry, duplicate in checks if not duplicate])
+                raise
+            _categorize_seconds.observe(perf_counter() - start, ("batch",))
+
+        for status, (entry, duplicate) in zip(batch, checks):
+            if not duplicate:
+                self._add(status, next(batch_tags), entry)
+            elif not self._add_duplicate(status, entry):
+                self._add(status, self._categorizer.process(status))
+
+    def _check_duplicate(self, status):
+        if self._deduplicator is None:
+            return None, False
+        return self._deduplicator.check(status)
+
+    def _discard(self, entries):
+        # Statuses that failed to be categorized leave the index, so their copies are categorized instead of dropped.
+        for entry in entries:
+            if entry is not None:
+                self._deduplicator.discard(entry)
+
+    def _add_duplicate(self, status, entry):
+        """Handles a duplicate of entry, returning False when the status still needs categorizing."""
+        if self._suppress_duplicates:
+            return True
+
+        if entry.tags is None:
+            # The original is still being categorized on another thread.
+            return False
+
+        self._add(status, entry.tags)
+        return True
+
+    def _add(self, status, tags, entry=None):
+        if entry is not None:
+            entry.tags = tags
+
+        if self._text_store is not None:
+            self._text_store[status.id] = status.text
+
+        processed_status = ProcessedStatus.from_status(status, tags, self._timer())
+        self._cacher.add(processed_status)
+
+        if self._history is not None:
+            self._history.add(processed_status)
+
+
+class DispatchMetrics(object):
+    """Thread-safe counters for QueuedListenerAction."""
+    def __init__(self):
+        self._lock = RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._enqueued = 0
+            self._dropped = 0
+            self._max_depth = 0
+            self._latencies = {}
+
+    def record_enqueued(self, depth):
+        with self._lock:
+            self._enqueued += 1
+            if depth > self._max_depth:
+                self._max_depth = depth
+
+    def record_dropped(self):
+        with self._lock:
+            self._dropped += 1
+
+    def record_latency(self, name, seconds):
+        with self._lock:
+            stats = self._latencies.get(name)
+            if stats is None:
+                stats = self._latencies[name] = [0, 0.0, 0.0]
+
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "enqueued": self._enqueued,
+                "dropped": self._dropped,
+                "max_depth": self._max_depth,
+                "latency": {name: {"count": count, "mean": total / count, "max": maximum}
+                            for name, (count, total, maximum) in self._latencies.items()}
+            }
+
+
+class DispatchWorkerThread(ExcThread):
+    def __init__(self, dispatcher):
+        self._dispatcher = dispatcher
+        super(DispatchWorkerThread, self).__init__(loop_sleep_timeout=0)
+        self.daemon = True
+
+    def _do_work(self):
+        self._dispatcher.run_pending(timeout=0.25)
+
+
+class QueuedListenerAction(ListenerAction):
+    """Runs actions on worker threads, decoupling them from the stream thread.
+
+    process() only enqueues the status onto a bounded queue. When the queue is full the backpressure policy decides
+    what happens: BLOCK waits for room, DROP_OLDEST discards the oldest queued status and DROP_NEWEST discards the
+    incoming one. Actions must be thread-safe when more than one worker is used.
+    """
+    BLOCK = "block"
+    DROP_OLDEST = "drop-oldest"
+    DROP_NEWEST = "drop-newest"
+
+    def __init__(self, actions_list, workers=1, maxsize=10000, policy=BLOCK, *args, **kwargs):
+        if policy not in (self.BLOCK, self.DROP_OLDEST, self.DROP_NEWEST):
+            raise ValueError("Unknown backpressure policy: {0}".format(policy))
+
+        self._actions_list = actions_list
+        self._policy = policy
+        self._queue = Queue(maxsize=maxsize)
+        self._workers = [DispatchWorkerThread(self) for _ in range(workers)]
+        self.metrics = DispatchMetrics()
+        super(QueuedListenerAction, self).__init__(*args, **kwargs)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def start(self):
+        logger.debug("Starting %d dispatch workers.", len(self._workers))
+        for worker in self._workers:
+            worker.start()
+
+    def stop(self, drain=True):
+        if drain:
+            self._queue.join()
+
+        for worker in self._workers:
+            worker.stop()
+
+        for worker in self._workers:
+            worker.join()
+
+    def process(self, status):
+        if self._policy == self.BLOCK:
+            self._queue.put(status)
+
+        elif self._policy == self.DROP_NEWEST:
+            try:
+                self._queue.put_nowait(status)
+            except Full:
+                self.metrics.record_dropped()
+                return
+
+        else:
+            while True:
+                try:
+                    self._queue.put_nowait(status)
+                    break
+                except Full:
+                    self._discard_oldest()
+
+        self.metrics.record_enqueued(self._queue.qsize())
+
+    def _discard_oldest(self):
+        try:
+            self._queue.get_nowait()
+        except Empty:
+            return
+
+        self._queue.task_done()
+        self.metrics.record_dropped()
+
+    def run_pending(self, timeout=None):
+        try:
+            status = self._queue.get(timeout=timeout)
+        except Empty:
+            return
+
+        try:
+            for action in self._actions_list:
+                start = perf_counter()
+                try:
+                    action.process(status)
+                except Exception:
+                    logger.exception("Listener action %s failed", type(action).__name__)
+                elapsed = perf_counter() - start
+                self.metrics.record_latency(type(action).__name__, elapsed)
+                _action_seconds.observe(elapsed, (type(action).__name__,))
+        finally:
+            self._queue.task_done()
 
 
 class TwitterStreamListener(StreamListener):
@@ -92,6 +440,7 @@ class TwitterStreamListener(StreamListener):
 
     def on_error(self, status_code):
         logger.warning("Error encountered %d", status_code)
+        _twitter_errors.inc(labels=(status_code,))
         if status_code == 420:
             logger.error("Error is 420, that is a rate limit. shutting down connection.")
             return False
@@ -100,8 +449,18 @@ class TwitterStreamListener(StreamListener):
         if status.user.screen_name.lower() == self._bot_screen_name:
             return
 
+        if not registry.enabled:
+            for action in self._actions_list:
+                action.process(status)
+            return
+
+        _statuses_received.inc()
         for action in self._actions_list:
+            start = perf_counter()
             action.process(status)
+            _action_seconds.observe(perf_counter() - start, (type(action).__name__,))
 
     def on_limit(self, track):
         logger.warning("Limits exceeded")
+        _twitter_limits.inc()
+        _twitter_undelivered.set(track)
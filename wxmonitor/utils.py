@@ -21,7 +21,7 @@ def get_min_max_county_count(seen_counties):
 def get_seen_counties(tagged_status):
     seen_counties = {}
     for status in tagged_status:
-        for county in status.tags["counties"]:
+        for county in status.counties:
             if county not in seen_counties:
                 seen_counties[county] = 1
             else:
@@ -31,7 +31,7 @@ def get_seen_counties(tagged_status):
 def get_uncategorized(tagged_status):
     uncategorized = []
     for status in tagged_status:
-        if len(status.tags["counties"]) == 0 and len(status.tags["cities"]) == 0:
+        if len(status.counties) == 0 and len(status.cities) == 0:
             uncategorized.append(status)
     return uncategorized
 
@@ -1,15 +1,112 @@
 import re
-from csv import DictReader
+from collections import OrderedDict
 from logging import getLogger
+from multiprocessing import Pool
+from threading import Lock
+
+from wxmonitor.matching import EventMatcher, tokenize
+from wxmonitor.metrics import registry
+from wxmonitor.place_index import PlaceIndex, load_place_index
 
 logger = getLogger(__name__)
 
+_memo_results = registry.counter("wxmonitor_categorizer_memo_total", "Categorizer memo lookups, by result", ("result",))
+
+_worker_categorizer = None
+
+
+def _init_worker(categorizer_type, ansi_code_file, index_file, qualify_counties):
+    global _worker_categorizer
+    _worker_categorizer = categorizer_type(ansi_code_file, index_file=index_file, qualify_counties=qualify_counties)
+
+
+def _process_text(content):
+    return _worker_categorizer.categorize(content)
+
+
+def _copy_tags(tags):
+    return {key: list(value) if isinstance(value, list) else value for key, value in tags.items()}
+
+
+class CategoryMemoMetrics(object):
+    """Counts of CategoryMemo lookups and evictions, guarded by the memo's lock.
+
+    increment is called with lock held, so a lookup takes a single lock.
+    """
+    counter_names = ("hits", "misses", "evictions")
+
+    def __init__(self, lock):
+        self._lock = lock
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = dict.fromkeys(self.counter_names, 0)
+
+    def increment(self, name):
+        _memo_results.inc(labels=(name,))
+        self._counters[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = dict(self._counters)
+
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+        return snapshot
+
+
+class CategoryMemo(object):
+    """LRU map of lowercased texts to their tags, holding at most maxsize texts.
+
+    Tags are copied in and out, so callers may change the lists they get without changing the memo.
+    """
+    def __init__(self, maxsize=10000):
+        self._maxsize = maxsize
+        self._tags = OrderedDict()
+        self._lock = Lock()
+        self.metrics = CategoryMemoMetrics(self._lock)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tags)
+
+    def get(self, text):
+        """Returns the tags of text, or None if it isn't in the memo."""
+        with self._lock:
+            tags = self._tags.get(text)
+            if tags is None:
+                self.metrics.increment("misses")
+                return None
+
+            self._tags.move_to_end(text)
+            self.metrics.increment("hits")
+            return _copy_tags(tags)
+
+    def put(self, text, tags):
+        with self._lock:
+            self._tags[text] = _copy_tags(tags)
+            self._tags.move_to_end(text)
+
+            while len(self._tags) > self._maxsize:
+                self._tags.popitem(last=False)
+                self.metrics.increment("evictions")
+
 
 class WeatherCategorizer(object):
-    _events_regex_str = r"(\bnnow\b|\brain\b|\bhail\b|\btrees.*?down\b|\bdamage\b|\broof\b|\bponding\b|\bflooding\b|\bflood\b|\bwind\b)"
+    _event_words = ("snow", "rain", "hail", "damage", "roof", "ponding", "flooding", "flood", "wind")
+    _event_spans = (("trees", "down"),)
+    _spotter_tag = "#tspotter"
 
-    def __init__(self, ansi_code_file):
+    def __init__(self, ansi_code_file, workers=0, index_file=None, qualify_counties=False, locator=None, memo_size=0):
         # get ansi code file from: https://www.census.gov/geo/reference/codes/place.html
+        # workers > 0 categorizes batches in a pool of worker processes, each with its own copy of the place data.
+        # index_file loads the place data and matchers from a place index, rebuilding it if the ansi code file changed.
+        # qualify_counties reports counties as "state:county", telling same named counties of different states apart.
+        # locator, a CountyLocator, adds the county a status is geotagged in to its counties.
+        # memo_size > 0 remembers the tags of that many recent texts, so repeated texts (bot posts, NWS relays,
+        # retweets) are looked up instead of categorized. Texts are only lowercased for the lookup, as categorize does
+        # first anyway, so the memo never changes the tags a status gets.
 
         self._cities = set()
         self._counties = set()
@@ -17,40 +114,148 @@ class WeatherCategorizer(object):
 
         self._city_county_map = {}
         self._city_zip_map = {}
+        self._county_states = {}
+        self._qualify_counties = qualify_counties
+        self._locator = locator
 
-        self._city_location_regex = None
-        self._county_location_regex = None
-        self._event_type_regex = None
+        self._city_matcher = None
+        self._county_matcher = None
+        self._event_matcher = None
+
+        self._workers = workers
+        self._pool = None
+        self.memo = CategoryMemo(memo_size) if memo_size > 0 else None
 
         self._ansi_code_file = ansi_code_file
+        self._index_file = index_file
+        self._place_index = None
         self._build_place_data()
-        self._build_regexes()
+        self._build_matchers()
 
     def _build_place_data(self):
+        if self._index_file is None:
+            self._place_index = PlaceIndex.from_ansi_file(self._ansi_code_file)
+        else:
+            self._place_index = load_place_index(self._ansi_code_file, self._index_file)
 
-        logger.debug("Building place data with ansi code file: %s", self._ansi_code_file)
-        with open(self._ansi_code_file, "r") as f:
-            reader = DictReader(f, delimiter="|")
+        self._cities = self._place_index.cities
+        self._counties = self._place_index.counties
+        self._zipcodes = self._place_index.zipcodes
+        self._city_zip_map = self._place_index.city_zip_map
+        self._county_states = self._place_index.county_states
+
+        if self._qualify_counties:
+            self._city_county_map = self._place_index.qualified_city_county_map
+        else:
+            self._city_county_map = self._place_index.city_county_map
+        logger.debug("Done")
 
-            for row in reader:
-                zipcode = row["PLACEFP"]
-                city = " ".join(row["PLACENAME"].split()[:-1]).lower()
+    def _build_matchers(self):
+        logger.debug("Building matchers")
+        self._city_matcher = self._place_index.city_matcher
+        self._county_matcher = self._place_index.county_matcher
+        self._event_matcher = EventMatcher(self._event_words, self._event_spans)
+        logger.debug("Done")
 
-                for county in map(str.strip, row["COUNTY"].split(",")):
-                    county = county.lower()
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
 
-                    self._counties.add(county.lower())
+    def process(self, status):
+        logger.debug("Processing: %s", status)
+        return self._add_location(status, self.process_text(status.text))
 
-                    if self._city_county_map.get(city) is None:
-                        self._city_county_map[city] = []
+    def process_batch(self, statuses):
+        """Categorize statuses, returning their tags in the same order. Only the text is sent to worker processes."""
+        texts = [status.text for status in statuses]
 
-                    self._city_county_map[city].append(county)
+        if self.memo is None:
+            return [self._add_location(status, tags) for status, tags in zip(statuses, self._categorize_batch(texts))]
 
-                self._zipcodes.add(zipcode)
-                self._cities.add(city)
-                self._city_zip_map[city] = zipcode
-                self._city_zip_map[zipcode] = city
-        logger.debug("Done")
+        texts = [text.lower() for text in texts]
+        tags = [self.memo.get(text) for text in texts]
+        # Repeats within the batch are categorized once.
+        missed = list(OrderedDict.fromkeys(text for text, text_tags in zip(texts, tags) if text_tags is None))
+        categorized = dict(zip(missed, self._categorize_batch(missed)))
+        for text in missed:
+            self.memo.put(text, categorized[text])
+
+        return [self._add_location(status, _copy_tags(categorized[text]) if text_tags is None else text_tags)
+                for status, text, text_tags in zip(statuses, texts, tags)]
+
+    def _categorize_batch(self, texts):
+        if not self._workers or len(texts) < 2:
+            return [self.categorize(text) for text in texts]
+
+        if self._pool is None:
+            logger.debug("Starting categorizer pool with %d workers", self._workers)
+            self._pool = Pool(self._workers, initializer=_init_worker,
+                              initargs=(type(self), self._ansi_code_file, self._index_file,
+                                        self._qualify_counties))
+
+        chunksize = max(1, len(texts) // (self._workers * 4))
+        return self._pool.map(_process_text, texts, chunksize)
+
+    def _add_location(self, status, tags):
+        if self._locator is None:
+            return tags
+
+        location = self._locator.locate_status(status)
+        if location is not None:
+            state, county = location
+            county = state + ":" + county if self._qualify_counties else county
+            if county not in tags["counties"]:
+                tags["counties"].append(county)
+
+        return tags
+
+    def process_text(self, content):
+        if self.memo is None:
+            return self.categorize(content)
+
+        content = content.lower()
+        tags = self.memo.get(content)
+        if tags is None:
+            tags = self.categorize(content)
+            self.memo.put(content, tags)
+        return tags
+
+    def categorize(self, content):
+        """Returns the cities, counties, events and spotter flag of content, bypassing the memo."""
+        content = content.lower()
+        tokens = tokenize(content)
+
+        cities = list(set(self._city_matcher.findall(content, tokens)))
+        counties = self._county_matcher.findall(content, tokens)
+
+        if self._qualify_counties:
+            counties = [state + ":" + county for county in counties for state in self._county_states[county]]
+
+        for city in cities:
+            if city in self._city_county_map and self._city_county_map[city] is not None:
+                counties.extend(self._city_county_map[city])
+
+        counties = list(set(" ".join(county.split()[:-1]) for county in counties))
+        events = list(set(self._event_matcher.findall(content, tokens)))
+
+        logger.debug("Done\n - Cities: %s\n - Counties: %s\n - Events: %s", cities, counties, events)
+
+        return {
+            "cities": cities,
+            "counties": counties,
+            "events": events,
+            "spotter": self._spotter_tag in content
+        }
+
+
+class RegexWeatherCategorizer(WeatherCategorizer):
+    """Original regex based categorizer, kept as a reference for comparisons and benchmarks."""
+    _events_regex_str = r"(\bsnow\b|\brain\b|\bhail\b|\btrees.*?down\b|\bdamage\b|\broof\b|\bponding\b|\bflooding\b|\bflood\b|\bwind\b)"
+
+    def _build_matchers(self):
+        self._build_regexes()
 
     def _build_regexes(self):
         logger.debug("Building regexes")
@@ -65,11 +270,7 @@ class WeatherCategorizer(object):
         self._spotter_regex = re.compile(spotter_retex_str, re.IGNORECASE | re.MULTILINE)
         logger.debug("Done")
 
-    def process(self, status):
-        logger.debug("Processing: %s", status)
-
-        content = status.text
-
+    def categorize(self, content):
         cities = list(set(city.lower() for city in self._city_location_regex.findall(content)))
         counties = self._county_location_regex.findall(content)
 